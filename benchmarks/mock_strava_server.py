@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Serveur Strava simulé (bibliothèque standard uniquement) pour les benchmarks
+
+Reproduit les points d'entrée utilisés par l'extracteur :
+
+    POST /oauth/token                          rafraîchissement du token
+    GET  /api/v3/athlete                       profil de l'athlète
+    GET  /api/v3/athlete/activities            pagination page/per_page, after/before
+    GET  /api/v3/activities/{id}               détail d'une activité
+    GET  /api/v3/activities/{id}/streams       streams (key_by_type)
+
+Les activités sont synthétiques et déterministes : l'activité n° i d'un athlète
+est générée à la demande à partir de (seed, athlète, i), sans rien stocker, ce
+qui permet de simuler 10k à 1M d'activités. Les dates sont croissantes avec
+l'index (un intervalle régulier + une gigue plus petite que l'intervalle) :
+la pagination `after` se calcule donc sans parcourir l'historique.
+
+Les en-têtes X-RateLimit-Limit / X-RateLimit-Usage sont renvoyés sur chaque
+appel API ; au-delà des limites (fenêtres de 15 minutes et quotidienne) le
+serveur répond 429, et `throttle_rate` injecte des 429 aléatoires.
+
+Usage :
+    python benchmarks/mock_strava_server.py --activities 10000 --port 8765
+    STRAVA_BASE_URL=http://127.0.0.1:8765 python src/extract/strava_extractor.py
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Les IDs d'activités encodent l'athlète et l'index : ID_BASE + athlète * ID_STRIDE + index
+ID_BASE = 10_000_000_000
+ID_STRIDE = 100_000_000
+FIRST_ATHLETE_ID = 1001
+
+# Sport -> (probabilité, vitesse moyenne m/s, distance min/max en m)
+SPORTS = {
+    'Run': (0.55, 3.0, 3000, 25000),
+    'Ride': (0.25, 7.5, 15000, 120000),
+    'Walk': (0.10, 1.4, 2000, 12000),
+    'Hike': (0.05, 1.1, 5000, 25000),
+    'Swim': (0.05, 0.8, 800, 4000),
+}
+
+STREAM_KEYS = ('time', 'distance', 'heartrate', 'altitude', 'latlng')
+
+
+class MockStravaData:
+    """Générateur déterministe des activités et streams simulés"""
+
+    def __init__(self, activities=10000, athletes=1, years=10, seed=42, end_date=None):
+        self.activities_per_athlete = activities
+        self.athlete_ids = [FIRST_ATHLETE_ID + k for k in range(max(1, athletes))]
+        self.seed = seed
+        end_date = end_date or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.end_epoch = int(end_date.timestamp())
+        self.start_epoch = self.end_epoch - int(years * 365.25 * 86400)
+        # Intervalle entre deux activités consécutives ; la gigue reste en deçà
+        self.step = (self.end_epoch - self.start_epoch) / max(activities, 1)
+
+        sports = list(SPORTS.items())
+        self._sport_names = [name for name, _ in sports]
+        self._sport_weights = [spec[0] for _, spec in sports]
+
+    def _rng(self, athlete_id, index):
+        return random.Random(self.seed * 1_000_003 + athlete_id * 10_000_019 + index)
+
+    def activity_id(self, athlete_id, index):
+        return ID_BASE + (athlete_id - FIRST_ATHLETE_ID) * ID_STRIDE + index
+
+    def locate(self, activity_id):
+        """(athlete_id, index) d'un ID d'activité, ou None s'il est inconnu"""
+        offset = activity_id - ID_BASE
+        if offset < 0:
+            return None
+        athlete_id = FIRST_ATHLETE_ID + offset // ID_STRIDE
+        index = offset % ID_STRIDE
+        if athlete_id not in self.athlete_ids or index >= self.activities_per_athlete:
+            return None
+        return athlete_id, index
+
+    def start_epoch_of(self, athlete_id, index):
+        jitter = self._rng(athlete_id, index).random() * self.step * 0.9
+        return int(self.start_epoch + index * self.step + jitter)
+
+    def first_index_after(self, athlete_id, epoch):
+        """Premier index dont le départ est strictement postérieur à `epoch`"""
+        index = max(int((epoch - self.start_epoch) // self.step) - 1, 0)
+        while index < self.activities_per_athlete and self.start_epoch_of(athlete_id, index) <= epoch:
+            index += 1
+        return index
+
+    def first_index_from(self, athlete_id, epoch):
+        """Premier index dont le départ est postérieur ou égal à `epoch`"""
+        return self.first_index_after(athlete_id, epoch - 1)
+
+    def activity(self, athlete_id, index):
+        """Résumé d'activité au format de /athlete/activities"""
+        rng = self._rng(athlete_id, index)
+        start = self.start_epoch_of(athlete_id, index)
+        rng.random()  # première valeur : la gigue de start_epoch_of
+
+        sport_type = rng.choices(self._sport_names, self._sport_weights)[0]
+        _, speed, min_distance, max_distance = SPORTS[sport_type]
+        distance = round(rng.uniform(min_distance, max_distance), 1)
+        average_speed = round(speed * rng.uniform(0.8, 1.2), 3)
+        moving_time = int(distance / average_speed)
+        has_heartrate = rng.random() < 0.85
+        average_heartrate = round(rng.uniform(115, 170), 1) if has_heartrate else None
+        start_date = datetime.fromtimestamp(start, timezone.utc)
+
+        return {
+            'resource_state': 2,
+            'athlete': {'id': athlete_id, 'resource_state': 1},
+            'id': self.activity_id(athlete_id, index),
+            'name': f"{sport_type} #{index + 1}",
+            'distance': distance,
+            'moving_time': moving_time,
+            'elapsed_time': moving_time + rng.randint(0, 900),
+            'total_elevation_gain': round(rng.uniform(0, distance / 50), 1),
+            'type': sport_type,
+            'sport_type': sport_type,
+            'start_date': start_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'start_date_local': (start_date + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'timezone': '(GMT+01:00) Europe/Paris',
+            'achievement_count': rng.randint(0, 5),
+            'kudos_count': rng.randint(0, 30),
+            'trainer': False,
+            'commute': rng.random() < 0.05,
+            'manual': False,
+            'private': False,
+            'map': {'id': f"a{self.activity_id(athlete_id, index)}", 'summary_polyline': '', 'resource_state': 2},
+            'average_speed': average_speed,
+            'max_speed': round(average_speed * rng.uniform(1.3, 2.0), 3),
+            'has_heartrate': has_heartrate,
+            'average_heartrate': average_heartrate,
+            'max_heartrate': round(average_heartrate + rng.uniform(10, 25), 1) if has_heartrate else None,
+            'suffer_score': rng.randint(5, 250) if has_heartrate and rng.random() < 0.7 else None,
+        }
+
+    def activity_page(self, athlete_id, page, per_page, after=None, before=None):
+        """Page de /athlete/activities
+
+        Comme Strava : ordre chronologique avec `after`, anté-chronologique sinon.
+        """
+        offset = (page - 1) * per_page
+        if after is not None:
+            first = self.first_index_after(athlete_id, after) + offset
+            last = self.activities_per_athlete
+            if before is not None:
+                last = self.first_index_from(athlete_id, before)
+            indexes = range(first, min(first + per_page, last))
+        else:
+            last = self.activities_per_athlete
+            if before is not None:
+                last = self.first_index_from(athlete_id, before)
+            top = last - 1 - offset
+            indexes = range(top, max(top - per_page, -1), -1)
+        return [self.activity(athlete_id, index) for index in indexes]
+
+    def streams(self, athlete_id, index, keys=STREAM_KEYS, interval=1):
+        """Streams d'une activité, un point toutes les `interval` secondes"""
+        activity = self.activity(athlete_id, index)
+        rng = self._rng(athlete_id, index)
+        points = max(activity['moving_time'] // interval, 2)
+        speed = activity['average_speed']
+        base_hr = activity['average_heartrate'] or 0
+
+        time_s, distance, heartrate, altitude, latlng = [], [], [], [], []
+        covered = 0.0
+        lat, lng = 48.85 + rng.uniform(-0.1, 0.1), 2.35 + rng.uniform(-0.1, 0.1)
+        heading = rng.uniform(0, 2 * math.pi)
+        for point in range(points):
+            step = speed * interval * rng.uniform(0.7, 1.3)
+            covered += step
+            heading += rng.uniform(-0.2, 0.2)
+            lat += step * math.cos(heading) / 111_000
+            lng += step * math.sin(heading) / 73_000
+            time_s.append(point * interval)
+            distance.append(round(covered, 1))
+            heartrate.append(int(base_hr + 8 * math.sin(point / 120)) if base_hr else None)
+            altitude.append(round(100 + 20 * math.sin(point / 300), 1))
+            latlng.append([round(lat, 6), round(lng, 6)])
+
+        series = {'time': time_s, 'distance': distance, 'altitude': altitude, 'latlng': latlng}
+        if base_hr:
+            series['heartrate'] = heartrate
+        return {
+            key: {'data': series[key], 'series_type': 'distance', 'original_size': points, 'resolution': 'high'}
+            for key in keys if key in series
+        }
+
+
+class RateLimitState:
+    """Compteurs d'appels par fenêtre, à la manière de Strava (15 min alignées, jour UTC)"""
+
+    def __init__(self, short_limit=200, daily_limit=2000, throttle_rate=0.0, seed=42):
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.throttle_rate = throttle_rate
+        self.short_usage = 0
+        self.daily_usage = 0
+        self.short_window = None
+        self.daily_window = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def record_call(self):
+        """Compte un appel ; retourne (autorisé, en-têtes de limite)"""
+        now = datetime.now(timezone.utc)
+        short_window = now.replace(minute=now.minute - now.minute % 15, second=0, microsecond=0)
+        daily_window = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        with self._lock:
+            if short_window != self.short_window:
+                self.short_window, self.short_usage = short_window, 0
+            if daily_window != self.daily_window:
+                self.daily_window, self.daily_usage = daily_window, 0
+            self.short_usage += 1
+            self.daily_usage += 1
+            allowed = self.short_usage <= self.short_limit and self.daily_usage <= self.daily_limit
+            if allowed and self.throttle_rate:
+                allowed = self._random.random() >= self.throttle_rate
+            headers = {
+                'X-RateLimit-Limit': f"{self.short_limit},{self.daily_limit}",
+                'X-RateLimit-Usage': f"{self.short_usage},{self.daily_usage}",
+            }
+        return allowed, headers
+
+
+class MockStravaHandler(BaseHTTPRequestHandler):
+    """Routage des requêtes ; l'état est porté par le serveur (self.server.mock)"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.mock.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        mock.count('oauth')
+
+        if url.path != '/oauth/token':
+            return self.send_json(404, {'message': 'Record Not Found'})
+        if form.get('grant_type') != 'refresh_token' or not form.get('refresh_token'):
+            return self.send_json(400, {'message': 'Bad Request'})
+
+        athlete_id = mock.athlete_for_refresh_token(form['refresh_token'])
+        expires_at = int(time.time()) + 21600
+        self.send_json(200, {
+            'token_type': 'Bearer',
+            'access_token': f"mock-access-{athlete_id}-{expires_at}",
+            'expires_at': expires_at,
+            'expires_in': 21600,
+            'refresh_token': mock.refresh_token_for(athlete_id, form['refresh_token']),
+        })
+
+    def do_GET(self):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        if parts[:2] != ['api', 'v3']:
+            return self.send_json(404, {'message': 'Record Not Found'})
+        parts = parts[2:]
+
+        if mock.latency:
+            time.sleep(mock.latency)
+
+        athlete_id = mock.athlete_for_access_token(self.headers.get('Authorization', ''))
+        if athlete_id is None:
+            mock.count('unauthorized')
+            return self.send_json(401, {'message': 'Authorization Error'})
+
+        allowed, headers = mock.rate_limits.record_call()
+        if not allowed:
+            mock.count('rate_limited')
+            return self.send_json(429, {'message': 'Rate Limit Exceeded'}, headers)
+
+        data = mock.data
+        if parts == ['athlete']:
+            mock.count('athlete')
+            return self.send_json(200, {'id': athlete_id, 'firstname': 'Mock', 'lastname': f"Athlete {athlete_id}"}, headers)
+
+        if parts == ['athlete', 'activities']:
+            mock.count('activities')
+            page = int(params.get('page', 1))
+            per_page = min(int(params.get('per_page', 30)), 200)
+            after = int(params['after']) if 'after' in params else None
+            before = int(params['before']) if 'before' in params else None
+            return self.send_json(200, data.activity_page(athlete_id, page, per_page, after, before), headers)
+
+        if len(parts) in (2, 3) and parts[0] == 'activities' and parts[1].isdigit():
+            located = data.locate(int(parts[1]))
+            if located is None or located[0] != athlete_id:
+                return self.send_json(404, {'message': 'Record Not Found'}, headers)
+            if len(parts) == 2:
+                mock.count('activity')
+                return self.send_json(200, data.activity(*located), headers)
+            if parts[2] == 'streams':
+                mock.count('streams')
+                keys = params.get('keys', ','.join(STREAM_KEYS)).split(',')
+                return self.send_json(200, data.streams(*located, keys=keys, interval=mock.stream_interval), headers)
+
+        self.send_json(404, {'message': 'Record Not Found'}, headers)
+
+
+class MockStravaServer:
+    """Serveur simulé démarré dans un thread (ou au premier plan via serve_forever)
+
+    Le token d'accès encode l'athlète : le serveur est sans état côté
+    authentification et accepte les tokens émis par une instance précédente.
+    Un refresh token `mock-refresh-<athlete_id>` désigne un athlète précis ;
+    tout autre refresh token désigne le premier athlète.
+    """
+
+    def __init__(self, activities=10000, athletes=1, years=10, seed=42, host='127.0.0.1', port=0,
+                 short_limit=200, daily_limit=2000, throttle_rate=0.0, latency_ms=0,
+                 stream_interval=1, rotate_tokens=False, verbose=False):
+        self.data = MockStravaData(activities=activities, athletes=athletes, years=years, seed=seed)
+        self.rate_limits = RateLimitState(short_limit, daily_limit, throttle_rate, seed)
+        self.latency = latency_ms / 1000
+        self.stream_interval = max(1, stream_interval)
+        self.rotate_tokens = rotate_tokens
+        self.verbose = verbose
+        self.calls = {}
+        self._calls_lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), MockStravaHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint):
+        with self._calls_lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def athlete_for_refresh_token(self, refresh_token):
+        prefix, _, suffix = refresh_token.rpartition('-')
+        if prefix.startswith('mock-refresh') and suffix.isdigit() and int(suffix) in self.data.athlete_ids:
+            return int(suffix)
+        return self.data.athlete_ids[0]
+
+    def refresh_token_for(self, athlete_id, refresh_token):
+        """Strava peut renvoyer un nouveau refresh token ; simulé avec rotate_tokens"""
+        if self.rotate_tokens:
+            return f"mock-refresh-{int(time.time() * 1000)}-{athlete_id}"
+        return refresh_token
+
+    def athlete_for_access_token(self, authorization):
+        token = authorization.removeprefix('Bearer ').strip()
+        parts = token.split('-')
+        if len(parts) != 4 or parts[:2] != ['mock', 'access'] or not parts[2].isdigit():
+            return None
+        athlete_id = int(parts[2])
+        if athlete_id not in self.data.athlete_ids or int(parts[3]) < time.time():
+            return None
+        return athlete_id
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Serveur Strava simule")
+    parser.add_argument('--activities', type=int, default=10000, help="activites par athlete")
+    parser.add_argument('--athletes', type=int, default=1)
+    parser.add_argument('--years', type=float, default=10, help="profondeur de l'historique")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--short-limit', type=int, default=200, help="appels par fenetre de 15 minutes")
+    parser.add_argument('--daily-limit', type=int, default=2000, help="appels par jour")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="proportion de 429 aleatoires")
+    parser.add_argument('--latency-ms', type=float, default=0, help="latence ajoutee a chaque appel API")
+    parser.add_argument('--stream-interval', type=int, default=1, help="secondes entre deux points de stream")
+    parser.add_argument('--rotate-tokens', action='store_true', help="renouveler le refresh token a chaque appel OAuth")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = MockStravaServer(
+        activities=args.activities, athletes=args.athletes, years=args.years, seed=args.seed,
+        host=args.host, port=args.port, short_limit=args.short_limit, daily_limit=args.daily_limit,
+        throttle_rate=args.throttle_rate, latency_ms=args.latency_ms,
+        stream_interval=args.stream_interval, rotate_tokens=args.rotate_tokens, verbose=args.verbose,
+    )
+    print(f"🏃 Serveur Strava simule : {args.activities} activites x {args.athletes} athlete(s)")
+    print(f"   export STRAVA_BASE_URL={server.base_url}")
+    print(f"   athletes : {server.data.athlete_ids} (refresh token mock-refresh-<athlete_id>)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Arret du serveur")
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
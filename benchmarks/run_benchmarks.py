@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Benchmark de bout en bout du pipeline contre le serveur Strava simulé
+
+Pour chaque taille d'historique, dans une base temporaire :
+
+    extract              extraction complète via HTTP (pagination + sauvegarde)
+    extract_incremental  run incrémental sans nouvelle activité
+    save_to_duckdb       insertion seule, pages générées en mémoire (sans HTTP)
+    streams              (option --streams) streams des N dernières activités
+    best_efforts         meilleurs efforts des streams
+    dbt_run              dbt run --full-refresh
+    dbt_run_incremental  dbt run sans changement
+    training_load        charge d'entraînement ATL/CTL/TSB
+    query:<nom>          fonctions de dashboard_data (meilleur temps sur --repeat essais)
+
+Chaque mesure est ajoutée à un historique JSONL (une ligne par étape et par
+taille, avec commit git et machine) ; elle est comparée à la médiane des
+mesures précédentes de la même machine pour signaler les régressions.
+
+Usage :
+    python benchmarks/run_benchmarks.py --sizes 10000 100000
+    python benchmarks/run_benchmarks.py --sizes 1000000 --skip dbt --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(BENCHMARKS_DIR, '..'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src', 'extract'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src', 'pipeline'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src', 'dashboard'))
+
+import duckdb
+
+import dashboard_data
+import strava_pipeline
+from mock_strava_server import MockStravaServer
+from strava_extractor import StravaExtractor
+from strava_streams import StravaStreamsExtractor
+
+DEFAULT_HISTORY = os.path.join(BENCHMARKS_DIR, 'results', 'history.jsonl')
+
+# Nombre de mesures précédentes prises pour référence
+BASELINE_RUNS = 5
+
+# Écart absolu minimal (s) pour parler de régression sur les mesures très courtes
+MIN_REGRESSION_DELTA = 0.05
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(function, *args, quiet=True, **kwargs):
+    """(durée en s, résultat) ; la sortie console du code mesuré est masquée"""
+    started_at = time.perf_counter()
+    if quiet:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            result = function(*args, **kwargs)
+    else:
+        result = function(*args, **kwargs)
+    return time.perf_counter() - started_at, result
+
+
+def dashboard_queries(options):
+    """Requêtes du dashboard : sans filtre, puis filtrées sur le sport principal et 12 mois"""
+    end_date = options['max_date']
+    filtered = {
+        'sport': options['sports'][0] if options['sports'] else None,
+        'start_date': end_date - timedelta(days=365) if end_date else None,
+        'end_date': end_date,
+    }
+    return [
+        ('get_filter_options', dashboard_data.get_filter_options, {}),
+        ('get_kpis', dashboard_data.get_kpis, {}),
+        ('get_kpis_filtered', dashboard_data.get_kpis, filtered),
+        ('get_recent_activities', dashboard_data.get_recent_activities, filtered),
+        ('get_distance_categories', dashboard_data.get_distance_categories, {}),
+        ('get_weekday_hour_counts', dashboard_data.get_weekday_hour_counts, filtered),
+        ('get_monthly_stats', dashboard_data.get_monthly_stats, {}),
+        ('get_training_load', dashboard_data.get_training_load, filtered),
+        ('get_personal_bests', dashboard_data.get_personal_bests, {}),
+    ]
+
+
+def benchmark_size(size, args, workdir):
+    """Mesures d'une taille d'historique ; retourne [{'step', 'seconds', 'rows'}]"""
+    db_path = os.path.join(workdir, f"strava_{size}.duckdb")
+    measures = []
+
+    def record(step, seconds, rows=None, success=True):
+        measures.append({'step': step, 'seconds': round(seconds, 4), 'rows': rows, 'success': success})
+        status = '' if success else '  ❌'
+        throughput = f"  ({rows / seconds:,.0f} lignes/s)" if rows and seconds > 0 else ''
+        print(f"   {step:<32} {seconds:>9.3f}s{throughput}{status}")
+
+    server = MockStravaServer(
+        activities=size, years=args.years, seed=args.seed,
+        short_limit=10 ** 9, daily_limit=10 ** 9, latency_ms=args.latency_ms,
+        stream_interval=args.stream_interval,
+    )
+    with server:
+        os.environ.update({
+            'STRAVA_BASE_URL': server.base_url,
+            'STRAVA_CLIENT_ID': 'benchmark',
+            'STRAVA_CLIENT_SECRET': 'benchmark',
+            'STRAVA_REFRESH_TOKEN': 'mock-refresh-benchmark',
+        })
+
+        if 'extract' not in args.skip:
+            with StravaExtractor(max_workers=args.workers, db_path=db_path) as extractor:
+                seconds, count = timed(extractor.extract_to_duckdb, incremental=False)
+                record('extract', seconds, count, count == size)
+                seconds, count = timed(extractor.extract_to_duckdb, incremental=True)
+                record('extract_incremental', seconds, count, count == 0)
+
+                if args.streams:
+                    streams = StravaStreamsExtractor(extractor)
+                    seconds, count = timed(streams.extract_streams, limit=args.streams)
+                    record('streams', seconds, count, count is not None)
+
+        if 'save' not in args.skip:
+            save_db_path = os.path.join(workdir, f"save_{size}.duckdb")
+            seconds = 0.0
+            with StravaExtractor(db_path=save_db_path) as extractor:
+                athlete_id = server.data.athlete_ids[0]
+                for first in range(0, size, 200):
+                    page = [server.data.activity(athlete_id, index)
+                            for index in range(first, min(first + 200, size))]
+                    page_seconds, saved = timed(extractor.save_to_duckdb, page)
+                    seconds += page_seconds
+            record('save_to_duckdb', seconds, size)
+            os.remove(save_db_path)
+
+    if 'dbt' not in args.skip and os.path.exists(db_path):
+        # Étapes du pipeline, appliquées à la base du benchmark
+        for step, function, kwargs in [
+            ('best_efforts', strava_pipeline.best_efforts_step, {'full_refresh': True}),
+            ('dbt_run', strava_pipeline.dbt_step, {'command': 'run', 'full_refresh': True}),
+            ('dbt_run_incremental', strava_pipeline.dbt_step, {'command': 'run'}),
+            ('training_load', strava_pipeline.training_load_step, {'full_refresh': True}),
+        ]:
+            seconds, result = timed(function, db_path=db_path, **kwargs)
+            record(step, seconds, success=result['success'])
+            if not result['success']:
+                print(f"     Erreur : {result.get('error')}")
+                break
+
+    if 'dashboard' not in args.skip and os.path.exists(db_path):
+        # dbt garde une connexion en écriture dans ce processus : même configuration
+        # obligatoire (le dashboard, lui, ouvre la base en lecture seule)
+        conn = duckdb.connect(db_path, read_only='dbt' in args.skip)
+        try:
+            try:
+                options = dashboard_data.get_filter_options(conn)
+            except duckdb.CatalogException:
+                print("   Requetes du dashboard ignorees : marts absents (dbt non execute)")
+                return measures
+            for name, function, filters in dashboard_queries(options):
+                try:
+                    seconds = min(timed(function, conn, **filters)[0] for _ in range(args.repeat))
+                    record(f"query:{name}", seconds)
+                except duckdb.Error as e:
+                    # Table absente (dbt ignoré) : requête non mesurée
+                    print(f"   {f'query:{name}':<32} ignoree ({str(e).splitlines()[0]})")
+        finally:
+            conn.close()
+
+    return measures
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_regressions(history, records, threshold):
+    """Mesures plus lentes que `threshold` x la médiane des précédentes (même machine)"""
+    regressions = []
+    for record in records:
+        previous = [
+            entry['seconds'] for entry in history
+            if entry['machine'] == record['machine']
+            and entry['size'] == record['size']
+            and entry['step'] == record['step']
+            and entry.get('success', True)
+        ][-BASELINE_RUNS:]
+        if not previous:
+            continue
+        baseline = statistics.median(previous)
+        if record['seconds'] > baseline * threshold and record['seconds'] - baseline > MIN_REGRESSION_DELTA:
+            regressions.append({**record, 'baseline': baseline})
+    return regressions
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline Strava")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000], help="nombres d'activites")
+    parser.add_argument('--years', type=float, default=10, help="profondeur de l'historique simule")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=4, help="requetes HTTP simultanees")
+    parser.add_argument('--latency-ms', type=float, default=0, help="latence simulee par appel API")
+    parser.add_argument('--streams', type=int, default=0, help="activites dont les streams sont extraits")
+    parser.add_argument('--stream-interval', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3, help="essais par requete de dashboard")
+    parser.add_argument('--skip', nargs='*', default=[], choices=['extract', 'save', 'dbt', 'dashboard'])
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help="historique JSONL des mesures")
+    parser.add_argument('--no-record', action='store_true', help="ne pas ajouter les mesures a l'historique")
+    parser.add_argument('--threshold', type=float, default=1.3, help="ratio de regression tolere")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--keep', action='store_true', help="conserver les bases temporaires")
+    args = parser.parse_args()
+
+    run = {
+        'run_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'machine': platform.node(),
+        'python': platform.python_version(),
+        'duckdb': duckdb.__version__,
+    }
+    # Le registre multi-athlètes du projet ne doit pas être utilisé par le benchmark
+    for variable in ('STRAVA_ATHLETES_FILE', 'STRAVA_ATHLETES_JSON', 'STRAVA_TOKEN_CACHE'):
+        os.environ.pop(variable, None)
+
+    workdir = tempfile.mkdtemp(prefix='strava_benchmark_')
+    print(f"📊 Benchmark du pipeline (commit {run['commit']}, bases dans {workdir})")
+    records = []
+    try:
+        for size in args.sizes:
+            print(f"\n🏃 {size:,} activites")
+            for measure in benchmark_size(size, args, workdir):
+                records.append({**run, 'size': size, **measure})
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    history = load_history(args.history)
+    regressions = find_regressions(history, records, args.threshold)
+
+    if not args.no_record:
+        os.makedirs(os.path.dirname(args.history) or '.', exist_ok=True)
+        with open(args.history, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        print(f"\n💾 {len(records)} mesures ajoutees a {args.history}")
+
+    failed = [record for record in records if not record['success']]
+    for record in failed:
+        print(f"❌ {record['step']} ({record['size']:,} activites) en echec")
+
+    if regressions:
+        print(f"\n⚠️  {len(regressions)} regression(s) (> {args.threshold}x la mediane des {BASELINE_RUNS} derniers runs) :")
+        for record in regressions:
+            print(f"   {record['step']} ({record['size']:,} activites) : "
+                  f"{record['seconds']:.3f}s contre {record['baseline']:.3f}s")
+    else:
+        print("\n✅ Aucune regression detectee")
+
+    sys.exit(1 if failed or (regressions and args.fail_on_regression) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import duckdb
 
 # Connexion à la base
-conn = duckdb.connect('data/strava.duckdb')
+conn = duckdb.connect('data/strava.duckdb', read_only=True)
 
 # Vérifier les données
 print("=== VÉRIFICATION DES DONNÉES ===")
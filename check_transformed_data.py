@@ -2,7 +2,7 @@
 import duckdb
 
 def check_transformed_data():
-    conn = duckdb.connect('data/strava.duckdb')
+    conn = duckdb.connect('data/strava.duckdb', read_only=True)
     
     print("=== VÉRIFICATION DES DONNÉES TRANSFORMÉES ===\n")
     
@@ -81,8 +81,8 @@ def check_transformed_data():
             SELECT 
                 sport_type,
                 activities_count,
-                avg_pace_min_per_km,
-                pace_trend_min_per_km,
+                avg_pace_sec_per_km,
+                pace_trend_sec_per_km,
                 total_distance_km,
                 distance_trend_km
             FROM performance_trends
@@ -90,9 +90,9 @@ def check_transformed_data():
         """).fetchall()
         
         for perf in perf_stats:
-            trend_pace = f"({perf[3]:+.2f})" if perf[3] is not None else ""
+            trend_pace = f"({perf[3]:+.0f}s)" if perf[3] is not None else ""
             trend_dist = f"({perf[5]:+.1f}km)" if perf[5] is not None else ""
-            print(f"  - {perf[0]}: {perf[1]} activités, pace {perf[2]} min/km {trend_pace}, {perf[4]} km {trend_dist}")
+            print(f"  - {perf[0]}: {perf[1]} activités, pace {perf[2]} s/km {trend_pace}, {perf[4]} km {trend_dist}")
     except Exception as e:
         print(f"  ❌ Erreur: {e}")
     
@@ -32,7 +32,7 @@ def debug_dashboard():
     # 3. Vérifier la base de données
     if os.path.exists('data/strava.duckdb'):
         try:
-            conn = duckdb.connect('data/strava.duckdb')
+            conn = duckdb.connect('data/strava.duckdb', read_only=True)
             tables = conn.execute("SHOW TABLES").fetchall()
             
             print(f"\n💾 Tables dans la DB:")
@@ -20,7 +20,7 @@ def run_dashboard():
     # Vérifier que les transformations dbt ont été exécutées
     try:
         import duckdb
-        conn = duckdb.connect('data/strava.duckdb')
+        conn = duckdb.connect('data/strava.duckdb', read_only=True)
         tables = conn.execute("SHOW TABLES").fetchall()
         table_names = [table[0] for table in tables]
         
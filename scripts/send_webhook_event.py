@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Envoi d'événements webhook simulés (format Strava) au récepteur local
+
+    python scripts/send_webhook_event.py validate
+    python scripts/send_webhook_event.py create <activity_id> [<activity_id>...] [--owner 1001]
+    python scripts/send_webhook_event.py update <activity_id> --title "Sortie longue"
+    python scripts/send_webhook_event.py delete <activity_id>
+    python scripts/send_webhook_event.py deauthorize --owner 1001
+
+Avec le serveur simulé (benchmarks/mock_strava_server.py) et
+STRAVA_BASE_URL pointant dessus, le récepteur récupère les activités
+synthétiques : les IDs valent 10000000000 + index pour le premier athlète (1001).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+DEFAULT_URL = f"http://127.0.0.1:{os.getenv('STRAVA_WEBHOOK_PORT', 8080)}{os.getenv('STRAVA_WEBHOOK_PATH', '/webhook')}"
+
+
+def send(url, method='GET', payload=None):
+    """(statut HTTP, corps JSON) de la requête"""
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read() or b'{}')
+    except HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+
+def build_event(aspect_type, object_id, owner_id, object_type='activity', updates=None, subscription_id=None):
+    return {
+        'aspect_type': aspect_type,
+        'event_time': int(time.time()),
+        'object_id': object_id,
+        'object_type': object_type,
+        'owner_id': owner_id,
+        'subscription_id': subscription_id,
+        'updates': updates or {},
+    }
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Evenements webhook Strava simules")
+    parser.add_argument('action', choices=['validate', 'create', 'update', 'delete', 'deauthorize'])
+    parser.add_argument('activity_ids', type=int, nargs='*')
+    parser.add_argument('--owner', type=int, default=1001, help="athlete proprietaire (owner_id)")
+    parser.add_argument('--title', help="nouveau titre (update)")
+    parser.add_argument('--subscription-id', default=os.getenv('STRAVA_WEBHOOK_SUBSCRIPTION_ID'))
+    parser.add_argument('--verify-token', default=os.getenv('STRAVA_WEBHOOK_VERIFY_TOKEN'))
+    parser.add_argument('--url', default=DEFAULT_URL)
+    args = parser.parse_args()
+
+    if args.action == 'validate':
+        # Poignée de main de Strava à la création de l'abonnement
+        challenge = uuid.uuid4().hex
+        query = urlencode({'hub.mode': 'subscribe', 'hub.verify_token': args.verify_token or '',
+                           'hub.challenge': challenge})
+        status, body = send(f"{args.url}?{query}")
+        valid = status == 200 and body.get('hub.challenge') == challenge
+        print(f"{'✅' if valid else '❌'} Validation : {status} {body}")
+        sys.exit(0 if valid else 1)
+
+    if args.action == 'deauthorize':
+        events = [build_event('update', args.owner, args.owner, object_type='athlete',
+                              updates={'authorized': 'false'}, subscription_id=args.subscription_id)]
+    else:
+        if not args.activity_ids:
+            parser.error("au moins un activity_id est requis")
+        updates = {'title': args.title} if args.title else {}
+        events = [
+            build_event(args.action, activity_id, args.owner, updates=updates,
+                        subscription_id=args.subscription_id)
+            for activity_id in args.activity_ids
+        ]
+
+    failed = 0
+    for event in events:
+        status, body = send(args.url, 'POST', event)
+        failed += status != 200
+        print(f"{'✅' if status == 200 else '❌'} {event['aspect_type']} {event['object_id']} : {status} {body}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
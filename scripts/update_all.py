@@ -9,6 +9,9 @@ import subprocess
 import logging
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'pipeline'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'monitoring'))
+
 # Configuration du logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,34 +41,34 @@ def main():
     start_time = datetime.now()
     logging.info("🚀 Début de l'automatisation Strava Analytics")
     
-    # Étape 1: Extraction des données Strava
-    if not run_command(
-        "python src/extract/strava_extractor.py",
-        "Extraction des données Strava"
-    ):
-        logging.error("❌ Échec de l'extraction")
-        return False
+    # Étapes 1 à 4 : extraction, transformation dbt, tests et export Parquet,
+    # enchaînés dans ce processus
+    from strava_pipeline import run_pipeline
     
-    # Étape 2: Transformation dbt
-    if not run_command(
-        "dbt run --profiles-dir .",
-        "Transformation des données (dbt)",
-        cwd="src/transform/dbt_project"
-    ):
-        logging.error("❌ Échec de la transformation")
-        return False
+    pipeline = run_pipeline(force_transform=True, run_tests=True, export=True)
+    for step in pipeline['steps']:
+        if step['success']:
+            logging.info(f"✅ {step['step']} - Succès ({step['duration_s']}s)")
+        else:
+            logging.error(f"❌ {step['step']} - Erreur: {step.get('error')}")
     
-    # Étape 3: Tests dbt
-    run_command(
-        "dbt test --profiles-dir .",
-        "Tests de qualité des données",
-        cwd="src/transform/dbt_project"
-    )
+    # Détail du temps passé : spans les plus coûteux et volumes par étape
+    import instrumentation
+    spans, counters = instrumentation.summary()
+    for entry in [entry for entry in spans if entry['stage'] != 'pipeline'][:10]:
+        logging.info(f"⏱️ {entry['stage']}/{entry['name']} : {entry['total_s']}s "
+                     f"({entry['count']} appels, max {entry['max_s']}s)")
+    for stage, values in counters.items():
+        logging.info(f"📈 {stage} : " + ', '.join(f"{name}={value}" for name, value in sorted(values.items())))
+    
+    if not pipeline['success']:
+        logging.error("❌ Échec du pipeline")
+        return False
     
-    # Étape 4: Commit et push (si dans un repo git)
+    # Étape 5: Commit et push (si dans un repo git)
     if os.path.exists('.git'):
         run_command(
-            'git add data/strava.duckdb* && git commit -m "🤖 Auto-update data" && git push',
+            'git add data/lake && git commit -m "🤖 Auto-update data" && git push',
             "Commit et push des données"
         )
     
@@ -0,0 +1,313 @@
+"""
+Couche d'accès aux données du dashboard
+
+Requêtes paramétrées exécutées par DuckDB : les filtres sport / période sont
+poussés dans la clause WHERE et les agrégats sont calculés côté base (KPIs)
+ou lus dans les marts pré-agrégés au mois (heatmap, catégories de distance).
+Le dashboard ne reçoit que des résultats de taille bornée, indépendante de la
+profondeur de l'historique.
+
+Les fonctions prennent une connexion ouverte et ne dépendent pas de
+Streamlit ; la mise en cache est faite par le dashboard.
+"""
+from datetime import timedelta
+
+RECENT_ACTIVITIES_LIMIT = 15
+
+
+def build_activity_filters(sport=None, start_date=None, end_date=None, hive_partitioned=False,
+                           date_column='activity_date', athlete_id=None):
+    """Clause WHERE et paramètres pour les filtres du dashboard
+
+    Sur le lake Parquet (`hive_partitioned`), un filtre sur la colonne de
+    partition `year` permet en plus d'ignorer les fichiers hors période ;
+    `athlete_id` est lui-même une colonne de partition du lake.
+    """
+    conditions = []
+    params = []
+
+    if athlete_id is not None:
+        conditions.append("athlete_id = ?")
+        params.append(athlete_id)
+
+    if sport:
+        conditions.append("sport_type = ?")
+        params.append(sport)
+
+    if start_date is not None:
+        conditions.append(f"{date_column} >= ?")
+        params.append(start_date)
+        if hive_partitioned:
+            conditions.append("year >= ?")
+            params.append(start_date.year)
+
+    if end_date is not None:
+        conditions.append(f"{date_column} <= ?")
+        params.append(end_date)
+        if hive_partitioned:
+            conditions.append("year <= ?")
+            params.append(end_date.year)
+
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where_sql, params
+
+
+def build_month_filters(start_date=None, end_date=None, **filters):
+    """Filtres sur `activity_month` pour les marts agrégés au mois
+
+    La période est étendue aux mois entiers qui la recouvrent.
+    """
+    return build_activity_filters(
+        start_date=start_date.replace(day=1) if start_date is not None else None,
+        end_date=end_date.replace(day=1) if end_date is not None else None,
+        date_column='activity_month',
+        **filters
+    )
+
+
+def table_exists(conn, table):
+    """Table ou vue présente dans la base (ou dans le lake)"""
+    count, = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]
+    ).fetchone()
+    return count > 0
+
+
+def get_athletes(conn):
+    """Athlètes présents : [(athlete_id, nom)] ; le nom vient de la table `athletes` si elle existe"""
+    has_names = table_exists(conn, 'athletes')
+    name_sql = "n.athlete_name" if has_names else "NULL"
+    join_sql = "LEFT JOIN athletes n ON n.athlete_id = a.athlete_id" if has_names else ""
+    return conn.execute(f"""
+        SELECT DISTINCT a.athlete_id, {name_sql} AS athlete_name
+        FROM activities_summary a
+        {join_sql}
+        WHERE a.athlete_id IS NOT NULL
+        ORDER BY 1
+    """).fetchall()
+
+
+def get_filter_options(conn):
+    """Athlètes et sports disponibles, bornes de dates et nombre total d'activités"""
+    sports = [row[0] for row in conn.execute("""
+        SELECT DISTINCT sport_type FROM activities_summary
+        WHERE sport_type IS NOT NULL
+        ORDER BY sport_type
+    """).fetchall()]
+
+    min_date, max_date, total_count = conn.execute("""
+        SELECT MIN(activity_date)::DATE, MAX(activity_date)::DATE, COUNT(*)
+        FROM activities_summary
+    """).fetchone()
+
+    return {
+        'athletes': get_athletes(conn),
+        'sports': sports,
+        'min_date': min_date,
+        'max_date': max_date,
+        'total_count': total_count,
+    }
+
+
+def get_kpis(conn, **filters):
+    """Indicateurs clés de la sélection
+
+    Lus dans le mart `daily_stats` quand il existe : le total d'une période est
+    la différence entre les sommes cumulées du dernier jour et de la veille du
+    premier, soit deux lignes par athlète et sport quelle que soit la période.
+    """
+    if table_exists(conn, 'daily_stats'):
+        return get_kpis_from_prefix_sums(conn, **filters)
+
+    where_sql, params = build_activity_filters(**filters)
+    row = conn.execute(f"""
+        SELECT
+            COUNT(*),
+            COALESCE(SUM(distance_km), 0),
+            COALESCE(SUM(moving_time_minutes), 0),
+            -- Allure pondérée par la distance, comme les marts (macros/rollup.sql)
+            SUM(pace_sec_per_km * distance_km)
+                / NULLIF(SUM(distance_km) FILTER (WHERE pace_sec_per_km IS NOT NULL), 0),
+            COALESCE(SUM(total_elevation_gain_m), 0)
+        FROM activities_summary
+        {where_sql}
+    """, params).fetchone()
+
+    return {
+        'total_activities': row[0],
+        'total_distance_km': row[1],
+        'total_time_minutes': row[2],
+        'avg_pace_sec_per_km': row[3],
+        'total_elevation_m': row[4],
+    }
+
+
+def get_kpis_from_prefix_sums(conn, sport=None, start_date=None, end_date=None, athlete_id=None,
+                              hive_partitioned=False):
+    """KPIs de la période par différence des préfixes de `daily_stats`
+
+    La fin de période est ramenée au dernier jour du calendrier. Seuls les deux
+    jours bornes sont lus : row groups de ces dates (table triée par date) et,
+    sur le lake, partitions de leurs années. Un
+    groupe (athlète, sport) qui commence après la veille du début n'a rien à
+    soustraire.
+    """
+    last_date, = conn.execute("SELECT MAX(activity_date) FROM daily_stats").fetchone()
+    end = min(end_date, last_date) if end_date is not None and last_date is not None else last_date
+    before_start = start_date - timedelta(days=1) if start_date is not None else None
+    if end is None or (before_start is not None and before_start >= end):
+        return {
+            'total_activities': 0,
+            'total_distance_km': 0,
+            'total_time_minutes': 0,
+            'avg_pace_sec_per_km': None,
+            'total_elevation_m': 0,
+        }
+
+    days = [end, before_start if before_start is not None else end]
+    partition_sql = ""
+    if hive_partitioned:
+        partition_sql = "AND year IN (?, ?)"
+        days += [day.year for day in days]
+    where_sql, params = build_activity_filters(sport=sport, athlete_id=athlete_id)
+    row = conn.execute(f"""
+        WITH boundaries AS (
+            SELECT * FROM daily_stats
+            WHERE activity_date IN (?, ?) {partition_sql}
+        )
+        SELECT
+            SUM(cum_activities) FILTER (WHERE activity_date = ?),
+            SUM(cum_activities) FILTER (WHERE activity_date = ?),
+            SUM(cum_distance_km) FILTER (WHERE activity_date = ?),
+            SUM(cum_distance_km) FILTER (WHERE activity_date = ?),
+            SUM(cum_moving_time_minutes) FILTER (WHERE activity_date = ?),
+            SUM(cum_moving_time_minutes) FILTER (WHERE activity_date = ?),
+            SUM(cum_pace_weighted_s) FILTER (WHERE activity_date = ?),
+            SUM(cum_pace_weighted_s) FILTER (WHERE activity_date = ?),
+            SUM(cum_pace_distance_km) FILTER (WHERE activity_date = ?),
+            SUM(cum_pace_distance_km) FILTER (WHERE activity_date = ?),
+            SUM(cum_elevation_gain_m) FILTER (WHERE activity_date = ?),
+            SUM(cum_elevation_gain_m) FILTER (WHERE activity_date = ?)
+        FROM boundaries
+        {where_sql}
+    """, days + [end, before_start] * 6 + params).fetchone()
+
+    # (préfixe en fin de période) - (préfixe la veille du début)
+    totals = [(row[i] or 0) - (row[i + 1] or 0) for i in range(0, len(row), 2)]
+    activities, distance, moving_time, pace_weighted, pace_distance, elevation = totals
+    return {
+        'total_activities': int(activities),
+        'total_distance_km': distance,
+        'total_time_minutes': moving_time,
+        'avg_pace_sec_per_km': pace_weighted / pace_distance if pace_distance > 0 else None,
+        'total_elevation_m': elevation,
+    }
+
+
+def get_recent_activities(conn, limit=RECENT_ACTIVITIES_LIMIT, **filters):
+    """Dernières activités de la sélection (plus récente en premier)"""
+    where_sql, params = build_activity_filters(**filters)
+    return conn.execute(f"""
+        SELECT
+            activity_id, activity_name, sport_type, start_date, distance_km,
+            moving_time_minutes, pace_sec_per_km, total_elevation_gain_m
+        FROM activities_summary
+        {where_sql}
+        ORDER BY start_date DESC
+        LIMIT {int(limit)}
+    """, params).df()
+
+
+def get_distance_categories(conn, **filters):
+    """Nombre d'activités par catégorie de distance (somme du mart mensuel)"""
+    where_sql, params = build_month_filters(**filters)
+    return conn.execute(f"""
+        SELECT distance_category, SUM(activities_count) AS activities_count
+        FROM distance_category_stats
+        {where_sql}
+        GROUP BY distance_category
+        ORDER BY activities_count DESC
+    """, params).df()
+
+
+def get_weekday_hour_counts(conn, **filters):
+    """Nombre d'activités par jour de la semaine et heure de départ (somme du mart mensuel)"""
+    where_sql, params = build_month_filters(**filters)
+    return conn.execute(f"""
+        SELECT
+            day_name AS day_of_week,
+            hour,
+            SUM(activities_count) AS activities_count
+        FROM weekday_hour_stats
+        {where_sql}
+        GROUP BY day_name, hour
+    """, params).df()
+
+
+def get_training_load(conn, start_date=None, end_date=None, hive_partitioned=False,
+                      athlete_id=None, **filters):
+    """Série quotidienne ATL/CTL/TSB d'un athlète sur la période (tous sports confondus)"""
+    where_sql, params = build_activity_filters(
+        start_date=start_date, end_date=end_date, athlete_id=athlete_id,
+        hive_partitioned=hive_partitioned, date_column='load_date'
+    )
+    return conn.execute(f"""
+        SELECT athlete_id, load_date, daily_load, atl, ctl, tsb
+        FROM training_load
+        {where_sql}
+        ORDER BY load_date
+    """, params).df()
+
+
+def get_personal_bests(conn, athlete_id=None, hive_partitioned=False):
+    """Records par distance standard et par période (all_time, last_12_months, last_3_months)
+
+    Sans athlète sélectionné, le meilleur temps tous athlètes confondus (record du club).
+    """
+    where_sql, params = build_activity_filters(athlete_id=athlete_id, hive_partitioned=hive_partitioned)
+    return conn.execute(f"""
+        SELECT period, effort_name, distance_m, elapsed_time_s, pace_sec_per_km,
+               activity_name, start_date, athlete_id
+        FROM personal_bests
+        {where_sql}
+        QUALIFY ROW_NUMBER() OVER (
+            PARTITION BY period, effort_name ORDER BY elapsed_time_s, start_date
+        ) = 1
+        ORDER BY distance_m
+    """, params).df()
+
+
+def get_monthly_stats(conn, athlete_id=None, hive_partitioned=False):
+    """Statistiques mensuelles (une ligne par mois)
+
+    Le mart a une ligne par athlète et par mois : sans athlète sélectionné,
+    les athlètes du club sont additionnés. Les moyennes sont recalculées
+    depuis les totaux (allure pondérée par la distance, fréquence cardiaque
+    par le temps) ; les rythmes hebdomadaires des athlètes s'additionnent.
+    """
+    where_sql, params = build_activity_filters(athlete_id=athlete_id, hive_partitioned=hive_partitioned)
+    return conn.execute(f"""
+        SELECT
+            activity_month,
+            CAST(SUM(total_activities) AS BIGINT) AS total_activities,
+            CAST(SUM(road_runs) AS BIGINT) AS road_runs,
+            CAST(SUM(trail_runs) AS BIGINT) AS trail_runs,
+            ROUND(SUM(total_distance_km), 1) AS total_distance_km,
+            ROUND(SUM(total_distance_km) / SUM(total_activities), 1) AS avg_distance_km,
+            MAX(max_distance_km) AS max_distance_km,
+            ROUND(SUM(total_moving_time_minutes), 0) AS total_moving_time_minutes,
+            ROUND(SUM(total_moving_time_minutes) / 60.0, 1) AS total_moving_time_hours,
+            ROUND(SUM(total_elevation_gain_m), 0) AS total_elevation_gain_m,
+            ROUND(SUM(total_distance_km) / NULLIF(SUM(total_moving_time_minutes) / 60.0, 0), 2) AS avg_speed_kmh,
+            ROUND(SUM(avg_pace_sec_per_km * total_distance_km)
+                / NULLIF(SUM(total_distance_km) FILTER (WHERE avg_pace_sec_per_km IS NOT NULL), 0), 1)
+                AS avg_pace_sec_per_km,
+            ROUND(SUM(avg_heartrate * total_moving_time_minutes)
+                / NULLIF(SUM(total_moving_time_minutes) FILTER (WHERE avg_heartrate IS NOT NULL), 0), 0)
+                AS avg_heartrate,
+            ROUND(SUM(activities_per_week), 1) AS activities_per_week
+        FROM monthly_stats
+        {where_sql}
+        GROUP BY activity_month
+        ORDER BY activity_month DESC
+    """, params).df()
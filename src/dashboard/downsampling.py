@@ -0,0 +1,176 @@
+"""
+Sous-échantillonnage des séries tracées par le dashboard
+
+Plotly reçoit chaque point d'une trace en JSON : une série quotidienne sur
+dix ans ou un stream seconde par seconde représente vite plusieurs Mo par
+rerun. Les graphiques bornent donc leurs traces à la largeur du graphique :
+
+- LTTB (Largest-Triangle-Three-Buckets) pour les courbes : dans chaque
+  bucket, le point qui forme le plus grand triangle avec le point retenu
+  précédent et la moyenne du bucket suivant ; pics et creux sont conservés ;
+- min/max par bucket pour les barres et les signaux bruités : les deux
+  extrêmes de chaque bucket restent visibles ;
+- `SeriesPyramid` pour les plus longues séries : niveaux min/max précalculés
+  (deux fois moins de points à chaque niveau). Une plage quelconque est lue
+  dans le niveau le plus fin qui reste proche du budget, puis réduite au
+  budget exact : le coût d'un rendu ne dépend ni de la longueur de la série
+  ni de la plage choisie.
+
+Les calculs sont faits en NumPy ; les fonctions rendent des positions dans
+la série d'origine, pour garder les autres colonnes (libellés, couleurs).
+"""
+import numpy as np
+import pandas as pd
+
+# Largeur (px) d'un graphique pleine largeur et d'un graphique en demi-colonne
+FULL_WIDTH_PX = 1200
+HALF_WIDTH_PX = 600
+
+# Plus d'un point par pixel ne change rien au rendu
+POINTS_PER_PIXEL = 1
+
+# Un niveau de pyramide est retenu s'il a au plus ce multiple du budget dans la plage
+PYRAMID_OVERSAMPLING = 4
+
+
+def max_points_for_width(width_px=FULL_WIDTH_PX):
+    """Budget de points d'une trace pour un graphique de `width_px` pixels"""
+    return max(int(width_px * POINTS_PER_PIXEL), 3)
+
+
+def as_numeric(values):
+    """Abscisses en float64 (dates en nanosecondes) pour les calculs d'aire"""
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = pd.to_datetime(values).to_numpy()
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype('datetime64[ns]').astype(np.int64)
+    return values.astype(np.float64)
+
+
+def lttb_indices(x, y, max_points):
+    """Positions retenues par LTTB (croissantes, premier et dernier points inclus)"""
+    n = len(y)
+    if n <= max(max_points, 2):
+        return np.arange(n)
+    max_points = max(max_points, 3)
+    # Origine ramenée au premier point : les sommes cumulées restent précises
+    x = as_numeric(x)
+    x = x - x[0]
+    y = np.asarray(y, dtype=np.float64)
+
+    # max_points - 2 buckets entre le premier et le dernier point
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    cumulative_x = np.concatenate(([0.0], np.cumsum(x)))
+    cumulative_y = np.concatenate(([0.0], np.cumsum(y)))
+    mean_x = (cumulative_x[edges[1:]] - cumulative_x[edges[:-1]]) / sizes
+    mean_y = (cumulative_y[edges[1:]] - cumulative_y[edges[:-1]]) / sizes
+    # Le dernier bucket est comparé au dernier point
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Double de l'aire du triangle (point précédent, candidat, moyenne suivante)
+        areas = np.abs(
+            (x[previous] - next_x[bucket]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax_indices(y, max_points):
+    """Positions du minimum et du maximum de chaque bucket (croissantes, au plus max_points)
+
+    `y` ne doit pas contenir de NaN.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    buckets = max(max_points // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    bucket_of = np.repeat(np.arange(buckets), np.diff(edges))
+    extremes = []
+    for reduce in (np.minimum, np.maximum):
+        # Première position de chaque bucket égale à son extrême
+        candidates = np.flatnonzero(y == reduce.reduceat(y, edges[:-1])[bucket_of])
+        first = np.ones(len(candidates), dtype=bool)
+        first[1:] = bucket_of[candidates[1:]] != bucket_of[candidates[:-1]]
+        extremes.append(candidates[first])
+    # Une paire (minimum, maximum) par bucket, dans l'ordre des positions
+    pairs = np.sort(np.column_stack(extremes), axis=1).ravel()
+    return pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+
+
+def downsample(df, x_column, y_column, max_points=None, method='lttb'):
+    """Lignes de `df` à tracer pour `y_column` (x trié), au plus `max_points`
+
+    `method` : 'lttb' pour une courbe, 'minmax' pour des barres.
+    """
+    max_points = max_points or max_points_for_width()
+    if df is None or len(df) <= max_points:
+        return df
+    df = df[df[y_column].notna()]
+    if method == 'minmax':
+        positions = minmax_indices(df[y_column].to_numpy(), max_points)
+    else:
+        positions = lttb_indices(df[x_column].to_numpy(), df[y_column].to_numpy(), max_points)
+    return df.iloc[positions]
+
+
+class SeriesPyramid:
+    """Niveaux de résolution précalculés d'une série longue (une ou plusieurs colonnes)
+
+    Le niveau 0 est la série complète ; chaque niveau suivant garde le minimum
+    et le maximum de chaque bloc de 4 points du niveau précédent, jusqu'à
+    passer sous le budget d'un graphique pleine largeur. Un niveau stocke des
+    positions dans `df` (triée par `x_column`) : les fenêtres rendues gardent
+    toutes les colonnes.
+    """
+
+    def __init__(self, df, x_column, y_columns, min_points=None):
+        self.df = df.sort_values(x_column).reset_index(drop=True)
+        self.x_column = x_column
+        self.is_datetime = pd.api.types.is_datetime64_any_dtype(self.df[x_column])
+        self.x = as_numeric(self.df[x_column].to_numpy())
+        min_points = min_points or max_points_for_width() * PYRAMID_OVERSAMPLING
+        self.levels = {}
+        for column in y_columns:
+            y = self.df[column].to_numpy(dtype=np.float64)
+            level = np.flatnonzero(~np.isnan(y))
+            levels = [level]
+            while len(level) > min_points:
+                level = level[minmax_indices(y[level], len(level) // 2)]
+                levels.append(level)
+            self.levels[column] = levels
+
+    def bound(self, value):
+        if self.is_datetime:
+            return as_numeric(pd.to_datetime([value]).to_numpy())[0]
+        return float(value)
+
+    def window(self, column, start=None, end=None, max_points=None, method='lttb'):
+        """Lignes à tracer pour `column` entre `start` et `end` (inclus), au plus `max_points`"""
+        max_points = max_points or max_points_for_width()
+        for level in self.levels[column]:
+            x = self.x[level]
+            first = np.searchsorted(x, self.bound(start), side='left') if start is not None else 0
+            last = np.searchsorted(x, self.bound(end), side='right') if end is not None else len(level)
+            if last - first <= max_points * PYRAMID_OVERSAMPLING:
+                break
+        positions = level[first:last]
+        if method == 'minmax':
+            kept = minmax_indices(self.df[column].to_numpy()[positions], max_points)
+        else:
+            kept = lttb_indices(self.x[positions], self.df[column].to_numpy()[positions], max_points)
+        return self.df.iloc[positions[kept]]
+
+    def __len__(self):
+        return len(self.df)
@@ -0,0 +1,68 @@
+"""
+Mise en forme des durées et des allures affichées par le dashboard
+
+Les valeurs arrivent par colonnes entières (activités récentes, records) :
+chaque fonction formate un tableau en une passe NumPy (divisions entières et
+concaténations de chaînes vectorisées) plutôt qu'un appel Python par ligne.
+Une valeur seule (KPI) rend une chaîne, un tableau ou une Series un tableau
+de chaînes de même longueur. Valeurs manquantes, nulles ou négatives : texte
+de remplacement.
+"""
+import numpy as np
+
+
+def _format(values, missing, render):
+    """Applique `render` aux valeurs valides (> 0) et `missing` aux autres"""
+    values = np.asarray(values, dtype=np.float64)
+    scalar = values.ndim == 0
+    values = np.atleast_1d(values)
+    valid = np.isfinite(values) & (values > 0)
+    formatted = np.full(values.shape, missing, dtype=object)
+    if valid.any():
+        formatted[valid] = render(values[valid])
+    return formatted[0] if scalar else formatted
+
+
+def _join(*parts):
+    """Concatène élément par élément des tableaux de chaînes (ou des séparateurs)"""
+    joined = parts[0]
+    for part in parts[1:]:
+        joined = np.char.add(joined, part)
+    return joined
+
+
+def _two_digits(values):
+    return np.char.zfill(values.astype(str), 2)
+
+
+def _render_pace(sec_per_km):
+    minutes, seconds = np.divmod(np.rint(sec_per_km).astype(np.int64), 60)
+    return _join(minutes.astype(str), ':', _two_digits(seconds))
+
+
+def _render_duration(minutes):
+    hours, mins = np.divmod(minutes.astype(np.int64), 60)
+    return _join(hours.astype(str), ':', _two_digits(mins))
+
+
+def _render_effort_time(seconds):
+    hours, remainder = np.divmod(np.rint(seconds).astype(np.int64), 3600)
+    mins, secs = np.divmod(remainder, 60)
+    short = _join(mins.astype(str), ':', _two_digits(secs))
+    long = _join(hours.astype(str), ':', _two_digits(mins), ':', _two_digits(secs))
+    return np.where(hours > 0, long, short)
+
+
+def format_pace(sec_per_km):
+    """Allure en secondes par km -> "M:SS" (270 -> "4:30", 305 -> "5:05")"""
+    return _format(sec_per_km, "N/A", _render_pace)
+
+
+def format_duration(minutes):
+    """Durée en minutes -> "H:MM" (65 -> "1:05", 120 -> "2:00")"""
+    return _format(minutes, "N/A", _render_duration)
+
+
+def format_effort_time(seconds):
+    """Durée en secondes -> "MM:SS" ou "H:MM:SS" (1265 -> "21:05", 5430 -> "1:30:30")"""
+    return _format(seconds, "-", _render_effort_time)
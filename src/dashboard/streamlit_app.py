@@ -3,10 +3,29 @@ import duckdb
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import datetime
 import os
 import sys
 
+# Lecture du lake Parquet (data/lake) partagée avec l'export
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'export'))
+from parquet_lake import attach_lake_views, MANIFEST_NAME
+
+# Requêtes filtrées exécutées par DuckDB
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import dashboard_data
+
+# Séries bornées à la largeur des graphiques
+from downsampling import HALF_WIDTH_PX, SeriesPyramid, downsample, max_points_for_width
+
+# Durées et allures formatées par colonnes entières
+from formatting import format_duration, format_effort_time, format_pace
+
+# Durée des requêtes et des rendus (STRAVA_METRICS_FILE)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'monitoring'))
+import instrumentation
+
 # Configuration de la page
 st.set_page_config(
     page_title="🏃‍♂️ Strava Analytics",
@@ -30,68 +49,35 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def format_pace_display(pace_value):
-    """
-    Convertit la valeur pace_min_per_km (format 4.30) en affichage MM:SS
-    Exemple: 4.30 -> "4:30", 5.05 -> "5:05"
-    """
-    if pd.isna(pace_value) or pace_value <= 0:
-        return "N/A"
-    
-    # Extraire les minutes (partie entière)
-    minutes = int(pace_value)
-    
-    # Extraire les secondes (partie décimale * 100)
-    seconds = int(round((pace_value - minutes) * 100))
-    
-    # S'assurer que les secondes ne dépassent pas 59
-    if seconds >= 60:
-        minutes += seconds // 60
-        seconds = seconds % 60
-    
-    return f"{minutes}:{seconds:02d}"
-
-def format_duration_display(minutes):
-    """
-    Convertit les minutes en format HH:MM
-    Exemple: 65 -> "1:05", 120 -> "2:00"
-    """
-    if pd.isna(minutes) or minutes <= 0:
-        return "N/A"
-    
-    hours = int(minutes // 60)
-    mins = int(minutes % 60)
-    
-    return f"{hours}:{mins:02d}"
-
 def run_data_extraction():
     """Lance l'extraction des données Strava"""
     try:
-        # Ajouter le chemin vers l'extracteur
+        # Ajouter le chemin vers l'orchestrateur
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        extract_dir = os.path.join(current_dir, '..', 'extract')
-        sys.path.insert(0, extract_dir)
+        pipeline_dir = os.path.join(current_dir, '..', 'pipeline')
+        sys.path.insert(0, pipeline_dir)
         
-        # Importer et exécuter l'extracteur
-        from strava_extractor import main as extract_main
-        extract_main()
-        return True
+        # Extraction + transformations dbt dans ce processus
+        from strava_pipeline import run_pipeline
+        pipeline = run_pipeline(force_transform=True, run_tests=False)
+        return pipeline['success']
     except Exception as e:
         st.error(f"❌ Erreur lors de l'extraction: {e}")
         return False
 
+def find_database():
+    """Cherche la base DuckDB publiée"""
+    for path in ['data/strava.duckdb', '../../data/strava.duckdb', '../data/strava.duckdb']:
+        if os.path.exists(path):
+            return path
+    return None
+
 def ensure_data_exists():
     """S'assure que les données existent"""
     # Chercher la base de données dans différents emplacements
-    possible_paths = [
-        'data/strava.duckdb',
-        '../../data/strava.duckdb',
-        '../data/strava.duckdb'
-    ]
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            return True, path
+    path = find_database()
+    if path:
+        return True, path
     
     # Si aucune base trouvée, proposer l'extraction
     st.warning("⚠️ Aucune donnée trouvée")
@@ -106,55 +92,127 @@ def ensure_data_exists():
     
     return False, None
 
-#@st.cache_data(ttl=300)  # Cache pendant 5 minutes
-def load_data():
-    """Charge les données depuis DuckDB"""
+def find_lake_dir():
+    """Cherche un export Parquet (data/lake) complet"""
+    for path in ['data/lake', '../../data/lake', '../data/lake']:
+        if os.path.exists(os.path.join(path, MANIFEST_NAME)):
+            return path
+    return None
+
+def resolve_data_source():
+    """Source des données : ('parquet', lake) si STRAVA_DATA_SOURCE=parquet, sinon ('duckdb', base)
+    
+    Seul le lake est versionné : sans base locale (Streamlit Cloud), le lake est lu.
+    """
+    if os.getenv('STRAVA_DATA_SOURCE') == 'parquet' or not find_database():
+        lake_dir = find_lake_dir()
+        if lake_dir:
+            st.sidebar.success("✅ Lake Parquet connecté")
+            return 'parquet', lake_dir
+    
+    data_exists, db_path = ensure_data_exists()
+    if not data_exists:
+        return None
+    
+    st.sidebar.success(f"✅ Base de données connectée")
+    return 'duckdb', db_path
+
+def data_version(source):
+    """Tampon de version des données : date de modification de la base ou du manifeste du lake
+    
+    Chaque publication du pipeline remplace ce fichier, ce qui invalide le cache.
+    """
+    kind, path = source
+    stamp_path = os.path.join(path, MANIFEST_NAME) if kind == 'parquet' else path
     try:
-        # Vérifier que les données existent
-        data_exists, db_path = ensure_data_exists()
-        if not data_exists:
-            return None, None, None, None
-        
-        st.sidebar.success(f"✅ Base de données connectée")
+        return os.stat(stamp_path).st_mtime_ns
+    except OSError:
+        return None
 
-        conn = duckdb.connect(db_path)
-        
-        # Charger les différentes tables
-        activities = conn.execute("SELECT * FROM activities_summary ORDER BY start_date DESC").df()
-        monthly_stats = conn.execute("SELECT * FROM monthly_stats ORDER BY activity_month DESC").df()
-        performance_trends = conn.execute("SELECT * FROM performance_trends ORDER BY activity_month DESC, sport_type").df()
-        
-        # Données brutes pour analyses spécifiques
-        raw_activities = conn.execute("""
-            SELECT 
-                activity_id, activity_name, sport_type, start_date, distance_km,
-                moving_time_minutes, average_speed_kmh, pace_min_per_km,
-                total_elevation_gain_m, average_heartrate, activity_date
-            FROM activities_summary 
-            ORDER BY start_date DESC
-        """).df()
-        
-        conn.close()
-        
-        return activities, monthly_stats, performance_trends, raw_activities
-        
-    except Exception as e:
-        st.error(f"❌ Erreur lors du chargement des données : {e}")
-        return None, None, None, None
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_shared_connection(source, version):
+    """Connexion partagée par toutes les sessions pour une version des données
+    
+    La base publiée est attachée en lecture seule à une base en mémoire : ATTACH
+    ouvre le fichier courant, alors que duckdb.connect(chemin) reprendrait
+    l'instance de l'instantané précédent tant qu'elle est ouverte dans le
+    processus. L'entrée de la version précédente est évincée à la publication
+    suivante, ce qui referme l'ancien fichier.
+    """
+    kind, path = source
+    conn = duckdb.connect()
+    if kind == 'parquet':
+        attach_lake_views(conn, path)
+    else:
+        quoted_path = path.replace("'", "''")
+        conn.execute(f"ATTACH '{quoted_path}' AS strava (READ_ONLY)")
+    return conn
 
+def open_data_connection(source, version):
+    """Curseur (connexion propre au thread) sur la connexion partagée"""
+    cursor = get_shared_connection(source, version).cursor()
+    if source[0] == 'duckdb':
+        cursor.execute("USE strava")
+    return cursor
 
-def display_kpis(activities_df):
-    """Affiche les KPIs principaux"""
-    if activities_df is None or activities_df.empty:
+@st.cache_data(max_entries=256, show_spinner=False)
+def run_cached_query(source, version, query_name, filters=()):
+    """Exécute une requête de `dashboard_data`, mise en cache par source, version et filtres"""
+    with instrumentation.span(query_name, 'dashboard_query', source=source[0]) as span:
+        conn = open_data_connection(source, version)
+        try:
+            query = getattr(dashboard_data, query_name)
+            result = query(conn, **dict(filters))
+        finally:
+            conn.close()
+        if isinstance(result, pd.DataFrame):
+            span['rows'] = len(result)
+        return result
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def get_cached_pyramid(source, version, query_name, x_column, y_columns, filters=()):
+    """Niveaux de résolution (SeriesPyramid) du résultat d'une requête, construits une fois par version"""
+    result = run_cached_query(source, version, query_name, filters)
+    with instrumentation.span(f'pyramid:{query_name}', 'dashboard_query', rows=len(result)):
+        return SeriesPyramid(result, x_column, y_columns)
+
+def make_query_runner(source):
+    """Retourne (query, pyramid) liés à la source et à sa version courante
+    
+    query(nom, **filtres) rend le résultat d'une requête de `dashboard_data` ;
+    pyramid(nom, x, colonnes, **filtres) rend la série complète sous forme de
+    SeriesPyramid, dont la période est choisie au rendu sans nouvelle requête.
+    """
+    version = data_version(source)
+    hive_partitioned = source[0] == 'parquet'
+    
+    def query(query_name, **filters):
+        if filters and hive_partitioned:
+            filters['hive_partitioned'] = True
+        return run_cached_query(source, version, query_name, tuple(sorted(filters.items())))
+    
+    def pyramid(query_name, x_column, y_columns, **filters):
+        if filters and hive_partitioned:
+            filters['hive_partitioned'] = True
+        return get_cached_pyramid(source, version, query_name, x_column, tuple(y_columns),
+                                  tuple(sorted(filters.items())))
+    
+    return query, pyramid
+
+
+@instrumentation.timed('dashboard_render')
+def display_kpis(kpis):
+    """Affiche les KPIs principaux (agrégats calculés par DuckDB)"""
+    if not kpis or kpis['total_activities'] == 0:
         st.warning("Aucune donnée disponible")
         return
     
-    # Calculs des KPIs
-    total_activities = len(activities_df)
-    total_distance = activities_df['distance_km'].sum()
-    total_time_hours = activities_df['moving_time_minutes'].sum()
-    avg_pace = activities_df['pace_min_per_km'].mean()
-    total_elevation = activities_df['total_elevation_gain_m'].sum()
+    # KPIs de la sélection
+    total_activities = kpis['total_activities']
+    total_distance = kpis['total_distance_km']
+    total_time_hours = kpis['total_time_minutes']
+    avg_pace = kpis['avg_pace_sec_per_km']
+    total_elevation = kpis['total_elevation_m']
     
     # Affichage en colonnes
     col1, col2, col3, col4, col5 = st.columns(5)
@@ -175,7 +233,7 @@ def display_kpis(activities_df):
     
     with col3:
         # Formatage du temps total en HH:MM
-        total_time_formatted = format_duration_display(total_time_hours)
+        total_time_formatted = format_duration(total_time_hours)
         st.metric(
             label="⏱️ Temps Total",
             value=total_time_formatted,
@@ -184,7 +242,7 @@ def display_kpis(activities_df):
     
     with col4:
         # Formatage de l'allure en MM:SS
-        avg_pace_formatted = format_pace_display(avg_pace)
+        avg_pace_formatted = format_pace(avg_pace)
         st.metric(
             label="⚡ Allure Moyenne",
             value=avg_pace_formatted,
@@ -198,23 +256,27 @@ def display_kpis(activities_df):
             delta=None
         )
 
+@instrumentation.timed('dashboard_render')
 def plot_monthly_evolution(monthly_stats_df):
     """Graphique d'évolution mensuelle"""
     if monthly_stats_df is None or monthly_stats_df.empty:
         st.warning("Aucune donnée mensuelle disponible")
         return
     
-    # Préparer les données
+    # Préparer les données (au plus un point par pixel d'une demi-colonne)
     df = monthly_stats_df.copy()
     df['month_str'] = df['activity_month'].dt.strftime('%Y-%m')
+    max_points = max_points_for_width(HALF_WIDTH_PX)
+    distance_df = downsample(df, 'activity_month', 'total_distance_km', max_points)
+    activities_df = downsample(df, 'activity_month', 'total_activities', max_points)
     
     # Graphique avec deux axes Y
     fig = go.Figure()
     
     # Distance (axe principal)
     fig.add_trace(go.Scatter(
-        x=df['month_str'],
-        y=df['total_distance_km'],
+        x=distance_df['month_str'],
+        y=distance_df['total_distance_km'],
         mode='lines+markers',
         name='Distance (km)',
         line=dict(color='#ff4b4b', width=3),
@@ -223,8 +285,8 @@ def plot_monthly_evolution(monthly_stats_df):
     
     # Nombre d'activités (axe secondaire)
     fig.add_trace(go.Scatter(
-        x=df['month_str'],
-        y=df['total_activities'],
+        x=activities_df['month_str'],
+        y=activities_df['total_activities'],
         mode='lines+markers',
         name='Nb Activités',
         yaxis='y2',
@@ -255,6 +317,59 @@ def plot_monthly_evolution(monthly_stats_df):
     
     st.plotly_chart(fig, use_container_width=True)
 
+@instrumentation.timed('dashboard_render')
+def plot_training_load(training_load, start_date=None, end_date=None):
+    """Charge d'entraînement : fatigue (ATL), forme de fond (CTL) et fraîcheur (TSB)
+    
+    `training_load` est la SeriesPyramid de la série complète : chaque trace
+    est lue sur la période et bornée à la largeur du graphique.
+    """
+    if training_load is None or len(training_load) == 0:
+        st.info("ℹ️ Charge d'entraînement non calculée (python src/transform/training_load.py)")
+        return
+    
+    # Extrêmes de fraîcheur conservés, forme des courbes ATL/CTL conservée
+    tsb = training_load.window('tsb', start_date, end_date, method='minmax')
+    ctl = training_load.window('ctl', start_date, end_date)
+    atl = training_load.window('atl', start_date, end_date)
+    fig = go.Figure()
+    
+    # Fraîcheur en barres (positive = reposé, négative = fatigué)
+    fig.add_trace(go.Bar(
+        x=tsb['load_date'],
+        y=tsb['tsb'],
+        name='Fraîcheur (TSB)',
+        marker_color=np.where(tsb['tsb'] >= 0, '#2ca02c', '#d62728'),
+        opacity=0.4
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=ctl['load_date'],
+        y=ctl['ctl'],
+        mode='lines',
+        name='Forme (CTL 42j)',
+        line=dict(color='#1f77b4', width=3)
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=atl['load_date'],
+        y=atl['atl'],
+        mode='lines',
+        name='Fatigue (ATL 7j)',
+        line=dict(color='#ff7f0e', width=2)
+    ))
+    
+    fig.update_layout(
+        title="💪 Charge d'Entraînement",
+        xaxis_title="Date",
+        yaxis_title="Charge",
+        hovermode='x unified',
+        height=400
+    )
+    
+    st.plotly_chart(fig, use_container_width=True)
+
+@instrumentation.timed('dashboard_render')
 def plot_recent_activities_trends(activities_df):
     """Line chart des 5 dernières activités avec distance et temps"""
     if activities_df is None or activities_df.empty:
@@ -361,17 +476,15 @@ def plot_recent_activities_trends(activities_df):
 
 
 
-def plot_distance_categories(activities_df):
+@instrumentation.timed('dashboard_render')
+def plot_distance_categories(category_counts_df):
     """Répartition par catégories de distance"""
-    if activities_df is None or activities_df.empty:
+    if category_counts_df is None or category_counts_df.empty:
         return
     
-    # Compter par catégorie
-    category_counts = activities_df['distance_category'].value_counts()
-    
     fig = px.pie(
-        values=category_counts.values,
-        names=category_counts.index,
+        values=category_counts_df['activities_count'],
+        names=category_counts_df['distance_category'],
         title="🎯 Répartition par Distance",
         color_discrete_sequence=px.colors.qualitative.Set3
     )
@@ -380,22 +493,14 @@ def plot_distance_categories(activities_df):
     fig.update_layout(height=400)
     st.plotly_chart(fig, use_container_width=True)
 
-def plot_weekly_heatmap(activities_df):
+@instrumentation.timed('dashboard_render')
+def plot_weekly_heatmap(heatmap_data):
     """Heatmap des activités par jour de la semaine et heure"""
-    if activities_df is None or activities_df.empty:
+    if heatmap_data is None or heatmap_data.empty:
         return
     
-    # Préparer les données
-    df = activities_df.copy()
-    df['start_date'] = pd.to_datetime(df['start_date'])
-    df['day_of_week'] = df['start_date'].dt.day_name()
-    df['hour'] = df['start_date'].dt.hour
-    
-    # Créer une matrice pour la heatmap
-    heatmap_data = df.groupby(['day_of_week', 'hour']).size().reset_index(name='count')
-    
-    # Pivot pour la heatmap
-    heatmap_pivot = heatmap_data.pivot(index='day_of_week', columns='hour', values='count').fillna(0)
+    # Pivot des comptages (jour, heure) calculés par DuckDB
+    heatmap_pivot = heatmap_data.pivot(index='day_of_week', columns='hour', values='activities_count').fillna(0)
     
     # Réorganiser les jours de la semaine
     day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -411,6 +516,37 @@ def plot_weekly_heatmap(activities_df):
     fig.update_layout(height=400)
     st.plotly_chart(fig, use_container_width=True)
 
+@instrumentation.timed('dashboard_render')
+def display_personal_bests(personal_bests_df):
+    """Tableau des records personnels (tous temps et fenêtres glissantes)"""
+    if personal_bests_df is None or personal_bests_df.empty:
+        return
+    
+    st.subheader("🏅 Records Personnels")
+    
+    all_time = personal_bests_df[personal_bests_df['period'] == 'all_time'].copy()
+    
+    # Meilleur temps de chaque fenêtre glissante, aligné sur la distance
+    for period, label in [('last_12_months', '12 derniers mois'), ('last_3_months', '3 derniers mois')]:
+        recent = personal_bests_df[personal_bests_df['period'] == period].set_index('effort_name')['elapsed_time_s']
+        all_time[label] = format_effort_time(all_time['effort_name'].map(recent))
+    
+    all_time['Distance'] = all_time['effort_name'].map({
+        '1k': '1 km', '5k': '5 km', '10k': '10 km',
+        'half_marathon': 'Semi-marathon', 'marathon': 'Marathon'
+    })
+    all_time['Record'] = format_effort_time(all_time['elapsed_time_s'])
+    all_time['Allure'] = format_pace(all_time['pace_sec_per_km'])
+    all_time['Date'] = pd.to_datetime(all_time['start_date']).dt.strftime('%d/%m/%Y')
+    all_time = all_time.rename(columns={'activity_name': 'Activité'})
+    
+    st.dataframe(
+        all_time[['Distance', 'Record', 'Allure', 'Date', 'Activité', '12 derniers mois', '3 derniers mois']],
+        use_container_width=True,
+        hide_index=True
+    )
+
+@instrumentation.timed('dashboard_render')
 def display_recent_activities(activities_df):
     """Tableau des activités récentes"""
     if activities_df is None or activities_df.empty:
@@ -419,9 +555,9 @@ def display_recent_activities(activities_df):
     st.subheader("🕐 Activités Récentes")
     
     # Sélectionner les colonnes importantes
-    recent_activities = activities_df.head(15)[[
+    recent_activities = activities_df.head(dashboard_data.RECENT_ACTIVITIES_LIMIT)[[
         'activity_name', 'sport_type', 'start_date', 'distance_km',
-        'moving_time_minutes', 'pace_min_per_km', 'total_elevation_gain_m'
+        'moving_time_minutes', 'pace_sec_per_km', 'total_elevation_gain_m'
     ]].copy()
     
     # Formater les données
@@ -429,10 +565,10 @@ def display_recent_activities(activities_df):
     recent_activities['distance_km'] = recent_activities['distance_km'].round(2)
     
     # Formatage du temps en HH:MM
-    recent_activities['moving_time_formatted'] = recent_activities['moving_time_minutes'].apply(format_duration_display)
+    recent_activities['moving_time_formatted'] = format_duration(recent_activities['moving_time_minutes'])
     
     # Formatage de l'allure en MM:SS
-    recent_activities['pace_formatted'] = recent_activities['pace_min_per_km'].apply(format_pace_display)
+    recent_activities['pace_formatted'] = format_pace(recent_activities['pace_sec_per_km'])
     
     recent_activities['total_elevation_gain_m'] = recent_activities['total_elevation_gain_m'].round(0).astype(int)
     
@@ -457,44 +593,81 @@ def main():
     st.title("🏃‍♂️ Mon Dashboard Strava")
     st.markdown("---")
     
-    # Chargement des données
-    with st.spinner("Chargement des données..."):
-        activities, monthly_stats, performance_trends, raw_activities = load_data()
+    # Source des données et requêtes mises en cache
+    source = resolve_data_source()
+    if source is None:
+        st.error("Impossible de charger les données. Vérifiez que l'extraction Strava a été effectuée.")
+        st.stop()
+    query, pyramid = make_query_runner(source)
+    
+    try:
+        options = query('get_filter_options')
+    except Exception as e:
+        st.error(f"❌ Erreur lors du chargement des données : {e}")
+        st.stop()
     
-    if activities is None:
+    if options['total_count'] == 0:
         st.error("Impossible de charger les données. Vérifiez que l'extraction Strava a été effectuée.")
         st.stop()
     
     # Sidebar pour les filtres
     st.sidebar.header("🔧 Filtres")
     
+    # Filtre par athlète (mode club)
+    athlete_id = None
+    if len(options['athletes']) > 1:
+        athlete_labels = {
+            athlete: name or f"Athlète {athlete}" for athlete, name in options['athletes']
+        }
+        selected_athlete = st.sidebar.selectbox(
+            "Athlète", ['Tous'] + list(athlete_labels),
+            format_func=lambda athlete: athlete_labels.get(athlete, athlete)
+        )
+        athlete_id = selected_athlete if selected_athlete != 'Tous' else None
+    single_athlete = len(options['athletes']) <= 1
+    
     # Filtre par sport
-    sports = ['Tous'] + list(activities['sport_type'].unique())
+    sports = ['Tous'] + options['sports']
     selected_sport = st.sidebar.selectbox("Sport", sports)
     
     # Filtre par période
     date_range = st.sidebar.date_input(
         "Période",
-        value=(activities['activity_date'].min(), activities['activity_date'].max()),
-        min_value=activities['activity_date'].min(),
-        max_value=activities['activity_date'].max()
+        value=(options['min_date'], options['max_date']),
+        min_value=options['min_date'],
+        max_value=options['max_date']
     )
     
-    # Appliquer les filtres
-    filtered_activities = activities.copy()
-    
-    if selected_sport != 'Tous':
-        filtered_activities = filtered_activities[filtered_activities['sport_type'] == selected_sport]
-    
+    # Filtres poussés dans les requêtes DuckDB
+    filters = {'sport': selected_sport if selected_sport != 'Tous' else None, 'athlete_id': athlete_id}
     if len(date_range) == 2:
-        filtered_activities = filtered_activities[
-            (filtered_activities['activity_date'] >= pd.to_datetime(date_range[0])) &
-            (filtered_activities['activity_date'] <= pd.to_datetime(date_range[1]))
-        ]
+        filters['start_date'], filters['end_date'] = date_range
+    
+    with st.spinner("Chargement des données..."):
+        kpis = query('get_kpis', **filters)
+        recent_activities = query('get_recent_activities', **filters)
+        category_counts = query('get_distance_categories', **filters)
+        heatmap_data = query('get_weekday_hour_counts', **filters)
+        monthly_stats = query('get_monthly_stats', athlete_id=athlete_id)
+        try:
+            # La charge d'entraînement n'a de sens que pour un athlète ; série
+            # complète, la période est appliquée au tracé
+            if athlete_id is not None or single_athlete:
+                training_load = pyramid('get_training_load', 'load_date', ('atl', 'ctl', 'tsb'),
+                                        athlete_id=athlete_id)
+            else:
+                training_load = None
+        except Exception:
+            # Table absente tant que le pipeline n'a pas tourné
+            training_load = None
+        try:
+            personal_bests = query('get_personal_bests', athlete_id=athlete_id)
+        except Exception:
+            personal_bests = None
     
     # Affichage des KPIs
     st.subheader("📊 Indicateurs Clés")
-    display_kpis(filtered_activities)
+    display_kpis(kpis)
     
     st.markdown("---")
     
@@ -503,21 +676,35 @@ def main():
     
     with col1:
         plot_monthly_evolution(monthly_stats)
-        plot_distance_categories(filtered_activities)
+        plot_distance_categories(category_counts)
     
     with col2:
-        plot_recent_activities_trends(filtered_activities)
-        plot_weekly_heatmap(filtered_activities)
+        plot_recent_activities_trends(recent_activities)
+        plot_weekly_heatmap(heatmap_data)
+    
+    st.markdown("---")
+    
+    # Charge d'entraînement (tous sports, sur la période)
+    if athlete_id is not None or single_athlete:
+        plot_training_load(training_load, filters.get('start_date'), filters.get('end_date'))
+    else:
+        st.info("ℹ️ Sélectionnez un athlète pour afficher sa charge d'entraînement")
     
     st.markdown("---")
     
+    # Records personnels (calculés depuis les streams)
+    display_personal_bests(personal_bests)
+    
     # Tableau des activités récentes
-    display_recent_activities(filtered_activities)
+    display_recent_activities(recent_activities)
     
     # Informations de mise à jour
     st.sidebar.markdown("---")
     st.sidebar.info(f"📅 Dernière mise à jour : {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-    st.sidebar.info(f"📈 {len(activities)} activités au total")
+    st.sidebar.info(f"📈 {options['total_count']} activités au total")
+    
+    # Spans de ce rendu (requêtes exécutées hors cache, graphiques)
+    instrumentation.flush()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,244 @@
+import json
+import os
+import shutil
+import sys
+
+import duckdb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'monitoring'))
+import instrumentation
+
+# Base de travail (jamais la base publiée lue par le dashboard)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pipeline'))
+from db_snapshot import PUBLISHED_DB_PATH, STAGING_DB_PATH, prepare_staging
+
+# Tables exportées -> colonne de date servant au partitionnement year=/month=
+# (toutes sont en plus partitionnées par athlete_id=)
+LAKE_TABLES = {
+    'raw_activities': 'start_date',
+    'activities_summary': 'start_date',
+    'monthly_stats': 'activity_month',
+    'performance_trends': 'activity_month',
+    'weekday_hour_stats': 'activity_month',
+    'distance_category_stats': 'activity_month',
+    'training_load': 'load_date',
+    'personal_bests': 'start_date',
+    'daily_stats': 'activity_date',
+    'period_stats': 'period_start',
+}
+
+MANIFEST_NAME = '_manifest.json'
+
+# Version de l'arborescence : un lake plus ancien est réécrit entièrement
+LAYOUT_VERSION = 2
+
+# Nom de partition Hive lu comme NULL par DuckDB
+HIVE_NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+
+def lake_table_path(lake_dir, table):
+    """Motif glob des fichiers Parquet d'une table du lake"""
+    return os.path.join(lake_dir, table, '*', '*', '*', '*.parquet').replace('\\', '/')
+
+
+def attach_lake_views(conn, lake_dir='data/lake'):
+    """Expose chaque table du lake comme une vue `read_parquet`
+
+    Les colonnes `athlete_id`/`year`/`month` issues du partitionnement Hive
+    permettent à DuckDB d'ignorer les partitions hors du filtre ; les statistiques min/max des
+    row groups Parquet élaguent aussi les filtres sur les colonnes de date.
+    Retourne la liste des vues créées.
+    """
+    views = []
+    for table in LAKE_TABLES:
+        if not os.path.isdir(os.path.join(lake_dir, table)):
+            continue
+        conn.execute(f"""
+            CREATE OR REPLACE VIEW {table} AS
+            SELECT * FROM read_parquet('{lake_table_path(lake_dir, table)}', hive_partitioning = true)
+        """)
+        views.append(table)
+    return views
+
+
+class ParquetLakeExporter:
+    """Export des tables DuckDB en Parquet partitionné par athlète/année/mois
+
+    Une empreinte (nombre de lignes + XOR des hash de lignes) est calculée par
+    partition et comparée au manifeste du précédent export : seules les
+    partitions modifiées sont réécrites, les partitions disparues sont supprimées.
+    Les mises à jour produisent ainsi de petits diffs git.
+    """
+
+    def __init__(self, db_path=STAGING_DB_PATH, lake_dir='data/lake', read_only=True):
+        self.db_path = db_path
+        self.lake_dir = lake_dir
+        # Dans un processus qui a déjà la base ouverte en écriture (dbt), DuckDB
+        # impose la même configuration de connexion
+        self.read_only = read_only
+        self.manifest_path = os.path.join(lake_dir, MANIFEST_NAME)
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def partition_dir(self, table, athlete, year, month):
+        return os.path.join(self.lake_dir, table, f'athlete_id={athlete}', f'year={year}', f'month={month}')
+
+    def partition_fingerprints(self, conn, table, date_column):
+        """Empreinte de chaque partition : {'123/2024-1': '42:123456789'}"""
+        rows = conn.execute(f"""
+            SELECT
+                COALESCE(CAST(athlete_id AS VARCHAR), '{HIVE_NULL_PARTITION}') AS athlete,
+                YEAR({date_column}) AS year,
+                MONTH({date_column}) AS month,
+                COUNT(*) AS row_count,
+                BIT_XOR(HASH(t)) AS row_hash
+            FROM {table} t
+            WHERE {date_column} IS NOT NULL
+            GROUP BY 1, 2, 3
+        """).fetchall()
+        return {
+            f'{athlete}/{year}-{month}': f'{row_count}:{row_hash}'
+            for athlete, year, month, row_count, row_hash in rows
+        }
+
+    def write_partition(self, conn, table, date_column, athlete, year, month):
+        """Réécrit une partition (fichier temporaire puis remplacement atomique)"""
+        target_dir = self.partition_dir(table, athlete, year, month)
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, 'data.parquet')
+        tmp_target = target + '.tmp'
+
+        athlete_filter = "athlete_id IS NULL" if athlete == HIVE_NULL_PARTITION else f"athlete_id = {int(athlete)}"
+        with instrumentation.span('write_partition', 'export', table=table) as span:
+            rows, = conn.execute(f"""
+                COPY (
+                    SELECT * FROM {table}
+                    WHERE {athlete_filter}
+                      AND YEAR({date_column}) = {int(year)} AND MONTH({date_column}) = {int(month)}
+                    ORDER BY {date_column}
+                ) TO '{tmp_target.replace(chr(92), '/')}' (FORMAT PARQUET, COMPRESSION ZSTD)
+            """).fetchone()
+            os.replace(tmp_target, target)
+            span['rows'] = rows
+            span['bytes'] = os.path.getsize(target)
+
+    def export_table(self, conn, table, date_column, previous):
+        """Exporte une table ; retourne (empreintes courantes, nb partitions écrites, supprimées)"""
+        current = self.partition_fingerprints(conn, table, date_column)
+        written = 0
+        for key, fingerprint in current.items():
+            if previous.get(key) == fingerprint:
+                continue
+            athlete, period = key.split('/')
+            year, month = period.split('-')
+            self.write_partition(conn, table, date_column, athlete, year, month)
+            written += 1
+
+        removed = 0
+        for key in set(previous) - set(current):
+            athlete, period = key.split('/')
+            year, month = period.split('-')
+            shutil.rmtree(self.partition_dir(table, athlete, year, month), ignore_errors=True)
+            removed += 1
+
+        return current, written, removed
+
+    def export(self):
+        """Exporte toutes les tables présentes ; retourne le nombre de partitions réécrites"""
+        if not os.path.exists(self.db_path):
+            print(f"Base de donnees introuvable : {self.db_path}")
+            return None
+
+        os.makedirs(self.lake_dir, exist_ok=True)
+        manifest = self.load_manifest()
+        if manifest.get('layout') != LAYOUT_VERSION:
+            # Ancienne arborescence (sans athlete_id=) : tout est réécrit
+            for table in LAKE_TABLES:
+                shutil.rmtree(os.path.join(self.lake_dir, table), ignore_errors=True)
+            manifest = {'layout': LAYOUT_VERSION}
+        conn = duckdb.connect(self.db_path, read_only=self.read_only)
+        try:
+            existing_tables = {row[0] for row in conn.execute("SHOW TABLES").fetchall()}
+            total_written = 0
+            for table, date_column in LAKE_TABLES.items():
+                if table not in existing_tables:
+                    continue
+                fingerprints, written, removed = self.export_table(
+                    conn, table, date_column, manifest.get(table, {})
+                )
+                manifest[table] = fingerprints
+                total_written += written
+                print(f"{table} : {written} partitions reecrites, {removed} supprimees, "
+                      f"{len(fingerprints) - written} inchangees")
+        finally:
+            conn.close()
+
+        self.save_manifest(manifest)
+        return total_written
+
+
+def restore_database(db_path=STAGING_DB_PATH, lake_dir='data/lake'):
+    """Reconstruit raw_activities depuis le lake ; retourne le nombre d'activités restaurées
+
+    Seul le lake est versionné : sur une machine neuve (runner CI sans cache),
+    la base est recréée depuis cette table source, les marts sont ensuite
+    recalculés par dbt (`strava_pipeline.py --force`). Les streams ne sont pas
+    dans le lake : les meilleurs efforts repartent des streams extraits ensuite.
+    """
+    if not os.path.isdir(os.path.join(lake_dir, 'raw_activities')):
+        print(f"Lake introuvable : {lake_dir}")
+        return None
+
+    conn = duckdb.connect(db_path)
+    try:
+        # Colonnes du fichier uniquement (athlete_id y figure déjà)
+        conn.execute(f"""
+            CREATE OR REPLACE TABLE raw_activities AS
+            SELECT * FROM read_parquet('{lake_table_path(lake_dir, 'raw_activities')}', hive_partitioning = false)
+        """)
+        conn.execute("ALTER TABLE raw_activities ADD PRIMARY KEY (id)")
+        count, = conn.execute("SELECT COUNT(*) FROM raw_activities").fetchone()
+    finally:
+        conn.close()
+    print(f"raw_activities : {count} activites restaurees depuis {lake_dir}")
+    return count
+
+
+def main():
+    """`python parquet_lake.py` exporte la base de travail | `--restore` la reconstruit depuis le lake"""
+    try:
+        if '--restore' in sys.argv:
+            print("♻️ Reconstruction de la base depuis le lake...")
+            count = restore_database()
+            if count is None:
+                print("❌ Echec de la reconstruction")
+                sys.exit(1)
+            print(f"✅ {count} activites restaurees dans {STAGING_DB_PATH}")
+            sys.exit(0)
+
+        print("📦 Export Parquet du lake de donnees...")
+        prepare_staging(PUBLISHED_DB_PATH, STAGING_DB_PATH)
+        written = ParquetLakeExporter().export()
+        if written is None:
+            print("❌ Echec de l'export")
+            sys.exit(1)
+        print(f"✅ Export termine : {written} partitions reecrites")
+        sys.exit(0)
+
+    except Exception as e:
+        print(f"❌ Erreur lors de l'export : {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+class StravaRateLimiter:
+    """Budget d'appels Strava partagé entre tous les threads d'extraction
+
+    Strava applique deux fenêtres : 15 minutes (remise à zéro à :00, :15, :30, :45)
+    et quotidienne (remise à zéro à minuit UTC). Le budget local est réservé avant
+    chaque appel puis recalé sur les en-têtes `X-RateLimit-Usage`/`X-RateLimit-Limit`
+    renvoyés par l'API, afin qu'aucun worker ne provoque de 429.
+    """
+
+    # Les GET sont décomptés sur les limites "read" quand Strava les publie
+    HEADER_PAIRS = [
+        ('X-ReadRateLimit-Limit', 'X-ReadRateLimit-Usage'),
+        ('X-RateLimit-Limit', 'X-RateLimit-Usage'),
+    ]
+
+    def __init__(self, short_limit=100, daily_limit=1000, safety_margin=2):
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.safety_margin = safety_margin
+        self.short_usage = 0
+        self.daily_usage = 0
+        self._lock = threading.Lock()
+        self._short_window = self._current_short_window()
+        self._daily_window = self._current_daily_window()
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc)
+
+    def _current_short_window(self):
+        now = self._now()
+        return now.replace(minute=now.minute - now.minute % 15, second=0, microsecond=0)
+
+    def _current_daily_window(self):
+        return self._now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _roll_windows(self):
+        """Remet les compteurs à zéro quand une fenêtre est écoulée"""
+        short_window = self._current_short_window()
+        if short_window != self._short_window:
+            self._short_window = short_window
+            self.short_usage = 0
+
+        daily_window = self._current_daily_window()
+        if daily_window != self._daily_window:
+            self._daily_window = daily_window
+            self.daily_usage = 0
+
+    def _seconds_until_reset(self):
+        """Temps d'attente avant que la fenêtre saturée ne se libère"""
+        now = self._now()
+        if self.daily_usage + self.safety_margin >= self.daily_limit:
+            reset = self._daily_window + timedelta(days=1)
+        else:
+            reset = self._short_window + timedelta(minutes=15)
+        return max((reset - now).total_seconds(), 0) + 1
+
+    def acquire(self):
+        """Réserve un appel dans le budget, en bloquant si nécessaire"""
+        while True:
+            with self._lock:
+                self._roll_windows()
+                if (self.short_usage + self.safety_margin < self.short_limit
+                        and self.daily_usage + self.safety_margin < self.daily_limit):
+                    self.short_usage += 1
+                    self.daily_usage += 1
+                    return
+                wait = self._seconds_until_reset()
+
+            print(f"Limite d'appels Strava atteinte, pause de {wait:.0f}s")
+            time.sleep(wait)
+
+    def update_from_headers(self, headers):
+        """Recale le budget sur l'usage réel annoncé par Strava"""
+        for limit_header, usage_header in self.HEADER_PAIRS:
+            limits = headers.get(limit_header)
+            usages = headers.get(usage_header)
+            if not limits or not usages:
+                continue
+
+            try:
+                short_limit, daily_limit = (int(v) for v in limits.split(','))
+                short_usage, daily_usage = (int(v) for v in usages.split(','))
+            except ValueError:
+                continue
+
+            with self._lock:
+                self._roll_windows()
+                self.short_limit = short_limit
+                self.daily_limit = daily_limit
+                # Les appels encore en vol ne sont pas comptés par le serveur
+                self.short_usage = max(self.short_usage, short_usage)
+                self.daily_usage = max(self.daily_usage, daily_usage)
+            return
+
+    def on_rate_limited(self, headers=None):
+        """Après un 429, bloque tous les workers jusqu'à la libération de la fenêtre épuisée
+
+        L'usage annoncé par la réponse 429 est repris d'abord : un quota
+        quotidien épuisé fait attendre minuit UTC (`_seconds_until_reset`), et
+        non le quart d'heure suivant, qui ne renverrait qu'un nouveau 429.
+        Sans en-têtes exploitables, seule la fenêtre de 15 minutes est saturée,
+        sauf si le budget quotidien local est lui-même atteint.
+        """
+        if headers:
+            self.update_from_headers(headers)
+        with self._lock:
+            self._roll_windows()
+            if self.daily_usage + self.safety_margin >= self.daily_limit:
+                self.daily_usage = self.daily_limit
+            else:
+                self.short_usage = self.short_limit
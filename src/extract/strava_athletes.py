@@ -0,0 +1,228 @@
+"""
+Mode multi-athlètes (club) : registre des refresh tokens et extraction parallèle
+
+Le registre est un fichier JSON hors du dépôt (STRAVA_ATHLETES_FILE, par
+défaut `.strava_athletes.json`) ou le contenu de la variable STRAVA_ATHLETES_JSON
+(CI) :
+
+    {
+        "client_id": "...", "client_secret": "...",
+        "athletes": [{"athlete_id": 123, "name": "Alice", "refresh_token": "..."}]
+    }
+
+`client_id` / `client_secret` sont ceux de l'application Strava (à défaut,
+STRAVA_CLIENT_ID / STRAVA_CLIENT_SECRET). Les limites d'appels Strava
+s'appliquent à l'application : tous les athlètes partagent un même
+StravaRateLimiter.
+"""
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+
+from rate_limiter import StravaRateLimiter
+from strava_extractor import StravaExtractor, ensure_raw_activities_schema
+from strava_streams import StravaStreamsExtractor
+
+# Base de travail (jamais la base publiée lue par le dashboard)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pipeline'))
+from db_snapshot import PUBLISHED_DB_PATH, STAGING_DB_PATH, prepare_staging
+
+DEFAULT_ATHLETES_FILE = '.strava_athletes.json'
+
+
+class AthleteCredentialsStore:
+    """Refresh tokens des athlètes du club ; les tokens renouvelés sont réécrits"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('STRAVA_ATHLETES_FILE', DEFAULT_ATHLETES_FILE)
+        self.inline_json = os.getenv('STRAVA_ATHLETES_JSON')
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return bool(self.inline_json) or os.path.exists(self.path)
+
+    def load(self):
+        if self.inline_json:
+            return json.loads(self.inline_json)
+        if not os.path.exists(self.path):
+            return {'athletes': []}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, registry):
+        """Écriture atomique, fichier lisible par le seul utilisateur courant"""
+        if self.inline_json:
+            print("Registre fourni par STRAVA_ATHLETES_JSON : mise a jour non persistee")
+            return
+        tmp_path = self.path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(registry, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def list_athletes(self):
+        return self.load().get('athletes', [])
+
+    def credentials_for(self, athlete):
+        registry = self.load()
+        return {
+            'client_id': registry.get('client_id') or os.getenv('STRAVA_CLIENT_ID'),
+            'client_secret': registry.get('client_secret') or os.getenv('STRAVA_CLIENT_SECRET'),
+            'refresh_token': athlete['refresh_token'],
+        }
+
+    def save_refresh_token(self, athlete_id, refresh_token):
+        """Enregistre un refresh token renouvelé par Strava"""
+        with self._lock:
+            registry = self.load()
+            for athlete in registry.get('athletes', []):
+                if athlete['athlete_id'] == athlete_id:
+                    athlete['refresh_token'] = refresh_token
+            self.save(registry)
+
+    def add_athlete(self, athlete_id, refresh_token, name=None):
+        """Ajoute ou remplace un athlète"""
+        with self._lock:
+            registry = self.load()
+            athletes = [a for a in registry.get('athletes', []) if a['athlete_id'] != athlete_id]
+            athletes.append({'athlete_id': athlete_id, 'name': name, 'refresh_token': refresh_token})
+            registry['athletes'] = athletes
+            self.save(registry)
+
+
+def prepare_database(db_path, athletes):
+    """Schéma de raw_activities (migration incluse) et table `athletes` (id, nom)
+
+    Fait une seule fois avant les écritures concurrentes des extracteurs.
+    """
+    conn = duckdb.connect(db_path)
+    try:
+        ensure_raw_activities_schema(conn)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS athletes (
+                athlete_id BIGINT PRIMARY KEY,
+                athlete_name VARCHAR,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        for athlete in athletes:
+            conn.execute(
+                "INSERT OR REPLACE INTO athletes VALUES (?, ?, CURRENT_TIMESTAMP)",
+                [athlete['athlete_id'], athlete.get('name')]
+            )
+    finally:
+        conn.close()
+
+
+def extract_athletes(store=None, db_path=STAGING_DB_PATH, max_parallel=4, max_workers=2,
+                     incremental=True, with_streams=False, streams_limit=None, sync=False):
+    """Extrait tous les athlètes du registre en parallèle, sous un budget d'appels commun
+
+    Avec `sync`, la fenêtre récente de chaque athlète est rapprochée
+    (modifications et suppressions, voir StravaExtractor.sync_to_duckdb).
+    Retourne {athlete_id: nombre d'activités nouvelles (ou modifiées), ou None en cas d'échec}.
+    """
+    store = store or AthleteCredentialsStore()
+    athletes = store.list_athletes()
+    if not athletes:
+        print("Aucun athlete dans le registre")
+        return {}
+
+    prepare_database(db_path, athletes)
+    rate_limiter = StravaRateLimiter()
+    # Une écriture DuckDB à la fois : deux athlètes peuvent marquer le même mois
+    write_lock = threading.Lock()
+
+    def extract_one(athlete):
+        athlete_id = athlete['athlete_id']
+        try:
+            with StravaExtractor(
+                max_workers=max_workers,
+                rate_limiter=rate_limiter,
+                db_path=db_path,
+                credentials=store.credentials_for(athlete),
+                athlete_id=athlete_id,
+                credentials_store=store,
+                write_lock=write_lock,
+            ) as extractor:
+                if sync:
+                    new_count = extractor.sync_to_duckdb()
+                else:
+                    new_count = extractor.extract_to_duckdb(incremental=incremental)
+                if new_count is not None and with_streams:
+                    StravaStreamsExtractor(extractor).extract_streams(limit=streams_limit)
+        except Exception as e:
+            print(f"Athlete {athlete_id} : erreur d'extraction ({e})")
+            return athlete_id, None
+        if new_count is None:
+            print(f"Athlete {athlete_id} : echec de l'extraction")
+        else:
+            print(f"Athlete {athlete_id} : {new_count} nouvelles activites")
+        return athlete_id, new_count
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as pool:
+        return dict(pool.map(extract_one, athletes))
+
+
+def add_athlete_from_token(store, refresh_token, name=None):
+    """Enregistre un athlète à partir de son refresh token (ID et nom lus via /athlete)"""
+    registry = store.load()
+    extractor = StravaExtractor(credentials={
+        'client_id': registry.get('client_id') or os.getenv('STRAVA_CLIENT_ID'),
+        'client_secret': registry.get('client_secret') or os.getenv('STRAVA_CLIENT_SECRET'),
+        'refresh_token': refresh_token,
+    })
+    if not extractor.refresh_access_token():
+        return None
+
+    response = extractor.api_get(f"{extractor.base_url}/athlete")
+    if response.status_code != 200:
+        print(f"Erreur API athlete : {response.status_code} - {response.text}")
+        return None
+
+    profile = response.json()
+    name = name or f"{profile.get('firstname', '')} {profile.get('lastname', '')}".strip()
+    store.add_athlete(profile['id'], extractor.refresh_token, name)
+    return profile['id']
+
+
+def main():
+    """`python strava_athletes.py` (extraction) | `list` | `add <refresh_token> [nom]`"""
+    store = AthleteCredentialsStore()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'extract'
+
+    try:
+        if command == 'list':
+            for athlete in store.list_athletes():
+                print(f"{athlete['athlete_id']} - {athlete.get('name') or ''}")
+            sys.exit(0)
+
+        if command == 'add':
+            athlete_id = add_athlete_from_token(store, sys.argv[2], ' '.join(sys.argv[3:]) or None)
+            if athlete_id is None:
+                print("❌ Impossible d'ajouter l'athlete")
+                sys.exit(1)
+            print(f"✅ Athlete {athlete_id} ajoute au registre")
+            sys.exit(0)
+
+        print("🚀 Extraction multi-athletes...")
+        prepare_staging(PUBLISHED_DB_PATH, STAGING_DB_PATH)
+        results = extract_athletes(store)
+        failed = [athlete_id for athlete_id, count in results.items() if count is None]
+        if failed:
+            print(f"❌ Echec pour les athletes : {failed}")
+            sys.exit(1)
+        print(f"✅ {sum(results.values())} nouvelles activites pour {len(results)} athletes")
+        sys.exit(0)
+
+    except Exception as e:
+        print(f"❌ Erreur : {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
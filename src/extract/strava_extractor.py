@@ -1,10 +1,164 @@
 import os
 import requests
+import hashlib
 import json
 import duckdb
-from datetime import datetime
+import pandas as pd
+from datetime import datetime, timedelta, timezone
 import time
+import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from urllib3.util.retry import Retry
+
+from rate_limiter import StravaRateLimiter
+
+# Spans et compteurs (appels API, octets, lignes)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'monitoring'))
+import instrumentation
+
+# Base de travail (jamais la base publiée lue par le dashboard)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pipeline'))
+from db_snapshot import PUBLISHED_DB_PATH, STAGING_DB_PATH, prepare_staging
+
+# Colonnes typees de raw_activities -> (chemin dans la reponse Strava, type DuckDB)
+# Un chemin est une cle, ou un tuple de cles / indices pour les champs imbriques
+RAW_ACTIVITY_FIELDS = {
+    'id': ('id', 'BIGINT'),
+    'name': ('name', 'VARCHAR'),
+    'sport_type': ('sport_type', 'VARCHAR'),
+    'start_date': ('start_date_local', 'TIMESTAMP'),
+    'distance': ('distance', 'FLOAT'),
+    'moving_time': ('moving_time', 'INTEGER'),
+    'elapsed_time': ('elapsed_time', 'INTEGER'),
+    'total_elevation_gain': ('total_elevation_gain', 'FLOAT'),
+    'average_speed': ('average_speed', 'FLOAT'),
+    'max_speed': ('max_speed', 'FLOAT'),
+    'average_heartrate': ('average_heartrate', 'FLOAT'),
+    'max_heartrate': ('max_heartrate', 'FLOAT'),
+    'suffer_score': ('suffer_score', 'SMALLINT'),
+    'start_date_utc': ('start_date', 'TIMESTAMP'),
+    'workout_type': ('workout_type', 'SMALLINT'),
+    'average_cadence': ('average_cadence', 'FLOAT'),
+    'average_watts': ('average_watts', 'FLOAT'),
+    'elev_high': ('elev_high', 'FLOAT'),
+    'elev_low': ('elev_low', 'FLOAT'),
+    'start_lat': (('start_latlng', 0), 'FLOAT'),
+    'start_lng': (('start_latlng', 1), 'FLOAT'),
+    'gear_id': ('gear_id', 'VARCHAR'),
+    'trainer': ('trainer', 'BOOLEAN'),
+    'commute': ('commute', 'BOOLEAN'),
+    'kudos_count': ('kudos_count', 'INTEGER'),
+    'achievement_count': ('achievement_count', 'SMALLINT'),
+}
+
+# Colonnes de raw_activities hors reponse Strava
+# (athlete_id vient de activity['athlete']['id'], ou de l'extracteur)
+RAW_ACTIVITY_META_COLUMNS = {
+    'athlete_id': 'BIGINT',
+    'updated_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
+    'content_hash': 'VARCHAR',
+    'deleted_at': 'TIMESTAMP',
+}
+
+# Colonnes ecrites par save_batch
+RAW_ACTIVITY_COLUMNS = list(RAW_ACTIVITY_FIELDS) + list(RAW_ACTIVITY_META_COLUMNS)
+
+# Compteurs qui evoluent sans action de l'athlete : valeur du dernier chargement,
+# hors empreinte
+VOLATILE_FIELDS = ('kudos_count', 'achievement_count')
+
+# Champs modifiables pris dans l'empreinte d'une activite : ceux lus par les transformations
+CONTENT_HASH_FIELDS = [
+    path for column, (path, _) in RAW_ACTIVITY_FIELDS.items()
+    if column != 'id' and column not in VOLATILE_FIELDS
+]
+
+# Fenetre (jours) rapprochee par le mode sync (STRAVA_SYNC_LOOKBACK_DAYS)
+SYNC_LOOKBACK_DAYS = 30
+
+# Marge sur le debut de la fenetre : `after` est en UTC, start_date en heure locale
+SYNC_TIMEZONE_MARGIN = timedelta(days=1)
+
+# Racine de l'API Strava (STRAVA_BASE_URL permet de viser un serveur de test local)
+STRAVA_BASE_URL = 'https://www.strava.com'
+
+# Rafraîchir le token quand il expire dans moins de 10 minutes
+TOKEN_REFRESH_MARGIN = 600
+
+# Taille du pool de connexions HTTP (>= nombre de workers)
+HTTP_POOL_SIZE = 16
+
+# Session HTTP et tokens partagés par tous les extracteurs du processus
+# (extractions successives déclenchées depuis le dashboard, par exemple)
+_http_session = None
+_token_cache = {}
+_shared_lock = threading.Lock()
+
+
+def get_http_session():
+    """Session HTTP unique avec keep-alive et retries sur erreurs serveur"""
+    global _http_session
+    with _shared_lock:
+        if _http_session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=1,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=frozenset(['GET', 'POST']),
+            )
+            adapter = HTTPAdapter(
+                pool_connections=2,
+                pool_maxsize=HTTP_POOL_SIZE,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+        return _http_session
+
+
+def api_endpoint(url):
+    """Chemin de l'appel sans la racine ni les IDs (/activities/{id}/streams)"""
+    path = urlparse(url).path
+    path = path.split('/api/v3', 1)[-1]
+    return re.sub(r'/\d+', '/{id}', path)
+
+
+def field_value(activity, path):
+    """Valeur d'un champ de la reponse Strava (None si absent)"""
+    if isinstance(path, str):
+        return activity.get(path)
+    value = activity
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value
+
+
+def json_path(path):
+    """Chemin JSON DuckDB d'un champ ('$.start_latlng[0]')"""
+    if isinstance(path, str):
+        return f"$.{path}"
+    return '$' + ''.join(f"[{key}]" if isinstance(key, int) else f".{key}" for key in path)
+
+
+def raw_archive_enabled():
+    """Archivage du JSON complet des activites (STRAVA_RAW_ARCHIVE=0 pour le desactiver)"""
+    return os.getenv('STRAVA_RAW_ARCHIVE', '1') != '0'
+
+
+def activity_content_hash(activity):
+    """Empreinte (md5) des champs modifiables d'une activite"""
+    values = [field_value(activity, path) for path in CONTENT_HASH_FIELDS]
+    return hashlib.md5(json.dumps(values, separators=(',', ':')).encode('utf-8')).hexdigest()
+
 
 def get_strava_credentials():
     """Récupère les credentials Strava selon le contexte"""
@@ -68,11 +222,177 @@ def get_strava_credentials():
     )
 
 
+def raw_activities_ddl(table='raw_activities'):
+    """CREATE TABLE de raw_activities (colonnes typees uniquement)"""
+    columns = [f"{column} {sql_type}" for column, (_, sql_type) in RAW_ACTIVITY_FIELDS.items()]
+    columns[0] += ' PRIMARY KEY'
+    columns += [f"{column} {sql_type}" for column, sql_type in RAW_ACTIVITY_META_COLUMNS.items()]
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n    " + ',\n    '.join(columns) + "\n)"
+
+
+def migrate_dirty_months(conn):
+    """Ajoute athlete_id a une ancienne table dirty_months (cle = mois seul)
+
+    Un mois marque avant la migration l'est pour chaque athlete : la charge
+    d'entrainement de chacun repart de ce mois, comme auparavant.
+    """
+    columns = {
+        row[0] for row in conn.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'dirty_months'
+              AND table_catalog = current_database() AND table_schema = current_schema()
+        """).fetchall()
+    }
+    if 'athlete_id' in columns:
+        return
+    
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute("""
+            CREATE TABLE dirty_months_by_athlete (
+                athlete_id BIGINT,
+                activity_month TIMESTAMP,
+                marked_at TIMESTAMP,
+                UNIQUE (athlete_id, activity_month)
+            )
+        """)
+        conn.execute("""
+            INSERT INTO dirty_months_by_athlete
+            SELECT a.athlete_id, d.activity_month, d.marked_at
+            FROM dirty_months d
+            CROSS JOIN (SELECT DISTINCT athlete_id FROM raw_activities) a
+        """)
+        conn.execute("DROP TABLE dirty_months")
+        conn.execute("ALTER TABLE dirty_months_by_athlete RENAME TO dirty_months")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def migrate_raw_data_column(conn, existing_columns):
+    """Reconstruit une raw_activities qui stocke encore le JSON complet (`raw_data`)
+
+    Les colonnes typees absentes sont extraites du JSON (athlete_id compris),
+    le JSON part dans raw_activities_archive et la table est recreee sans lui,
+    avec les types compacts. updated_at est avance pour que dbt repropage
+    les nouvelles colonnes.
+    """
+    def source_expression(column, path, sql_type):
+        from_json = f"TRY_CAST(json_extract_string(raw_data, '{json_path(path)}') AS {sql_type})"
+        if column in existing_columns:
+            return f"COALESCE(TRY_CAST({column} AS {sql_type}), {from_json})"
+        return from_json
+    
+    expressions = [
+        source_expression(column, path, sql_type)
+        for column, (path, sql_type) in RAW_ACTIVITY_FIELDS.items()
+    ]
+    expressions += [
+        source_expression('athlete_id', ('athlete', 'id'), 'BIGINT'),
+        'CURRENT_TIMESTAMP',
+        'content_hash' if 'content_hash' in existing_columns else 'NULL',
+        'deleted_at' if 'deleted_at' in existing_columns else 'NULL',
+    ]
+    
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO raw_activities_archive
+            SELECT id, json(raw_data), CURRENT_TIMESTAMP
+            FROM raw_activities
+            WHERE raw_data IS NOT NULL
+        """)
+        conn.execute(raw_activities_ddl('raw_activities_typed'))
+        migrated, = conn.execute(f"""
+            INSERT INTO raw_activities_typed ({', '.join(RAW_ACTIVITY_COLUMNS)})
+            SELECT {', '.join(expressions)}
+            FROM raw_activities
+        """).fetchone()
+        conn.execute("DROP TABLE raw_activities")
+        conn.execute("ALTER TABLE raw_activities_typed RENAME TO raw_activities")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    print(f"raw_activities migree vers le schema type : {migrated} lignes, JSON dans raw_activities_archive")
+
+
+def ensure_raw_activities_schema(conn):
+    """Cree raw_activities si besoin et migre les anciennes bases
+
+    raw_activities ne contient que des colonnes typees (champs lus par les
+    modeles et le dashboard) ; le JSON complet de chaque activite est range a
+    part dans raw_activities_archive, que les requetes ne parcourent jamais.
+    Une table qui stocke encore `raw_data` est reconstruite une fois
+    (voir migrate_raw_data_column) ; une colonne typee ajoutee depuis est
+    simplement creee.
+
+    Suivi des modifications : `content_hash` (empreinte des champs modifiables,
+    NULL pour les lignes anterieures), `deleted_at` (activite supprimee sur
+    Strava, conservee comme pierre tombale) et la table `dirty_months` des mois
+    (par athlete) dont une activite a change de mois, de type ou disparu, que
+    les transformations incrementales doivent recalculer.
+    """
+    conn.execute(raw_activities_ddl())
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS raw_activities_archive (
+            id BIGINT PRIMARY KEY,
+            raw_data JSON,
+            archived_at TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dirty_months (
+            athlete_id BIGINT,
+            activity_month TIMESTAMP,
+            marked_at TIMESTAMP,
+            UNIQUE (athlete_id, activity_month)
+        )
+    """)
+    migrate_dirty_months(conn)
+    
+    existing_columns = {
+        row[0] for row in conn.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'raw_activities'
+              AND table_catalog = current_database() AND table_schema = current_schema()
+        """).fetchall()
+    }
+    if 'raw_data' in existing_columns:
+        migrate_raw_data_column(conn, existing_columns)
+        return
+    
+    expected_columns = {
+        **{column: sql_type for column, (_, sql_type) in RAW_ACTIVITY_FIELDS.items()},
+        **RAW_ACTIVITY_META_COLUMNS,
+    }
+    for column, sql_type in expected_columns.items():
+        if column not in existing_columns:
+            conn.execute(f"ALTER TABLE raw_activities ADD COLUMN {column} {sql_type}")
+
+
 class StravaExtractor:
-    def __init__(self):
-        """Initialise l'extracteur avec les credentials"""
+    def __init__(self, max_workers=4, rate_limiter=None, token_cache_path=None,
+                 db_path=STAGING_DB_PATH, credentials=None, athlete_id=None,
+                 credentials_store=None, write_lock=None):
+        """Initialise l'extracteur avec les credentials
+
+        `max_workers` fixe le nombre de requêtes simultanées ; `rate_limiter`
+        permet de partager un même budget d'appels entre plusieurs extracteurs.
+        `token_cache_path` (ou STRAVA_TOKEN_CACHE) active le cache disque du token.
+        STRAVA_BASE_URL remplace https://www.strava.com (API et OAuth), par exemple
+        par le serveur simulé de benchmarks/mock_strava_server.py.
+        STRAVA_RAW_ARCHIVE=0 désactive l'archivage du JSON complet des activités.
+
+        En mode multi-athlètes, `credentials` et `athlete_id` désignent l'athlète
+        extrait et `credentials_store` reçoit les refresh tokens renouvelés.
+        Les extracteurs qui écrivent en parallèle dans la même base partagent
+        `write_lock` : DuckDB refuse deux transactions concurrentes qui
+        modifient les mêmes lignes (mois de `dirty_months`).
+        """
         try:
-            credentials = get_strava_credentials()
+            credentials = credentials or get_strava_credentials()
             self.client_id = credentials['client_id']
             self.client_secret = credentials['client_secret']
             self.refresh_token = credentials['refresh_token']
@@ -81,45 +401,103 @@ class StravaExtractor:
             print(f"❌ Erreur lors du chargement des credentials: {e}")
             raise
         
+        self.athlete_id = athlete_id
+        self.credentials_store = credentials_store
+        # Plusieurs athlètes partagent le même client_id : cache de token par athlète
+        self.token_key = f"{self.client_id}:{athlete_id}" if athlete_id else self.client_id
         self.access_token = None
-        self.base_url = "https://www.strava.com/api/v3"
-        self.db_path = 'data/strava.duckdb'
+        self.token_expires_at = 0
+        self._token_lock = threading.Lock()
+        self.token_cache_path = token_cache_path or os.getenv('STRAVA_TOKEN_CACHE')
+        self.session = get_http_session()
+        strava_url = os.getenv('STRAVA_BASE_URL', STRAVA_BASE_URL).rstrip('/')
+        self.base_url = f"{strava_url}/api/v3"
+        self.oauth_url = f"{strava_url}/oauth/token"
+        self.db_path = db_path
+        self.max_workers = max(1, max_workers)
+        self._conn = None
+        self._schema_ready = False
+        self.write_lock = write_lock or threading.Lock()
+        self.rate_limiter = rate_limiter or StravaRateLimiter()
+        self.archive_raw = raw_archive_enabled()
         
         # Créer le dossier data s'il n'existe pas
-        os.makedirs('data', exist_ok=True)
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        
+    def __enter__(self):
+        self.connect()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def connect(self):
+        """Ouvre (une seule fois par run) la connexion DuckDB de l'extracteur
+
+        Une base illisible est supprimee puis recreee.
+        """
+        if self._conn is not None:
+            return self._conn
         
-    def get_latest_activity_date(self):
-        """Récupère la date de la dernière activité en base"""
         try:
-            if not os.path.exists(self.db_path):
-                print("Base de donnees inexistante, extraction complete")
-                return None
-            
             conn = duckdb.connect(self.db_path)
+            conn.execute("SELECT 1").fetchone()
+        except Exception as e:
+            # Fichier verrouille par un autre processus : surtout ne rien supprimer
+            if 'lock' in str(e).lower():
+                raise
+            print("Base de donnees corrompue, suppression...")
+            for path in (self.db_path, self.db_path + '.wal'):
+                if os.path.exists(path):
+                    os.remove(path)
+            conn = duckdb.connect(self.db_path)
+        
+        self._conn = conn
+        self._schema_ready = False
+        return conn
+    
+    def close(self):
+        """Ferme la connexion DuckDB (libere le verrou du fichier)"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._schema_ready = False
+    
+    def ensure_schema(self):
+        """Cree raw_activities si besoin ; verifie une seule fois par connexion"""
+        conn = self.connect()
+        if self._schema_ready:
+            return conn
+        
+        ensure_raw_activities_schema(conn)
+        self._schema_ready = True
+        return conn
+    
+    def get_high_water_mark(self):
+        """Lit en une requete la date et l'ID les plus recents deja en base
+
+        En mode multi-athletes, seules les activites de l'athlete sont prises en compte.
+        Retourne None si la base est vide (extraction complete).
+        """
+        try:
+            conn = self.ensure_schema()
             
-            # Vérifier si la table existe
-            tables = conn.execute("SHOW TABLES").fetchall()
-            table_names = [table[0] for table in tables]
-            
-            if 'raw_activities' not in table_names:
-                print("Table raw_activities inexistante, extraction complete")
-                conn.close()
-                return None
-            
-            # Récupérer la date de la dernière activité
-            result = conn.execute("""
-                SELECT MAX(start_date) as latest_date, COUNT(*) as total_count
+            query = """
+                SELECT MAX(start_date) as latest_date, MAX(id) as max_id, COUNT(*) as total_count
                 FROM raw_activities
-            """).fetchone()
-            
-            conn.close()
+            """
+            params = []
+            if self.athlete_id:
+                query += " WHERE athlete_id = ?"
+                params.append(self.athlete_id)
+            result = conn.execute(query, params).fetchone()
             
             if result and result[0]:
-                latest_date = result[0]
-                total_count = result[1]
+                latest_date, max_id, total_count = result
                 print(f"Derniere activite en base: {latest_date}")
                 print(f"Total activites en base: {total_count}")
-                return latest_date
+                return {'latest_date': latest_date, 'max_id': max_id, 'total_count': total_count}
             else:
                 print("Aucune activite en base, extraction complete")
                 return None
@@ -128,37 +506,76 @@ class StravaExtractor:
             print(f"Erreur lors de la verification de la base: {e}")
             return None
     
-    def get_existing_activity_ids(self):
-        """Récupère les IDs des activités déjà en base"""
+    def get_latest_activity_date(self):
+        """Récupère la date de la dernière activité en base"""
+        high_water_mark = self.get_high_water_mark()
+        return high_water_mark['latest_date'] if high_water_mark else None
+    
+    def token_is_valid(self):
+        """Le token en cache est-il utilisable encore au moins TOKEN_REFRESH_MARGIN secondes ?"""
+        return bool(self.access_token) and self.token_expires_at - time.time() > TOKEN_REFRESH_MARGIN
+    
+    def use_token(self, token_data):
+        """Adopte un token (reponse OAuth ou cache) et le garde en memoire"""
+        self.access_token = token_data['access_token']
+        self.token_expires_at = token_data.get('expires_at', 0)
+        # Strava peut faire tourner le refresh token
+        new_refresh_token = token_data.get('refresh_token') or self.refresh_token
+        if new_refresh_token != self.refresh_token and self.credentials_store is not None:
+            self.credentials_store.save_refresh_token(self.athlete_id, new_refresh_token)
+        self.refresh_token = new_refresh_token
+        with _shared_lock:
+            _token_cache[self.token_key] = {
+                'access_token': self.access_token,
+                'expires_at': self.token_expires_at,
+                'refresh_token': self.refresh_token,
+            }
+    
+    def load_cached_token(self):
+        """Cherche un token valide en memoire puis dans le cache disque"""
+        with _shared_lock:
+            cached = _token_cache.get(self.token_key)
+        
+        if cached is None and self.token_cache_path and os.path.exists(self.token_cache_path):
+            try:
+                with open(self.token_cache_path, 'r', encoding='utf-8') as f:
+                    disk_cache = json.load(f)
+                if (str(disk_cache.get('client_id')) == str(self.client_id)
+                        and disk_cache.get('athlete_id') == self.athlete_id):
+                    cached = disk_cache
+            except (OSError, ValueError) as e:
+                print(f"Cache de token illisible, ignore : {e}")
+        
+        if cached:
+            self.use_token(cached)
+        return self.token_is_valid()
+    
+    def save_cached_token(self):
+        """Ecrit le token sur disque (lisible par le seul utilisateur courant)"""
+        if not self.token_cache_path:
+            return
         try:
-            if not os.path.exists(self.db_path):
-                return set()
-            
-            conn = duckdb.connect(self.db_path)
-            
-            # Vérifier si la table existe
-            tables = conn.execute("SHOW TABLES").fetchall()
-            table_names = [table[0] for table in tables]
-            
-            if 'raw_activities' not in table_names:
-                conn.close()
-                return set()
-            
-            # Récupérer tous les IDs existants
-            result = conn.execute("SELECT id FROM raw_activities").fetchall()
-            conn.close()
-            
-            existing_ids = {row[0] for row in result}
-            print(f"IDs existants en base: {len(existing_ids)}")
-            return existing_ids
-            
-        except Exception as e:
-            print(f"Erreur lors de la recuperation des IDs: {e}")
-            return set()
+            cache_dir = os.path.dirname(self.token_cache_path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            fd = os.open(self.token_cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'client_id': self.client_id,
+                    'athlete_id': self.athlete_id,
+                    'access_token': self.access_token,
+                    'expires_at': self.token_expires_at,
+                    'refresh_token': self.refresh_token,
+                }, f)
+        except OSError as e:
+            print(f"Impossible d'ecrire le cache de token : {e}")
     
-    def refresh_access_token(self):
-        """Rafraîchit le token d'accès"""
-        url = "https://www.strava.com/oauth/token"
+    def refresh_access_token(self, force=False):
+        """Rafraîchit le token d'accès, seulement s'il est proche de l'expiration"""
+        if not force and (self.token_is_valid() or self.load_cached_token()):
+            return True
+        
+        url = self.oauth_url
         payload = {
             'client_id': self.client_id,
             'client_secret': self.client_secret,
@@ -167,10 +584,13 @@ class StravaExtractor:
         }
         
         try:
-            response = requests.post(url, data=payload, timeout=30)
+            with instrumentation.span('POST /oauth/token', 'extract') as span:
+                response = self.session.post(url, data=payload, timeout=30)
+                span['status_code'] = response.status_code
+            instrumentation.increment('extract', 'api_calls')
             if response.status_code == 200:
-                token_data = response.json()
-                self.access_token = token_data['access_token']
+                self.use_token(response.json())
+                self.save_cached_token()
                 print("Token rafraichi avec succes")
                 return True
             else:
@@ -181,186 +601,498 @@ class StravaExtractor:
             print(f"Erreur de connexion : {e}")
             return False
     
-    def get_activities(self, per_page=80, incremental=True):
-        """Récupère les activités depuis Strava (mode incrémental par défaut)"""
+    def get_after_timestamp(self, latest_date):
+        """Convertit la date de la derniere activite en parametre `after` (epoch)
+
+        `start_date` est stocke en heure locale : on recule d'une journee pour
+        couvrir tous les fuseaux horaires, les doublons etant filtres ensuite.
+
+        Base vide : `after=0`. Sans `after`, Strava renvoie les activites les
+        plus recentes d'abord et un historique interrompu ne serait jamais
+        complete (le run suivant repartirait de la plus recente) ; avec
+        `after=0`, il est lu dans l'ordre chronologique et un run interrompu
+        reprend apres la derniere activite sauvegardee.
+        """
+        if latest_date is None:
+            return 0
+        if isinstance(latest_date, str):
+            latest_date = datetime.fromisoformat(latest_date.replace('Z', ''))
+        latest_date = latest_date.replace(tzinfo=timezone.utc) - timedelta(days=1)
+        return max(int(latest_date.timestamp()), 0)
+
+    def api_get(self, url, params=None, max_attempts=3, stage='extract'):
+        """GET authentifie, soumis au budget d'appels partage entre les threads
+
+        Chaque appel est un span de l'etape `stage` (appels et octets comptes).
+        """
+        for attempt in range(1, max_attempts + 1):
+            self.rate_limiter.acquire()
+            token = self.access_token
+            headers = {'Authorization': f'Bearer {token}'}
+            with instrumentation.span(f"GET {api_endpoint(url)}", stage) as span:
+                response = self.session.get(url, headers=headers, params=params, timeout=30)
+                span['status_code'] = response.status_code
+                span['bytes'] = len(response.content)
+            instrumentation.increment(stage, 'api_calls')
+            
+            if response.status_code == 429:
+                # Fenetre de 15 minutes ou quota quotidien : lue dans les en-tetes du 429
+                print(f"429 recu de Strava (tentative {attempt}/{max_attempts})")
+                self.rate_limiter.on_rate_limited(response.headers)
+                continue
+            self.rate_limiter.update_from_headers(response.headers)
+            
+            if response.status_code == 401 and attempt < max_attempts:
+                # Token revoque ou expire plus tot que prevu : un seul worker le renouvelle
+                with self._token_lock:
+                    if self.access_token == token:
+                        print("401 recu de Strava, nouveau rafraichissement du token")
+                        if not self.refresh_access_token(force=True):
+                            return response
+                continue
+            
+            return response
+        
+        return response
+    
+    def fetch_activities_page(self, page, per_page=200, after=None):
+        """Recupere une page de /athlete/activities"""
+        params = {'per_page': per_page, 'page': page}
+        if after is not None:
+            params['after'] = after
+        
+        response = self.api_get(f"{self.base_url}/athlete/activities", params=params)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Erreur API page {page} : {response.status_code} - {response.text}"
+            )
+        
+        activities = response.json()
+        print(f"Page {page} : {len(activities)} activites recuperees")
+        return activities
+    
+    def iter_activity_pages(self, after=None, per_page=200):
+        """Parcourt /athlete/activities page par page (generateur)
+
+        Avec `after`, Strava renvoie les activites par ordre chronologique :
+        chaque page est rendue des sa reception pour garder une memoire constante.
+        Une page incomplete signifie que l'historique est epuise.
+
+        La premiere page est lue seule (cas courant d'un run incremental) ; si
+        elle est pleine, `max_workers` pages sont ensuite maintenues en vol et
+        rendues dans l'ordre. Au plus `max_workers - 1` appels sont perdus au-dela
+        de la derniere page.
+        """
+        activities = self.fetch_activities_page(1, per_page, after)
+        if activities:
+            yield activities
+        if len(activities) < per_page:
+            return
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            in_flight = {}
+            next_page = 2
+            current_page = 2
+            
+            try:
+                while True:
+                    while len(in_flight) < self.max_workers:
+                        in_flight[next_page] = pool.submit(
+                            self.fetch_activities_page, next_page, per_page, after
+                        )
+                        next_page += 1
+                    
+                    activities = in_flight.pop(current_page).result()
+                    if activities:
+                        yield activities
+                    if len(activities) < per_page:
+                        return
+                    current_page += 1
+            finally:
+                for future in in_flight.values():
+                    future.cancel()
+    
+    def fetch_activity(self, activity_id):
+        """Recupere le detail d'une activite (/activities/{id})"""
+        response = self.api_get(f"{self.base_url}/activities/{activity_id}")
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Erreur API activite {activity_id} : {response.status_code} - {response.text}"
+            )
+        return response.json()
+    
+    def iter_activity_details(self, activity_ids):
+        """Recupere le detail de plusieurs activites avec `max_workers` requetes en vol"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            yield from pool.map(self.fetch_activity, activity_ids)
+    
+    def filter_new_activities(self, activities, high_water_mark=None):
+        """Ne conserve que les activites absentes de la base
+
+        Si tous les IDs de la page depassent le plus grand ID deja stocke, aucune
+        recherche n'est necessaire. Sinon l'anti-jointure est faite dans DuckDB sur
+        les seuls IDs de la page, sans charger l'historique en memoire.
+        """
+        if not activities or high_water_mark is None:
+            return activities
+        
+        page_ids = [activity['id'] for activity in activities]
+        if min(page_ids) > high_water_mark['max_id']:
+            return activities
+        
+        conn = self.ensure_schema()
+        conn.register('page_ids', pd.DataFrame({'id': page_ids}))
+        try:
+            new_ids = {
+                row[0] for row in conn.execute("""
+                    SELECT p.id
+                    FROM page_ids p
+                    ANTI JOIN raw_activities r ON r.id = p.id
+                """).fetchall()
+            }
+        finally:
+            conn.unregister('page_ids')
+        
+        return [activity for activity in activities if activity['id'] in new_ids]
+    
+    def filter_changed_activities(self, activities):
+        """Ne conserve que les activites nouvelles, modifiees ou a restaurer
+
+        Les empreintes de la page sont comparees dans DuckDB a celles deja
+        stockees (une ligne sans empreinte, anterieure au suivi, compte comme
+        modifiee).
+        """
+        if not activities:
+            return activities
+        
+        conn = self.ensure_schema()
+        conn.register('page_hashes', pd.DataFrame({
+            'id': [activity['id'] for activity in activities],
+            'content_hash': [activity_content_hash(activity) for activity in activities],
+        }))
+        try:
+            changed_ids = {
+                row[0] for row in conn.execute("""
+                    SELECT p.id
+                    FROM page_hashes p
+                    LEFT JOIN raw_activities r ON r.id = p.id
+                    WHERE r.id IS NULL
+                       OR r.content_hash IS DISTINCT FROM p.content_hash
+                       OR r.deleted_at IS NOT NULL
+                """).fetchall()
+            }
+        finally:
+            conn.unregister('page_hashes')
+        
+        return [activity for activity in activities if activity['id'] in changed_ids]
+    
+    def extract_to_duckdb(self, per_page=200, incremental=True):
+        """Extraction paginee : chaque page est sauvegardee des son arrivee
+
+        Retourne le nombre de nouvelles activites sauvegardees, ou None en cas d'erreur.
+        """
         if not self.refresh_access_token():
             return None
         
-        # Récupérer les IDs existants pour comparaison
-        existing_ids = self.get_existing_activity_ids() if incremental else set()
+        high_water_mark = self.get_high_water_mark() if incremental else None
+        after = self.get_after_timestamp(high_water_mark['latest_date'] if high_water_mark else None)
         
-        url = "https://www.strava.com/api/v3/athlete/activities"
-        headers = {'Authorization': f'Bearer {self.access_token}'}
-        params = {'per_page': per_page}
+        total_fetched = 0
+        total_new = 0
+        try:
+            for activities in self.iter_activity_pages(after=after, per_page=per_page):
+                total_fetched += len(activities)
+                new_activities = self.filter_new_activities(activities, high_water_mark)
+                if not new_activities:
+                    continue
+                
+                saved = self.save_to_duckdb(new_activities)
+                if not saved:
+                    print("Echec de la sauvegarde de la page")
+                    return None
+                total_new += saved
+        except Exception as e:
+            print(f"Erreur lors de la recuperation : {e}")
+            return None
+        
+        print(f"{total_fetched} activites recuperees depuis Strava")
+        print(f"{total_new} nouvelles activites detectees")
+        return total_new
+    
+    def sync_to_duckdb(self, lookback_days=None, per_page=200):
+        """Rapproche les `lookback_days` derniers jours avec Strava (STRAVA_SYNC_LOOKBACK_DAYS)
+
+        Les activites de la fenetre sont relues et comparees par empreinte :
+        seules les nouvelles et les modifiees (nom, type, distance...) sont
+        ecrites. Celles de la base absentes de la reponse sont marquees
+        supprimees, une fois la fenetre entierement parcourue.
+        
+        Si la derniere activite en base est plus ancienne, la fenetre commence
+        a partir d'elle (comme le mode incremental) ; une base vide est
+        extraite entierement.
+
+        Retourne le nombre d'activites ecrites ou supprimees, ou None en cas d'erreur.
+        """
+        if not self.refresh_access_token():
+            return None
         
+        high_water_mark = self.get_high_water_mark()
+        if high_water_mark is None:
+            return self.extract_to_duckdb(per_page=per_page, incremental=False)
+        
+        lookback_days = lookback_days or int(os.getenv('STRAVA_SYNC_LOOKBACK_DAYS', SYNC_LOOKBACK_DAYS))
+        after = min(
+            int((datetime.now(timezone.utc) - timedelta(days=lookback_days)).timestamp()),
+            self.get_after_timestamp(high_water_mark['latest_date'])
+        )
+        window_start = datetime.fromtimestamp(after, timezone.utc)
+        seen_ids = []
+        total_changed = 0
         try:
-            response = requests.get(url, headers=headers, params=params, timeout=30)
-            
-            if response.status_code == 200:
-                all_activities = response.json()
-                print(f"{len(all_activities)} activites recuperees depuis Strava")
+            for activities in self.iter_activity_pages(after=after, per_page=per_page):
+                seen_ids += [activity['id'] for activity in activities]
+                changed = self.filter_changed_activities(activities)
+                if not changed:
+                    continue
                 
-                if incremental and existing_ids:
-                    # Filtrer les nouvelles activités
-                    new_activities = [
-                        activity for activity in all_activities 
-                        if activity['id'] not in existing_ids
-                    ]
-                    
-                    print(f"{len(new_activities)} nouvelles activites detectees")
-                    
-                    if len(new_activities) == 0:
-                        print("Aucune nouvelle activite - Arret du processus")
-                        return []  # Retourner une liste vide pour indiquer "pas de nouvelles données"
-                    
-                    return new_activities
-                else:
-                    # Mode complet ou première extraction
-                    return all_activities
-                    
-            else:
-                print(f"Erreur API : {response.status_code}")
-                print(f"Reponse : {response.text}")
-                return None
+                saved = self.save_to_duckdb(changed)
+                if not saved:
+                    print("Echec de la sauvegarde de la page")
+                    return None
+                # Les activites en echec restent modifiees : reprises a la prochaine synchronisation
+                total_changed += saved
+            
+            deleted = self.delete_missing_activities(seen_ids, window_start)
+        except Exception as e:
+            print(f"Erreur lors de la synchronisation : {e}")
+            return None
+        
+        print(f"{len(seen_ids)} activites relues depuis Strava (depuis le {window_start:%Y-%m-%d})")
+        print(f"{total_changed} activites nouvelles ou modifiees, {deleted} supprimees")
+        return total_changed + deleted
+    
+    def get_activities(self, per_page=200, incremental=True):
+        """Récupère les activités depuis Strava (mode incrémental par défaut)
+
+        Toutes les pages sont chargees en memoire : preferer `extract_to_duckdb`
+        pour les historiques volumineux.
+        """
+        if not self.refresh_access_token():
+            return None
+        
+        high_water_mark = self.get_high_water_mark() if incremental else None
+        after = self.get_after_timestamp(high_water_mark['latest_date'] if high_water_mark else None)
+        
+        try:
+            all_activities = []
+            for activities in self.iter_activity_pages(after=after, per_page=per_page):
+                all_activities.extend(self.filter_new_activities(activities, high_water_mark))
         except Exception as e:
             print(f"Erreur lors de la recuperation : {e}")
             return None
+        
+        print(f"{len(all_activities)} nouvelles activites detectees")
+        if high_water_mark and len(all_activities) == 0:
+            print("Aucune nouvelle activite - Arret du processus")
+        return all_activities
     
     def init_database(self):
-        """Initialise la base de données avec une nouvelle connexion propre"""
+        """Initialise la base de données (connexion du run + schéma)"""
         try:
-            # Supprimer le fichier s'il existe et est corrompu
-            if os.path.exists(self.db_path):
-                try:
-                    # Test de connexion
-                    test_conn = duckdb.connect(self.db_path)
-                    test_conn.execute("SELECT 1").fetchone()
-                    test_conn.close()
-                    print("Base de donnees existante OK")
-                    return True
-                except:
-                    print("Base de donnees corrompue, suppression...")
-                    os.remove(self.db_path)
-                    if os.path.exists(self.db_path + '.wal'):
-                        os.remove(self.db_path + '.wal')
-            
-            # Créer une nouvelle base
-            conn = duckdb.connect(self.db_path)
-            
-            # Créer la table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS raw_activities (
-                    id BIGINT PRIMARY KEY,
-                    name VARCHAR,
-                    sport_type VARCHAR,
-                    start_date TIMESTAMP,
-                    distance FLOAT,
-                    moving_time INTEGER,
-                    elapsed_time INTEGER,
-                    total_elevation_gain FLOAT,
-                    average_speed FLOAT,
-                    max_speed FLOAT,
-                    average_heartrate FLOAT,
-                    max_heartrate FLOAT,
-                    suffer_score INTEGER,
-                    raw_data JSON,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            conn.close()
-            print("Base de donnees initialisee")
+            self.ensure_schema()
             return True
             
         except Exception as e:
             print(f"Erreur lors de l'initialisation : {e}")
             return False
     
+    def build_activities_batch(self, activities):
+        """Construit un lot colonnaire (DataFrame) a partir d'une page d'activites
+
+        Le nettoyage des caracteres nuls est fait en une passe vectorisee par colonne.
+        Le JSON archive (compact, sans echappement ASCII) contient un caractere
+        nul sous la forme `\\u0000`, retiree elle aussi en une seule passe.
+        """
+        batch = pd.DataFrame({
+            column: [field_value(activity, path) for activity in activities]
+            for column, (path, _) in RAW_ACTIVITY_FIELDS.items()
+        })
+        batch['name'] = (
+            batch['name'].fillna('').astype(str)
+            .str.replace('\x00', '', regex=False)
+            .str.encode('utf-8', 'ignore').str.decode('utf-8')
+        )
+        if self.archive_raw:
+            batch['raw_data'] = pd.Series(
+                [json.dumps(activity, ensure_ascii=False, separators=(',', ':')) for activity in activities]
+            ).str.replace('\\u0000', '', regex=False)
+        batch['athlete_id'] = pd.Series(
+            [(activity.get('athlete') or {}).get('id') or self.athlete_id for activity in activities],
+            dtype='Int64'
+        )
+        batch['content_hash'] = [activity_content_hash(activity) for activity in activities]
+        return batch
+    
+    def save_batch(self, conn, activities):
+        """Upsert d'une page entiere en une seule requete INSERT OR REPLACE ... SELECT
+
+        Le mois d'origine des activites deja en base dont l'empreinte change est
+        marque a recalculer (une activite devenue velo sort du staging). Le JSON
+        complet est ecrit dans raw_activities_archive si l'archivage est actif.
+        Les trois ecritures forment une seule transaction : une erreur en cours
+        de route ne laisse pas raw_activities et l'archive desynchronisees.
+        """
+        batch = self.build_activities_batch(activities)
+        typed_columns = ',\n'.join(
+            f"CAST({column} AS {sql_type})" for column, (_, sql_type) in RAW_ACTIVITY_FIELDS.items()
+        )
+        conn.register('activities_batch', batch)
+        try:
+            with instrumentation.span('save_batch', 'extract', rows=len(batch)):
+                conn.execute("BEGIN TRANSACTION")
+                try:
+                    conn.execute("""
+                        INSERT OR REPLACE INTO dirty_months (athlete_id, activity_month, marked_at)
+                        SELECT DISTINCT r.athlete_id, DATE_TRUNC('month', r.start_date), CURRENT_TIMESTAMP
+                        FROM raw_activities r
+                        INNER JOIN activities_batch b ON r.id = CAST(b.id AS BIGINT)
+                        WHERE r.start_date IS NOT NULL
+                          AND (r.content_hash IS DISTINCT FROM b.content_hash OR r.deleted_at IS NOT NULL)
+                    """)
+                    conn.execute(f"""
+                        INSERT OR REPLACE INTO raw_activities ({', '.join(RAW_ACTIVITY_COLUMNS)})
+                        SELECT
+                            {typed_columns},
+                            CAST(athlete_id AS BIGINT),
+                            CURRENT_TIMESTAMP,
+                            content_hash,
+                            NULL
+                        FROM activities_batch
+                    """)
+                    if self.archive_raw:
+                        conn.execute("""
+                            INSERT OR REPLACE INTO raw_activities_archive
+                            SELECT CAST(id AS BIGINT), CAST(raw_data AS JSON), CURRENT_TIMESTAMP
+                            FROM activities_batch
+                        """)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        finally:
+            conn.unregister('activities_batch')
+        return len(batch)
+    
+    def save_rows(self, conn, activities):
+        """Insertion ligne par ligne : isole les activites en erreur"""
+        success_count = 0
+        error_count = 0
+        
+        for activity in activities:
+            try:
+                self.save_batch(conn, [activity])
+                success_count += 1
+                
+            except Exception as e:
+                print(f"Erreur pour l'activite {activity.get('id', 'unknown')}: {e}")
+                error_count += 1
+                continue
+        
+        if error_count > 0:
+            print(f"{error_count} activites ont echoue")
+        return success_count
+    
+    def delete_activities(self, activity_ids):
+        """Marque des activites supprimees ; retourne le nombre de nouvelles pierres tombales
+
+        La ligne de raw_activities est conservee avec `deleted_at` (et un
+        `updated_at` avance) pour que dbt la retire des modeles incrementaux ;
+        ses streams et meilleurs efforts sont supprimes, son mois marque a recalculer.
+        """
+        if not activity_ids:
+            return 0
+        conn = self.ensure_schema()
+        ids = [int(activity_id) for activity_id in activity_ids]
+        tables = {row[0] for row in conn.execute("SHOW TABLES").fetchall()}
+        
+        with self.write_lock:
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                for table in ('raw_activity_streams', 'best_efforts'):
+                    if table in tables:
+                        conn.execute(f"DELETE FROM {table} WHERE list_contains(?, activity_id)", [ids])
+                conn.execute("""
+                    INSERT OR REPLACE INTO dirty_months (athlete_id, activity_month, marked_at)
+                    SELECT DISTINCT athlete_id, DATE_TRUNC('month', start_date), CURRENT_TIMESTAMP
+                    FROM raw_activities
+                    WHERE list_contains(?, id) AND deleted_at IS NULL AND start_date IS NOT NULL
+                """, [ids])
+                deleted, = conn.execute("""
+                    UPDATE raw_activities
+                    SET deleted_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                    WHERE list_contains(?, id) AND deleted_at IS NULL
+                """, [ids]).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return deleted
+    
+    def delete_missing_activities(self, seen_ids, window_start):
+        """Marque supprimees les activites de la fenetre absentes de la reponse Strava
+
+        Le debut de la fenetre est recule de SYNC_TIMEZONE_MARGIN cote base
+        (dates locales) pour ne pas condamner une activite que `after` a exclue.
+        """
+        conn = self.ensure_schema()
+        query = """
+            SELECT id FROM raw_activities
+            WHERE deleted_at IS NULL
+              AND start_date >= ?
+              AND NOT list_contains(?, id)
+        """
+        params = [(window_start + SYNC_TIMEZONE_MARGIN).replace(tzinfo=None), [int(i) for i in seen_ids]]
+        if self.athlete_id:
+            query += " AND athlete_id = ?"
+            params.append(self.athlete_id)
+        missing_ids = [row[0] for row in conn.execute(query, params).fetchall()]
+        if missing_ids:
+            print(f"{len(missing_ids)} activites absentes de Strava : {missing_ids[:10]}")
+        return self.delete_activities(missing_ids)
+    
     def save_to_duckdb(self, activities):
-        """Sauvegarde les activités dans DuckDB"""
+        """Sauvegarde les activités dans DuckDB
+
+        Chaque page est ecrite en un seul lot ; l'insertion ligne par ligne
+        n'est utilisee qu'en repli si le lot echoue. Les ecritures sont
+        serialisees par `write_lock` entre extracteurs d'une meme base.
+
+        Retourne le nombre d'activites effectivement sauvegardees (0 en cas d'echec).
+        """
         if not activities:
             print("Aucune activite a sauvegarder")
-            return False
-        
-        if len(activities) == 0:
-            print("Liste d'activites vide")
-            return True  # Pas d'erreur, juste rien à faire
+            return 0
             
         try:
             # Initialiser la base si nécessaire
             if not self.init_database():
-                return False
+                return 0
+            conn = self._conn
             
-            # Connexion à DuckDB
-            conn = duckdb.connect(self.db_path)
-            
-            # Insérer les données une par une pour éviter les erreurs
-            success_count = 0
-            error_count = 0
-            
-            for activity in activities:
+            with self.write_lock:
                 try:
-                    # Nettoyer les données avant insertion
-                    activity_data = {
-                        'id': activity.get('id'),
-                        'name': str(activity.get('name', '')).replace('\x00', '').encode('utf-8', 'ignore').decode('utf-8'),
-                        'sport_type': activity.get('sport_type'),
-                        'start_date': activity.get('start_date_local'),
-                        'distance': activity.get('distance'),
-                        'moving_time': activity.get('moving_time'),
-                        'elapsed_time': activity.get('elapsed_time'),
-                        'total_elevation_gain': activity.get('total_elevation_gain'),
-                        'average_speed': activity.get('average_speed'),
-                        'max_speed': activity.get('max_speed'),
-                        'average_heartrate': activity.get('average_heartrate'),
-                        'max_heartrate': activity.get('max_heartrate'),
-                        'suffer_score': activity.get('suffer_score')
-                    }
-                    
-                    # Nettoyer le JSON aussi
-                    clean_activity = {}
-                    for key, value in activity.items():
-                        if isinstance(value, str):
-                            clean_value = value.replace('\x00', '').encode('utf-8', 'ignore').decode('utf-8')
-                            clean_activity[key] = clean_value
-                        else:
-                            clean_activity[key] = value
-                    
-                    conn.execute("""
-                        INSERT OR REPLACE INTO raw_activities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                    """, (
-                        activity_data['id'],
-                        activity_data['name'],
-                        activity_data['sport_type'],
-                        activity_data['start_date'],
-                        activity_data['distance'],
-                        activity_data['moving_time'],
-                        activity_data['elapsed_time'],
-                        activity_data['total_elevation_gain'],
-                        activity_data['average_speed'],
-                        activity_data['max_speed'],
-                        activity_data['average_heartrate'],
-                        activity_data['max_heartrate'],
-                        activity_data['suffer_score'],
-                        json.dumps(clean_activity, ensure_ascii=True)
-                    ))
-                    success_count += 1
-                    
+                    success_count = self.save_batch(conn, activities)
                 except Exception as e:
-                    print(f"Erreur pour l'activite {activity.get('id', 'unknown')}: {e}")
-                    error_count += 1
-                    continue
+                    print(f"Echec de l'insertion groupee ({e}), repli ligne par ligne")
+                    success_count = self.save_rows(conn, activities)
             
-            conn.close()
             print(f"{success_count} nouvelles activites sauvegardees avec succes")
-            if error_count > 0:
-                print(f"{error_count} activites ont echoue")
             
-            return success_count > 0
+            return success_count
             
         except Exception as e:
             print(f"Erreur lors de la sauvegarde : {e}")
-            return False
+            return 0
 
 def main():
     """Fonction principale"""
@@ -368,24 +1100,27 @@ def main():
     
     try:
         # ✅ CORRECTION : Créer l'extracteur qui va gérer le chargement des credentials
-        extractor = StravaExtractor()
-        
-        # Extraction incrémentale par défaut
-        activities = extractor.get_activities(incremental=True)
+        # Une seule connexion DuckDB pour tout le run
+        # Base de travail initialisée depuis la base publiée, publiée ensuite
+        # par `python src/pipeline/db_snapshot.py`
+        prepare_staging(PUBLISHED_DB_PATH, STAGING_DB_PATH)
+        with StravaExtractor() as extractor:
+            if '--sync' in sys.argv:
+                # Rapprochement de la fenetre recente : modifications et suppressions
+                new_count = extractor.sync_to_duckdb()
+            else:
+                # Extraction incrémentale paginée, sauvegarde page par page
+                new_count = extractor.extract_to_duckdb(incremental=True)
         
-        if activities is None:
+        if new_count is None:
             print("❌ Echec de l'extraction")
             sys.exit(1)
-        elif len(activities) == 0:
+        elif new_count == 0:
             print("✅ Aucune nouvelle activite - Processus termine")
             sys.exit(0)  # Code 0 = succès mais rien à faire
         else:
-            if extractor.save_to_duckdb(activities):
-                print("🎉 Extraction terminee avec succes !")
-                sys.exit(0)
-            else:
-                print("❌ Echec de la sauvegarde")
-                sys.exit(1)
+            print("🎉 Extraction terminee avec succes !")
+            sys.exit(0)
                 
     except Exception as e:
         print(f"❌ Erreur lors de l'extraction : {e}")
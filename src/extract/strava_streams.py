@@ -0,0 +1,191 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from strava_extractor import StravaExtractor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'monitoring'))
+import instrumentation
+
+# Base de travail (jamais la base publiée lue par le dashboard)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pipeline'))
+from db_snapshot import PUBLISHED_DB_PATH, STAGING_DB_PATH, prepare_staging
+
+# Streams conservés pour l'analyse seconde par seconde
+STREAM_KEYS = ['time', 'distance', 'heartrate', 'altitude', 'latlng']
+
+
+class StravaStreamsExtractor:
+    """Extraction incrémentale des streams détaillés (/activities/{id}/streams)
+
+    Les séries sont stockées dans `raw_activity_streams`, une ligne par activité,
+    sous forme de listes typées (INTEGER[], FLOAT[], SMALLINT[]) : DuckDB les
+    compresse en colonnes, bien plus compact que du JSON. Les activités sans
+    stream (saisies manuelles) sont enregistrées avec `point_count = 0` pour ne
+    pas être redemandées. Chaque lot est écrit dès qu'il est complet, un run
+    interrompu reprend donc là où il s'est arrêté.
+    """
+
+    def __init__(self, extractor):
+        # Réutilise la session HTTP, le token, le budget d'appels et la connexion
+        self.extractor = extractor
+
+    def ensure_schema(self):
+        """Crée raw_activity_streams si besoin"""
+        conn = self.extractor.ensure_schema()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS raw_activity_streams (
+                activity_id BIGINT PRIMARY KEY,
+                point_count INTEGER,
+                time INTEGER[],
+                distance FLOAT[],
+                heartrate SMALLINT[],
+                altitude FLOAT[],
+                lat FLOAT[],
+                lng FLOAT[],
+                fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        return conn
+
+    def get_pending_activity_ids(self, limit=None):
+        """Activités sans streams en base, les plus récentes d'abord
+
+        En mode multi-athlètes, seules celles de l'athlète de l'extracteur
+        (son token ne donne accès qu'à ses activités).
+        """
+        conn = self.ensure_schema()
+        params = []
+        athlete_filter = ""
+        if self.extractor.athlete_id:
+            athlete_filter = "AND a.athlete_id = ?"
+            params.append(self.extractor.athlete_id)
+        query = f"""
+            SELECT a.id
+            FROM raw_activities a
+            ANTI JOIN raw_activity_streams s ON s.activity_id = a.id
+            WHERE a.distance > 0
+              AND a.deleted_at IS NULL
+            {athlete_filter}
+            ORDER BY a.start_date DESC
+        """
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        return [row[0] for row in conn.execute(query, params).fetchall()]
+
+    def fetch_streams(self, activity_id):
+        """Récupère les streams d'une activité ({} si l'activité n'en a pas)"""
+        response = self.extractor.api_get(
+            f"{self.extractor.base_url}/activities/{activity_id}/streams",
+            params={'keys': ','.join(STREAM_KEYS), 'key_by_type': 'true'},
+            stage='streams'
+        )
+        if response.status_code == 404:
+            return activity_id, {}
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Erreur API streams {activity_id} : {response.status_code} - {response.text}"
+            )
+        return activity_id, response.json()
+
+    def build_streams_batch(self, results):
+        """Construit un lot colonnaire (une ligne par activité, une liste par stream)"""
+        rows = []
+        for activity_id, streams in results:
+            series = {key: (streams.get(key) or {}).get('data') for key in STREAM_KEYS}
+            latlng = series.pop('latlng') or []
+            rows.append({
+                'activity_id': activity_id,
+                'point_count': len(series['time'] or []),
+                'time': series['time'],
+                'distance': series['distance'],
+                'heartrate': series['heartrate'],
+                'altitude': series['altitude'],
+                'lat': [point[0] for point in latlng] or None,
+                'lng': [point[1] for point in latlng] or None,
+            })
+        return pd.DataFrame(rows)
+
+    def save_streams(self, results):
+        """Upsert d'un lot de streams en une seule requête"""
+        if not results:
+            return 0
+
+        conn = self.ensure_schema()
+        batch = self.build_streams_batch(results)
+        conn.register('streams_batch', batch)
+        try:
+            with self.extractor.write_lock, instrumentation.span('save_streams', 'streams', rows=len(batch)):
+                conn.execute("""
+                    INSERT OR REPLACE INTO raw_activity_streams
+                    SELECT
+                        CAST(activity_id AS BIGINT),
+                        CAST(point_count AS INTEGER),
+                        CAST(time AS INTEGER[]),
+                        CAST(distance AS FLOAT[]),
+                        CAST(heartrate AS SMALLINT[]),
+                        CAST(altitude AS FLOAT[]),
+                        CAST(lat AS FLOAT[]),
+                        CAST(lng AS FLOAT[]),
+                        CURRENT_TIMESTAMP
+                    FROM streams_batch
+                """)
+        finally:
+            conn.unregister('streams_batch')
+        return len(batch)
+
+    def extract_streams(self, limit=None, batch_size=50):
+        """Récupère les streams manquants, `max_workers` requêtes en vol
+
+        Retourne le nombre d'activités traitées, ou None en cas d'erreur.
+        """
+        if not self.extractor.refresh_access_token():
+            return None
+
+        pending_ids = self.get_pending_activity_ids(limit)
+        print(f"{len(pending_ids)} activites sans streams")
+        if not pending_ids:
+            return 0
+
+        saved_count = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.extractor.max_workers) as pool:
+                for start in range(0, len(pending_ids), batch_size):
+                    chunk = pending_ids[start:start + batch_size]
+                    results = list(pool.map(self.fetch_streams, chunk))
+                    saved_count += self.save_streams(results)
+                    print(f"Streams sauvegardes : {saved_count}/{len(pending_ids)}")
+        except Exception as e:
+            print(f"Erreur lors de l'extraction des streams : {e}")
+            print(f"{saved_count} activites traitees avant l'erreur (reprise au prochain run)")
+            return None
+
+        return saved_count
+
+
+def main():
+    """Fonction principale : `python strava_streams.py [nombre max d'activités]`"""
+    print("🚀 Extraction des streams Strava...")
+
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    try:
+        prepare_staging(PUBLISHED_DB_PATH, STAGING_DB_PATH)
+        with StravaExtractor() as extractor:
+            count = StravaStreamsExtractor(extractor).extract_streams(limit=limit)
+
+        if count is None:
+            print("❌ Echec de l'extraction des streams")
+            sys.exit(1)
+        print(f"✅ {count} activites traitees")
+        sys.exit(0)
+
+    except Exception as e:
+        print(f"❌ Erreur lors de l'extraction des streams : {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
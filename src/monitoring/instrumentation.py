@@ -0,0 +1,313 @@
+"""
+Instrumentation légère : spans (durées) et compteurs par étape
+
+    with span('save_batch', 'extract', rows=len(batch)):
+        ...
+    increment('extract', 'api_calls')
+
+Un span mesure un bloc de code (durée, statut, span parent dans le même
+thread) ; ses attributs numériques `rows` et `bytes` alimentent les compteurs
+de son étape. Les compteurs (`rows`, `bytes`, `api_calls`...) sont cumulés
+pour tout le processus.
+
+Rien n'est écrit tant que `flush()` n'est pas appelé. La destination est
+STRAVA_METRICS_FILE : un fichier `.prom` reçoit les agrégats au format texte
+Prometheus (réécrit à chaque flush, pour le collecteur textfile de
+node_exporter), tout autre fichier reçoit les spans et les compteurs en JSON
+lines (ajout à la suite).
+
+`load_dbt_run_results` convertit le `run_results.json` de dbt en spans, un
+par modèle.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+METRICS_FILE_ENV = 'STRAVA_METRICS_FILE'
+
+# Spans conservés entre deux flush (les plus anciens sont abandonnés au-delà)
+MAX_PENDING_SPANS = 10000
+
+PROMETHEUS_PREFIX = 'strava'
+
+# Attributs de span reportés dans les compteurs de l'étape
+COUNTED_ATTRIBUTES = ('rows', 'bytes')
+
+
+def iso_timestamp(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(timespec='milliseconds')
+
+
+def parse_timestamp(value):
+    """Horodatage ISO 8601 de dbt (suffixe Z) -> epoch"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def prometheus_labels(**values):
+    """{cle="valeur",...} avec l'échappement du format texte Prometheus"""
+    escaped = (
+        str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        for value in values.values()
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(values, escaped)) + '}'
+
+
+class MetricsRecorder:
+    """Spans et compteurs d'un processus (sûr entre threads)"""
+
+    def __init__(self, max_pending_spans=MAX_PENDING_SPANS):
+        self.run_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.pending_spans = deque(maxlen=max_pending_spans)
+        # (étape, nom) -> valeur cumulée
+        self.counters = {}
+        # (étape, nom du span) -> [nombre, durée totale, durée max, erreurs]
+        self.span_totals = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def increment(self, stage, name, value=1):
+        with self._lock:
+            self.counters[(stage, name)] = self.counters.get((stage, name), 0) + value
+
+    def record_span(self, name, stage, started_at, duration_s, status='ok', parent=None, **attributes):
+        """Enregistre un span déjà mesuré (par exemple un modèle dbt ou une étape du pipeline)"""
+        event = {
+            'type': 'span',
+            'run_id': self.run_id,
+            'ts': iso_timestamp(started_at),
+            'stage': stage,
+            'name': name,
+            'duration_s': round(duration_s, 6),
+            'status': status,
+            'parent': parent,
+            'thread': threading.current_thread().name,
+            **attributes,
+        }
+        with self._lock:
+            self.pending_spans.append(event)
+            totals = self.span_totals.setdefault((stage, name), [0, 0.0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += duration_s
+            totals[2] = max(totals[2], duration_s)
+            totals[3] += status != 'ok'
+            for attribute in COUNTED_ATTRIBUTES:
+                value = attributes.get(attribute)
+                if isinstance(value, (int, float)) and value > 0:
+                    self.counters[(stage, attribute)] = self.counters.get((stage, attribute), 0) + value
+
+    @contextmanager
+    def span(self, name, stage, **attributes):
+        """Mesure le bloc ; le dictionnaire rendu permet d'ajouter des attributs en cours de route"""
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        started_at = time.time()
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield attributes
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            stack.pop()
+            self.record_span(name, stage, started_at, time.perf_counter() - start,
+                             status=status, parent=parent, **attributes)
+
+    def timed(self, stage, name=None):
+        """Décorateur : un span par appel de la fonction"""
+        def decorator(function):
+            span_name = name or function.__name__
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """Agrégats par span (le plus coûteux en premier) et compteurs par étape"""
+        with self._lock:
+            spans = [
+                {'stage': stage, 'name': name, 'count': count, 'total_s': round(total, 3),
+                 'max_s': round(maximum, 3), 'errors': errors}
+                for (stage, name), (count, total, maximum, errors) in self.span_totals.items()
+            ]
+            counters = {}
+            for (stage, name), value in self.counters.items():
+                counters.setdefault(stage, {})[name] = value
+        return sorted(spans, key=lambda entry: entry['total_s'], reverse=True), counters
+
+    def write_jsonl(self, path):
+        """Ajoute les spans en attente et un instantané des compteurs au fichier"""
+        with self._lock:
+            events = list(self.pending_spans)
+            self.pending_spans.clear()
+            counters = [
+                {'stage': stage, 'name': name, 'value': value}
+                for (stage, name), value in sorted(self.counters.items())
+            ]
+        events.append({
+            'type': 'counters',
+            'run_id': self.run_id,
+            'ts': iso_timestamp(time.time()),
+            'counters': counters,
+        })
+        with open(path, 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event, default=str) + '\n')
+
+    def prometheus_text(self):
+        """Agrégats au format texte d'exposition Prometheus"""
+        with self._lock:
+            span_totals = sorted(self.span_totals.items())
+            counters = sorted(self.counters.items())
+
+        span_metric = f"{PROMETHEUS_PREFIX}_span_duration_seconds"
+        lines = [
+            f"# HELP {span_metric} Duree des spans instrumentes",
+            f"# TYPE {span_metric} summary",
+        ]
+        for (stage, name), (count, total, _, _) in span_totals:
+            lines.append(f"{span_metric}_sum{prometheus_labels(stage=stage, span=name)} {total:.6f}")
+            lines.append(f"{span_metric}_count{prometheus_labels(stage=stage, span=name)} {count}")
+
+        lines += [
+            f"# HELP {span_metric}_max Duree maximale d'un span",
+            f"# TYPE {span_metric}_max gauge",
+        ]
+        lines += [
+            f"{span_metric}_max{prometheus_labels(stage=stage, span=name)} {maximum:.6f}"
+            for (stage, name), (_, _, maximum, _) in span_totals
+        ]
+        lines += [
+            f"# HELP {PROMETHEUS_PREFIX}_span_errors_total Spans termines par une exception",
+            f"# TYPE {PROMETHEUS_PREFIX}_span_errors_total counter",
+        ]
+        lines += [
+            f"{PROMETHEUS_PREFIX}_span_errors_total{prometheus_labels(stage=stage, span=name)} {errors}"
+            for (stage, name), (_, _, _, errors) in span_totals
+        ]
+
+        for counter_name in sorted({name for (_, name), _ in counters}):
+            metric = f"{PROMETHEUS_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', counter_name)}_total"
+            lines += [
+                f"# HELP {metric} Compteur {counter_name} par etape",
+                f"# TYPE {metric} counter",
+            ]
+            lines += [
+                f"{metric}{prometheus_labels(stage=stage)} {value}"
+                for (stage, name), value in counters if name == counter_name
+            ]
+        lines.append(f"{PROMETHEUS_PREFIX}_last_flush_timestamp_seconds {time.time():.3f}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Réécrit le fichier (remplacement atomique, lu en continu par le collecteur)"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def flush(self, path=None):
+        """Écrit les métriques vers `path` ou STRAVA_METRICS_FILE ; False si aucune destination"""
+        path = path or os.getenv(METRICS_FILE_ENV)
+        if not path:
+            return False
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            if path.endswith('.prom'):
+                self.write_prometheus(path)
+            else:
+                self.write_jsonl(path)
+        except OSError as e:
+            print(f"Impossible d'ecrire les metriques : {e}")
+            return False
+        return True
+
+
+def load_dbt_run_results(path, recorder=None):
+    """Un span par nœud de `run_results.json` (étape `dbt`) ; retourne le nombre de nœuds lus
+
+    Le début du span est celui de la phase `execute` ; `rows` reprend
+    `rows_affected` quand l'adaptateur le renseigne.
+    """
+    recorder = recorder or metrics
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', encoding='utf-8') as f:
+        run_results = json.load(f)
+
+    command = (run_results.get('args') or {}).get('which')
+    for result in run_results.get('results', []):
+        timings = {timing['name']: timing for timing in result.get('timing', [])}
+        execute = timings.get('execute') or {}
+        started_at = execute.get('started_at')
+        started_at = parse_timestamp(started_at) if started_at else time.time()
+        attributes = {
+            'unique_id': result['unique_id'],
+            'command': command,
+            'dbt_status': result.get('status'),
+            'failures': result.get('failures'),
+        }
+        rows_affected = (result.get('adapter_response') or {}).get('rows_affected')
+        if isinstance(rows_affected, int) and rows_affected >= 0:
+            attributes['rows'] = rows_affected
+        compile_timing = timings.get('compile') or {}
+        if compile_timing.get('started_at') and compile_timing.get('completed_at'):
+            attributes['compile_s'] = round(
+                parse_timestamp(compile_timing['completed_at']) - parse_timestamp(compile_timing['started_at']), 6
+            )
+
+        # model.<projet>.<nom>, test.<projet>.<nom>.<hash>
+        parts = result['unique_id'].split('.')
+        recorder.record_span(
+            parts[2] if len(parts) > 2 else result['unique_id'], 'dbt', started_at,
+            result.get('execution_time') or 0.0,
+            status='ok' if result.get('status') in ('success', 'pass') else 'error',
+            **attributes
+        )
+    return len(run_results.get('results', []))
+
+
+# Enregistreur du processus
+metrics = MetricsRecorder()
+span = metrics.span
+timed = metrics.timed
+increment = metrics.increment
+record_span = metrics.record_span
+flush = metrics.flush
+summary = metrics.summary
+
+
+def main():
+    """`python instrumentation.py <run_results.json> [fichier]` : exporte un run dbt"""
+    if len(sys.argv) < 2:
+        print("Usage : python src/monitoring/instrumentation.py <run_results.json> [fichier de metriques]")
+        sys.exit(1)
+
+    count = load_dbt_run_results(sys.argv[1])
+    spans, _ = summary()
+    for entry in spans:
+        print(f"  {entry['name']:<40} {entry['total_s']:>8.3f}s")
+    if not flush(sys.argv[2] if len(sys.argv) > 2 else None):
+        print("ℹ️ Aucune destination (STRAVA_METRICS_FILE) : metriques non ecrites")
+    print(f"✅ {count} noeuds dbt lus")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
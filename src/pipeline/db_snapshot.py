@@ -0,0 +1,112 @@
+"""
+Publication de la base DuckDB par instantanés
+
+Le pipeline n'écrit jamais dans la base lue par le dashboard : il travaille
+dans une base de travail voisine (`data/strava_staging.duckdb`) puis, en fin
+de run réussi, la copie et la substitue atomiquement (`os.replace`) à
+`data/strava.duckdb`. Les lecteurs ouvrent la base publiée en lecture seule ;
+ceux qui ont encore l'ancien fichier ouvert le lisent jusqu'au bout (le
+système garde l'ancien inode), les suivants voient le nouvel instantané. Plus
+de conflit de verrou entre le dashboard et l'extraction ou `dbt run`.
+
+Les commandes individuelles (extracteurs, calculs Python, export Parquet,
+`dbt run` hors pipeline) travaillent par défaut dans la même base de travail
+(STAGING_DB_PATH) ; `python src/pipeline/db_snapshot.py` publie ensuite leur
+résultat.
+
+La copie publiée garde la date de modification de la base de travail. Une base
+publiée plus récente a donc été remplacée par ailleurs (checkout git,
+restauration) : la base de travail est alors réinitialisée depuis elle avant
+le run suivant.
+"""
+import os
+import shutil
+import sys
+
+import duckdb
+
+STAGING_SUFFIX = '_staging'
+
+
+def staging_path(published_path):
+    """data/strava.duckdb -> data/strava_staging.duckdb"""
+    root, extension = os.path.splitext(published_path)
+    return f"{root}{STAGING_SUFFIX}{extension}"
+
+
+# Chemins par défaut des commandes individuelles, relatifs à la racine du projet
+PUBLISHED_DB_PATH = os.path.join('data', 'strava.duckdb')
+STAGING_DB_PATH = staging_path(PUBLISHED_DB_PATH)
+
+
+def copy_database(source, target):
+    """Copie le fichier `source` (dates comprises) et le substitue atomiquement à `target`"""
+    tmp_path = target + '.tmp'
+    shutil.copy2(source, tmp_path)
+    with open(tmp_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    # Un WAL de l'ancien fichier ne doit pas être rejoué sur le nouveau
+    wal_path = target + '.wal'
+    if os.path.exists(wal_path):
+        os.remove(wal_path)
+    os.replace(tmp_path, target)
+
+
+def prepare_staging(published_path, staging=None):
+    """Initialise la base de travail depuis la base publiée si besoin ; True si elle a été copiée
+
+    Une base de travail au moins aussi récente que la base publiée est gardée
+    (par exemple après un run en échec, non publié).
+    """
+    staging = staging or staging_path(published_path)
+    if not os.path.exists(published_path) or os.path.abspath(staging) == os.path.abspath(published_path):
+        return False
+    if os.path.exists(staging) and os.stat(staging).st_mtime_ns >= os.stat(published_path).st_mtime_ns:
+        return False
+    copy_database(published_path, staging)
+    return True
+
+
+def publish_snapshot(staging, published_path):
+    """Remplace la base publiée par la base de travail ; retourne la taille publiée en octets
+
+    Le CHECKPOINT vide le WAL dans le fichier principal, seul fichier copié.
+    Dans un processus où dbt a déjà ouvert la base de travail, la connexion
+    reprend la même instance DuckDB (même configuration, lecture-écriture).
+    """
+    if os.path.abspath(staging) != os.path.abspath(published_path):
+        conn = duckdb.connect(staging)
+        try:
+            conn.execute("CHECKPOINT")
+        finally:
+            conn.close()
+        copy_database(staging, published_path)
+    return os.path.getsize(published_path)
+
+
+def main():
+    """`python db_snapshot.py` publie la base de travail des commandes individuelles
+    | `prepare` l'initialise depuis la base publiée (avant un `dbt run` seul)"""
+    if len(sys.argv) > 1 and sys.argv[1] == 'prepare':
+        copied = prepare_staging(PUBLISHED_DB_PATH, STAGING_DB_PATH)
+        print(f"✅ Base de travail {'initialisee' if copied else 'deja a jour'} : {STAGING_DB_PATH}")
+        sys.exit(0)
+
+    print("🚀 Publication de la base de travail...")
+
+    if not os.path.exists(STAGING_DB_PATH):
+        print(f"❌ Base de travail absente : {STAGING_DB_PATH}")
+        sys.exit(1)
+
+    try:
+        size = publish_snapshot(STAGING_DB_PATH, PUBLISHED_DB_PATH)
+        print(f"✅ {PUBLISHED_DB_PATH} publiee ({size / 1024 / 1024:.1f} Mo)")
+        sys.exit(0)
+
+    except Exception as e:
+        print(f"❌ Erreur lors de la publication : {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
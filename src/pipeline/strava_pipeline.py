@@ -0,0 +1,294 @@
+"""
+Orchestrateur du pipeline Strava, exécuté dans un seul processus Python
+
+Extraction, transformations dbt (via l'API `dbtRunner`) et export Parquet
+s'enchaînent sans sous-processus : les étapes s'échangent des résultats
+structurés (dictionnaires) au lieu d'analyser la sortie console.
+
+Les étapes écrivent dans une base de travail, publiée en fin de run réussi
+comme instantané de `data/strava.duckdb` (voir db_snapshot) : le dashboard,
+qui lit la base publiée, ne bloque jamais le pipeline.
+
+Chaque étape, chaque modèle dbt (lu dans `run_results.json`) et les appels
+instrumentés des modules (HTTP, écritures DuckDB, export) sont enregistrés
+comme spans ; ils sont écrits en fin de run vers STRAVA_METRICS_FILE.
+"""
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src', 'extract'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src', 'export'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src', 'transform'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src', 'monitoring'))
+
+from strava_extractor import StravaExtractor
+from strava_streams import StravaStreamsExtractor
+from strava_athletes import AthleteCredentialsStore, extract_athletes
+from parquet_lake import ParquetLakeExporter
+from training_load import TrainingLoadCalculator
+from best_efforts import BestEffortsCalculator
+import instrumentation
+from db_snapshot import prepare_staging, publish_snapshot, staging_path
+
+# Base lue par le dashboard, remplacée à chaque publication
+PUBLISHED_DB_PATH = os.path.join(PROJECT_ROOT, 'data', 'strava.duckdb')
+# Base de travail des étapes
+DB_PATH = staging_path(PUBLISHED_DB_PATH)
+LAKE_DIR = os.path.join(PROJECT_ROOT, 'data', 'lake')
+DBT_PROJECT_DIR = os.path.join(PROJECT_ROOT, 'src', 'transform', 'dbt_project')
+
+# dbtRunner réutilisé pour toutes les commandes dbt du processus
+_dbt_runner = None
+
+
+def step_result(step, success, started_at, **details):
+    """Résultat normalisé d'une étape (enregistré aussi comme span `pipeline`)"""
+    duration_s = time.time() - started_at
+    instrumentation.record_span(
+        step, 'pipeline', started_at, duration_s, status='ok' if success else 'error',
+        error=details.get('error')
+    )
+    return {
+        'step': step,
+        'success': success,
+        'duration_s': round(duration_s, 2),
+        **details,
+    }
+
+
+def extract_step(incremental=True, with_streams=False, streams_limit=None, sync=False):
+    """Extraction Strava ; `new_activities` indique s'il faut transformer
+
+    Avec `sync`, la fenêtre récente est rapprochée avec Strava : activités
+    modifiées réécrites, supprimées marquées (`new_activities` les compte).
+    Avec un registre d'athlètes (mode club), tous les athlètes sont extraits en
+    parallèle ; l'étape réussit si au moins un athlète a pu être extrait.
+    """
+    started_at = time.time()
+    store = AthleteCredentialsStore()
+    if store.exists():
+        try:
+            results = extract_athletes(store, db_path=DB_PATH, incremental=incremental,
+                                       with_streams=with_streams, streams_limit=streams_limit,
+                                       sync=sync)
+        except Exception as e:
+            return step_result('extract', False, started_at, error=str(e), new_activities=None)
+        succeeded = [count for count in results.values() if count is not None]
+        failed = [athlete_id for athlete_id, count in results.items() if count is None]
+        return step_result(
+            'extract', bool(succeeded), started_at,
+            new_activities=sum(succeeded) if succeeded else None,
+            # Streams éventuels : forcer les transformations
+            streams=with_streams or None,
+            athletes=results,
+            error=f"Echec pour les athletes {failed}" if failed else None
+        )
+
+    try:
+        with StravaExtractor(db_path=DB_PATH) as extractor:
+            if sync:
+                new_activities = extractor.sync_to_duckdb()
+            else:
+                new_activities = extractor.extract_to_duckdb(incremental=incremental)
+            streams_count = None
+            if new_activities is not None and with_streams:
+                streams_count = StravaStreamsExtractor(extractor).extract_streams(limit=streams_limit)
+    except Exception as e:
+        return step_result('extract', False, started_at, error=str(e), new_activities=None)
+
+    return step_result(
+        'extract', new_activities is not None, started_at,
+        new_activities=new_activities, streams=streams_count
+    )
+
+
+def get_dbt_runner():
+    """Instancie dbtRunner au premier usage (import de dbt coûteux)"""
+    global _dbt_runner
+    if _dbt_runner is None:
+        from dbt.cli.main import dbtRunner
+        _dbt_runner = dbtRunner()
+    return _dbt_runner
+
+
+def dbt_step(command, select=None, full_refresh=False, db_path=None):
+    """Exécute une commande dbt (run, test...) dans le processus courant"""
+    started_at = time.time()
+    args = [command, '--project-dir', DBT_PROJECT_DIR, '--profiles-dir', DBT_PROJECT_DIR]
+    if select:
+        args += ['--select', select]
+    if full_refresh:
+        args.append('--full-refresh')
+
+    # Le profil lit le chemin de la base dans STRAVA_DB_PATH (relu à chaque commande)
+    os.environ['STRAVA_DB_PATH'] = db_path or DB_PATH
+    try:
+        res = get_dbt_runner().invoke(args)
+    except Exception as e:
+        return step_result(f'dbt_{command}', False, started_at, error=str(e), nodes=[])
+
+    nodes = [
+        {
+            'name': node_result.node.name,
+            'status': str(node_result.status),
+            'execution_time': round(node_result.execution_time or 0, 3),
+            'failures': getattr(node_result, 'failures', None),
+        }
+        for node_result in getattr(res.result, 'results', None) or []
+    ]
+    # Un span par modèle, depuis l'artefact écrit par cette commande
+    run_results_path = os.path.join(DBT_PROJECT_DIR, 'target', 'run_results.json')
+    if os.path.exists(run_results_path) and os.path.getmtime(run_results_path) >= started_at:
+        instrumentation.load_dbt_run_results(run_results_path)
+
+    error = str(res.exception) if res.exception else None
+    return step_result(f'dbt_{command}', res.success, started_at, error=error, nodes=nodes)
+
+
+def best_efforts_step(full_refresh=False, db_path=None):
+    """Meilleurs efforts des nouveaux streams (source du mart personal_bests)"""
+    started_at = time.time()
+    try:
+        count = BestEffortsCalculator(db_path=db_path or DB_PATH).update(full_refresh=full_refresh)
+    except Exception as e:
+        return step_result('best_efforts', False, started_at, error=str(e))
+    return step_result('best_efforts', count is not None, started_at, activities_analyzed=count)
+
+
+def training_load_step(full_refresh=False, db_path=None):
+    """Mise à jour incrémentale de la charge d'entraînement (ATL/CTL/TSB)"""
+    started_at = time.time()
+    try:
+        days = TrainingLoadCalculator(db_path=db_path or DB_PATH).update(full_refresh=full_refresh)
+    except Exception as e:
+        return step_result('training_load', False, started_at, error=str(e))
+    return step_result('training_load', days is not None, started_at, days_computed=days)
+
+
+def export_step(db_path=None):
+    """Export Parquet des partitions modifiées"""
+    started_at = time.time()
+    try:
+        exporter = ParquetLakeExporter(db_path=db_path or DB_PATH, lake_dir=LAKE_DIR, read_only=False)
+        written = exporter.export()
+    except Exception as e:
+        return step_result('export', False, started_at, error=str(e))
+    return step_result('export', written is not None, started_at, partitions_written=written)
+
+
+def publish_step(published_path=None, db_path=None):
+    """Publication de la base de travail comme instantané en lecture seule"""
+    started_at = time.time()
+    try:
+        size = publish_snapshot(db_path or DB_PATH, published_path or PUBLISHED_DB_PATH)
+    except Exception as e:
+        return step_result('publish', False, started_at, error=str(e))
+    return step_result('publish', True, started_at, bytes=size)
+
+
+def transform_steps(full_refresh=False, run_tests=True, export=True, db_path=None):
+    """Étapes qui suivent l'extraction ; s'arrête si best_efforts ou dbt run échoue
+
+    `db_path` : base de travail transformée (DB_PATH par défaut).
+    """
+    steps = []
+
+    # best_efforts doit exister avant dbt (source du mart personal_bests)
+    efforts = best_efforts_step(full_refresh=full_refresh, db_path=db_path)
+    steps.append(efforts)
+    if not efforts['success']:
+        return steps
+
+    run = dbt_step('run', full_refresh=full_refresh, db_path=db_path)
+    steps.append(run)
+    if not run['success']:
+        return steps
+
+    steps.append(training_load_step(full_refresh=full_refresh, db_path=db_path))
+
+    if run_tests:
+        # Les échecs de tests sont signalés mais n'arrêtent pas le pipeline
+        steps.append(dbt_step('test', db_path=db_path))
+
+    if export:
+        steps.append(export_step(db_path=db_path))
+    return steps
+
+
+def pipeline_succeeded(steps):
+    """Succès global : toutes les étapes sauf dbt test (non bloquant)"""
+    return all(step['success'] for step in steps if step['step'] != 'dbt_test')
+
+
+def run_pipeline(incremental=True, run_tests=True, export=True, force_transform=False,
+                 with_streams=False, full_refresh=False, sync=False):
+    """Pipeline complet ; s'arrête après l'extraction s'il n'y a rien de nouveau
+
+    `sync` remplace l'extraction incrémentale par le rapprochement de la
+    fenêtre récente (modifications et suppressions comprises). La base de
+    travail n'est publiée que si toutes les étapes ont réussi.
+
+    Retourne {'success', 'new_activities', 'transformed', 'steps': [...]}.
+    """
+    try:
+        steps = []
+        pipeline = {'success': False, 'new_activities': None, 'transformed': False, 'steps': steps}
+
+        if prepare_staging(PUBLISHED_DB_PATH, DB_PATH):
+            print("📥 Base de travail initialisée depuis la base publiée")
+
+        extract = extract_step(incremental=incremental, with_streams=with_streams, sync=sync)
+        steps.append(extract)
+        pipeline['new_activities'] = extract['new_activities']
+        if not extract['success']:
+            return pipeline
+
+        if extract['new_activities'] == 0 and not extract.get('streams') and not (force_transform or full_refresh):
+            print("🎯 Aucune nouvelle activité : transformations inutiles")
+            pipeline['success'] = True
+            return pipeline
+
+        steps += transform_steps(full_refresh=full_refresh, run_tests=run_tests, export=export)
+        pipeline['transformed'] = any(step['step'] == 'dbt_run' and step['success'] for step in steps)
+        if pipeline_succeeded(steps):
+            steps.append(publish_step())
+        pipeline['success'] = pipeline_succeeded(steps)
+        return pipeline
+    finally:
+        # Métriques du run (STRAVA_METRICS_FILE), même en cas d'échec
+        instrumentation.flush()
+
+
+def print_summary(pipeline):
+    """Affiche le résumé des étapes"""
+    print("\n📋 Résumé du pipeline :")
+    for step in pipeline['steps']:
+        icon = '✅' if step['success'] else '❌'
+        print(f"  {icon} {step['step']} ({step['duration_s']}s)")
+        if step.get('error'):
+            print(f"     Erreur : {step['error']}")
+        for node in step.get('nodes', []):
+            print(f"     - {node['name']}: {node['status']} ({node['execution_time']}s)")
+
+    _, counters = instrumentation.summary()
+    if counters:
+        print("\n📈 Volumes par étape :")
+        for stage, values in counters.items():
+            details = ', '.join(f"{name}={value:,}" for name, value in sorted(values.items()))
+            print(f"  {stage} : {details}")
+
+
+def main():
+    """Fonction principale"""
+    pipeline = run_pipeline(force_transform='--force' in sys.argv,
+                            full_refresh='--full-refresh' in sys.argv,
+                            with_streams='--streams' in sys.argv,
+                            sync='--sync' in sys.argv)
+    print_summary(pipeline)
+    sys.exit(0 if pipeline['success'] else 1)
+
+
+if __name__ == "__main__":
+    main()
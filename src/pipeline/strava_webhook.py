@@ -0,0 +1,449 @@
+"""
+Ingestion quasi temps réel par webhooks Strava (abonnement push)
+
+Strava appelle l'URL de callback à chaque création, modification ou
+suppression d'activité (événement JSON `aspect_type` / `object_id` /
+`owner_id`) et attend une réponse 200 en moins de 2 secondes. Le récepteur
+(http.server de la bibliothèque standard) se contente donc de mettre l'ID en
+file ; un worker unique traite ensuite les événements par lots :
+
+- création / modification : GET /activities/{id} puis upsert via l'extracteur
+  (une activité devenue introuvable, 404, est traitée comme supprimée) ;
+- suppression : activité marquée supprimée dans raw_activities (`deleted_at`),
+  streams et meilleurs efforts retirés ;
+- puis transformations incrémentales (best efforts, dbt run, charge
+  d'entraînement, export), qui retirent aussi les activités supprimées, et
+  publication de la base de travail (instantané lu par le dashboard).
+
+Sans événement, aucun appel à l'API n'est fait. Les événements reçus
+rapprochés sont regroupés (STRAVA_WEBHOOK_BATCH_DELAY secondes) et plusieurs
+événements d'une même activité fusionnés. La file est persistée sur disque et
+un lot n'en est retiré qu'une fois traité et publié : un arrêt en cours de
+traitement ne perd rien.
+
+Usage :
+    python src/pipeline/strava_webhook.py serve                  # récepteur + worker
+    python src/pipeline/strava_webhook.py subscribe <callback_url>
+    python src/pipeline/strava_webhook.py subscriptions | unsubscribe <id>
+    python scripts/send_webhook_event.py create <activity_id>     # événement simulé
+"""
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import strava_pipeline
+from strava_pipeline import PROJECT_ROOT, pipeline_succeeded, publish_step, transform_steps, print_summary
+from db_snapshot import prepare_staging, staging_path
+from rate_limiter import StravaRateLimiter
+from strava_athletes import AthleteCredentialsStore
+from strava_extractor import StravaExtractor
+from strava_streams import StravaStreamsExtractor
+import instrumentation
+
+DEFAULT_QUEUE_PATH = os.path.join(PROJECT_ROOT, 'data', 'webhook_queue.json')
+
+ASPECT_TYPES = ('create', 'update', 'delete')
+
+# Nouvelles tentatives d'un événement en échec (API indisponible...)
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 30
+
+
+class WebhookEventQueue:
+    """File des activités à traiter, une entrée par activité, persistée en JSON
+
+    Un nouvel événement remplace le précédent pour la même activité, sauf
+    qu'une suppression l'emporte toujours. Les événements pris (take) restent
+    en file, et sur disque, jusqu'à complete() : un lot interrompu est repris
+    au redémarrage.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        self._pending = {}
+        self._condition = threading.Condition()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for event in json.load(f):
+                    self._pending[event['object_id']] = event
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending)
+
+    def _merge(self, event):
+        previous = self._pending.get(event['object_id'])
+        if previous is not None and previous['aspect_type'] == 'delete':
+            return
+        if previous is not None:
+            event = {**event, 'attempts': max(event.get('attempts', 0), previous.get('attempts', 0))}
+        self._pending[event['object_id']] = event
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self._pending.values()), f)
+        os.replace(tmp_path, self.path)
+
+    def put(self, event):
+        with self._condition:
+            self._merge(event)
+            self._save()
+            self._condition.notify_all()
+
+    def complete(self, events, retry=()):
+        """Retire de la file un lot pris par take() ; `retry` : nouvelles tentatives
+
+        Un événement arrivé pendant le traitement (même activité) est gardé à
+        la place de l'événement traité et de sa nouvelle tentative.
+        """
+        with self._condition:
+            for event in events:
+                if self._pending.get(event['object_id']) is event:
+                    del self._pending[event['object_id']]
+            for event in retry:
+                if event['object_id'] not in self._pending:
+                    self._pending[event['object_id']] = event
+            self._save()
+            self._condition.notify_all()
+
+    def take(self, batch_delay=0, timeout=None, not_before=0):
+        """Attend un événement, laisse `batch_delay` s aux suivants, puis retourne la file
+
+        Les événements restent en file jusqu'à complete(). `not_before` (epoch)
+        retarde le traitement après un échec. Retourne [] si rien n'est arrivé
+        avant `timeout`.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._pending, timeout=timeout):
+                return []
+        delay = max(batch_delay, not_before - time.time())
+        if delay > 0:
+            time.sleep(delay)
+        with self._condition:
+            return list(self._pending.values())
+
+
+def parse_event(payload):
+    """Valide un événement Strava ; retourne le dictionnaire normalisé ou None"""
+    try:
+        event = {
+            'object_type': payload['object_type'],
+            'object_id': int(payload['object_id']),
+            'aspect_type': payload['aspect_type'],
+            'owner_id': int(payload['owner_id']),
+            'event_time': int(payload.get('event_time') or time.time()),
+            'subscription_id': payload.get('subscription_id'),
+            'updates': payload.get('updates') or {},
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+    if event['aspect_type'] not in ASPECT_TYPES:
+        return None
+    return event
+
+
+class WebhookIngestor:
+    """Traite un lot d'événements : récupération par ID, upsert / suppression, transformations"""
+
+    def __init__(self, db_path=None, with_streams=False, export=True, max_workers=4):
+        # Base publiée ; les lots sont écrits dans sa base de travail
+        self.published_path = db_path or strava_pipeline.PUBLISHED_DB_PATH
+        self.db_path = staging_path(self.published_path)
+        self.with_streams = with_streams
+        self.export = export
+        self.max_workers = max_workers
+        self.store = AthleteCredentialsStore()
+        # Un seul budget d'appels pour tout le processus, comme en mode club
+        self.rate_limiter = StravaRateLimiter()
+
+    def extractor_for(self, owner_id):
+        """Extracteur de l'athlète propriétaire ; None s'il n'est pas connu (mode club)"""
+        if not self.store.exists():
+            return StravaExtractor(max_workers=self.max_workers, rate_limiter=self.rate_limiter,
+                                   db_path=self.db_path)
+        for athlete in self.store.list_athletes():
+            if athlete['athlete_id'] == owner_id:
+                return StravaExtractor(
+                    max_workers=self.max_workers, rate_limiter=self.rate_limiter, db_path=self.db_path,
+                    credentials=self.store.credentials_for(athlete), athlete_id=owner_id,
+                    credentials_store=self.store,
+                )
+        return None
+
+    def fetch_activity(self, extractor, activity_id):
+        """(activity_id, activité) ; activité None si Strava ne la renvoie plus (404)"""
+        response = extractor.api_get(f"{extractor.base_url}/activities/{activity_id}", stage='webhook')
+        if response.status_code == 404:
+            return activity_id, None
+        if response.status_code != 200:
+            raise RuntimeError(f"Erreur API activite {activity_id} : {response.status_code}")
+        return activity_id, response.json()
+
+    def apply_owner_events(self, extractor, events):
+        """Applique les événements d'un athlète ; retourne (upserts, suppressions)"""
+        to_fetch = [event['object_id'] for event in events if event['aspect_type'] != 'delete']
+        to_delete = [event['object_id'] for event in events if event['aspect_type'] == 'delete']
+
+        with extractor:
+            if to_fetch:
+                if not extractor.refresh_access_token():
+                    raise RuntimeError("Rafraichissement du token impossible")
+                with ThreadPoolExecutor(max_workers=extractor.max_workers) as pool:
+                    fetched = list(pool.map(lambda activity_id: self.fetch_activity(extractor, activity_id),
+                                            to_fetch))
+                activities = [activity for _, activity in fetched if activity is not None]
+                to_delete += [activity_id for activity_id, activity in fetched if activity is None]
+                # Modification sans effet sur les transformations (kudos, visibilité...) : ignorée
+                activities = extractor.filter_changed_activities(activities)
+                if activities and not extractor.save_to_duckdb(activities):
+                    raise RuntimeError("Echec de la sauvegarde des activites")
+                if activities and self.with_streams:
+                    StravaStreamsExtractor(extractor).extract_streams()
+            else:
+                activities = []
+
+            deleted = extractor.delete_activities(to_delete)
+        return len(activities), deleted
+
+    def process(self, events):
+        """Traite un lot ; retourne {'upserted', 'deleted', 'failed': [événements], 'steps'}
+
+        Un lot rejoué (événements déjà tentés) relance les transformations
+        même sans changement : la tentative précédente a pu écrire les
+        activités puis échouer avant la publication.
+        """
+        result = {'upserted': 0, 'deleted': 0, 'failed': [], 'steps': []}
+        by_owner = {}
+        for event in events:
+            if event['object_type'] == 'activity':
+                by_owner.setdefault(event['owner_id'], []).append(event)
+            elif event['updates'].get('authorized') == 'false':
+                print(f"Athlete {event['owner_id']} : autorisation revoquee (a retirer du registre)")
+
+        with instrumentation.span('process_batch', 'webhook', events=len(events)):
+            prepare_staging(self.published_path, self.db_path)
+            for owner_id, owner_events in by_owner.items():
+                extractor = self.extractor_for(owner_id)
+                if extractor is None:
+                    print(f"Evenements ignores : athlete {owner_id} absent du registre")
+                    continue
+                try:
+                    upserted, deleted = self.apply_owner_events(extractor, owner_events)
+                    result['upserted'] += upserted
+                    result['deleted'] += deleted
+                except Exception as e:
+                    print(f"Athlete {owner_id} : echec du traitement ({e})")
+                    result['failed'] += owner_events
+
+            retried = any(event.get('attempts') for event in events)
+            if result['upserted'] or result['deleted'] or retried:
+                result['steps'] = transform_steps(run_tests=False, export=self.export, db_path=self.db_path)
+                if pipeline_succeeded(result['steps']):
+                    result['steps'].append(publish_step(self.published_path, db_path=self.db_path))
+
+        instrumentation.increment('webhook', 'events', len(events))
+        instrumentation.flush()
+        return result
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Validation de l'abonnement (GET) et réception des événements (POST)"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        receiver = self.server.receiver
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == '/health':
+            return self.send_json(200, {'pending': len(receiver.queue), 'last_batch': receiver.last_batch})
+
+        if url.path != receiver.path or params.get('hub.mode') != 'subscribe':
+            return self.send_json(404, {'message': 'Not Found'})
+        if not receiver.verify_token or params.get('hub.verify_token') != receiver.verify_token:
+            print("Validation d'abonnement refusee : verify_token invalide")
+            return self.send_json(403, {'message': 'Forbidden'})
+        print("Abonnement Strava valide")
+        self.send_json(200, {'hub.challenge': params.get('hub.challenge')})
+
+    def do_POST(self):
+        receiver = self.server.receiver
+        if urlparse(self.path).path != receiver.path:
+            return self.send_json(404, {'message': 'Not Found'})
+
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            event = parse_event(json.loads(self.rfile.read(length) or b'{}'))
+        except json.JSONDecodeError:
+            event = None
+        if event is None:
+            return self.send_json(400, {'message': 'Invalid event'})
+        if receiver.subscription_id and str(event['subscription_id']) != str(receiver.subscription_id):
+            return self.send_json(403, {'message': 'Unknown subscription'})
+
+        receiver.queue.put(event)
+        print(f"Evenement {event['aspect_type']} {event['object_type']} {event['object_id']} mis en file")
+        self.send_json(200, {'queued': event['object_id']})
+
+
+class WebhookReceiver:
+    """Serveur HTTP + worker de traitement des lots"""
+
+    def __init__(self, host='0.0.0.0', port=8080, path='/webhook', verify_token=None, subscription_id=None,
+                 queue_path=DEFAULT_QUEUE_PATH, batch_delay=5.0, ingestor=None):
+        self.path = path
+        self.verify_token = verify_token
+        self.subscription_id = subscription_id
+        self.batch_delay = batch_delay
+        self.queue = WebhookEventQueue(queue_path)
+        self.ingestor = ingestor or WebhookIngestor()
+        self.last_batch = None
+        self._stopping = threading.Event()
+        self._retry_at = 0
+
+        self.httpd = ThreadingHTTPServer((host, port), WebhookHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.receiver = self
+
+    def process_next_batch(self, timeout=None):
+        """Traite le prochain lot de la file ; retourne le résultat ou None si la file est restée vide"""
+        events = self.queue.take(self.batch_delay, timeout=timeout, not_before=self._retry_at)
+        if not events:
+            return None
+
+        print(f"🔔 Traitement de {len(events)} evenement(s)")
+        try:
+            result = self.ingestor.process(events)
+        except Exception as e:
+            print(f"Echec du traitement du lot ({e})")
+            result = {'upserted': 0, 'deleted': 0, 'failed': events, 'steps': []}
+        print_summary({'steps': result['steps']})
+        if result['steps'] and not pipeline_succeeded(result['steps']):
+            # Transformations ou publication en échec : tout le lot est rejoué
+            result['failed'] = events
+
+        retry = []
+        for event in result['failed']:
+            event = {**event, 'attempts': event.get('attempts', 0) + 1}
+            if event['attempts'] < MAX_ATTEMPTS:
+                retry.append(event)
+            else:
+                print(f"Evenement abandonne apres {MAX_ATTEMPTS} tentatives : activite {event['object_id']}")
+        if retry:
+            attempts = max(event['attempts'] for event in retry)
+            self._retry_at = time.time() + RETRY_BASE_DELAY * 2 ** (attempts - 1)
+        self.queue.complete(events, retry)
+
+        self.last_batch = {
+            'processed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'events': len(events),
+            'upserted': result['upserted'],
+            'deleted': result['deleted'],
+            'failed': len(result['failed']),
+            'transformed': pipeline_succeeded(result['steps']) if result['steps'] else False,
+        }
+        return result
+
+    def work(self):
+        while not self._stopping.is_set():
+            try:
+                self.process_next_batch(timeout=1)
+            except Exception as e:
+                print(f"Erreur du worker webhook : {e}")
+                time.sleep(RETRY_BASE_DELAY)
+
+    def serve_forever(self):
+        worker = threading.Thread(target=self.work, name='webhook-worker', daemon=True)
+        worker.start()
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self._stopping.set()
+            self.httpd.server_close()
+            worker.join()
+
+
+def subscription_request(method, path='', **params):
+    """Appel à /push_subscriptions (authentifié par client_id / client_secret de l'application)"""
+    extractor = StravaExtractor()
+    params.update(client_id=extractor.client_id, client_secret=extractor.client_secret)
+    url = f"{extractor.base_url}/push_subscriptions{path}"
+    if method == 'GET':
+        return extractor.session.get(url, params=params, timeout=30)
+    if method == 'DELETE':
+        return extractor.session.delete(url, params=params, timeout=30)
+    return extractor.session.post(url, data=params, timeout=30)
+
+
+def main():
+    """Fonction principale"""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'serve'
+    verify_token = os.getenv('STRAVA_WEBHOOK_VERIFY_TOKEN')
+
+    try:
+        if command == 'serve':
+            receiver = WebhookReceiver(
+                port=int(os.getenv('STRAVA_WEBHOOK_PORT', 8080)),
+                path=os.getenv('STRAVA_WEBHOOK_PATH', '/webhook'),
+                verify_token=verify_token,
+                subscription_id=os.getenv('STRAVA_WEBHOOK_SUBSCRIPTION_ID'),
+                batch_delay=float(os.getenv('STRAVA_WEBHOOK_BATCH_DELAY', 5)),
+                ingestor=WebhookIngestor(with_streams='--streams' in sys.argv,
+                                         export='--no-export' not in sys.argv),
+            )
+            host, port = receiver.httpd.server_address[:2]
+            print(f"🔔 Recepteur de webhooks Strava sur http://{host}:{port}{receiver.path}")
+            if len(receiver.queue):
+                print(f"   {len(receiver.queue)} evenement(s) en attente depuis le dernier arret")
+            receiver.serve_forever()
+
+        elif command == 'subscribe':
+            if not verify_token:
+                print("❌ STRAVA_WEBHOOK_VERIFY_TOKEN requis")
+                sys.exit(1)
+            # Strava valide l'URL de callback (GET hub.challenge) pendant cet appel
+            response = subscription_request('POST', callback_url=sys.argv[2], verify_token=verify_token)
+            print(f"{'✅' if response.status_code in (200, 201) else '❌'} {response.status_code} {response.text}")
+            sys.exit(0 if response.status_code in (200, 201) else 1)
+
+        elif command == 'subscriptions':
+            response = subscription_request('GET')
+            print(response.text)
+
+        elif command == 'unsubscribe':
+            response = subscription_request('DELETE', f"/{int(sys.argv[2])}")
+            print(f"{'✅' if response.status_code == 204 else '❌'} {response.status_code}")
+            sys.exit(0 if response.status_code == 204 else 1)
+
+        else:
+            print(__doc__)
+            sys.exit(1)
+
+    except KeyboardInterrupt:
+        print("\n👋 Arret du recepteur")
+    except Exception as e:
+        print(f"❌ Erreur : {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
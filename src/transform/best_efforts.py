@@ -0,0 +1,202 @@
+"""
+Meilleurs efforts (1k, 5k, 10k, semi, marathon) calculés depuis les streams
+
+Pour chaque activité, on cherche le segment le plus rapide couvrant chaque
+distance standard dans les séries `distance` / `time` de raw_activity_streams.
+Le noyau est vectorisé : `np.searchsorted` donne, pour chaque point de départ,
+le premier point atteignant la distance cible (la série des distances est
+croissante), et le temps de fin est interpolé linéairement entre les deux
+points encadrants. Le coût est O(n log n) par distance, sans boucle Python
+sur les points.
+
+Les résultats sont persistés dans `best_efforts` (une ligne par activité et
+distance atteinte) ; le mart dbt `personal_bests` en dérive les records.
+"""
+import os
+import sys
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'monitoring'))
+import instrumentation
+
+# Base de travail (jamais la base publiée lue par le dashboard)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pipeline'))
+from db_snapshot import PUBLISHED_DB_PATH, STAGING_DB_PATH, prepare_staging
+
+# Distances standard (mètres)
+STANDARD_DISTANCES = {
+    '1k': 1000.0,
+    '5k': 5000.0,
+    '10k': 10000.0,
+    'half_marathon': 21097.5,
+    'marathon': 42195.0,
+}
+
+
+def best_effort(distance, time, target):
+    """Segment le plus rapide couvrant `target` mètres
+
+    `distance` (m, cumulée) et `time` (s) sont des tableaux NumPy de même
+    longueur. Retourne (durée en s, temps de départ en s) ou None si
+    l'activité est plus courte que la cible.
+    """
+    if len(distance) < 2 or distance[-1] - distance[0] < target:
+        return None
+
+    # Les streams contiennent parfois de petits reculs GPS : on force la monotonie
+    distance = np.maximum.accumulate(distance)
+
+    starts = np.arange(len(distance))
+    ends = np.searchsorted(distance, distance + target, side='left')
+    valid = ends < len(distance)
+    starts, ends = starts[valid], ends[valid]
+
+    # Interpolation du passage à distance[start] + target entre ends - 1 et ends
+    # (distance[ends - 1] < cible <= distance[ends], donc le dénominateur est > 0)
+    d_before, d_after = distance[ends - 1], distance[ends]
+    t_before, t_after = time[ends - 1], time[ends]
+    fraction = (distance[starts] + target - d_before) / (d_after - d_before)
+    elapsed = t_before + fraction * (t_after - t_before) - time[starts]
+
+    best = int(np.argmin(elapsed))
+    return float(elapsed[best]), float(time[starts[best]])
+
+
+def activity_best_efforts(activity_id, distance, time, fetched_at=None):
+    """Meilleurs efforts d'une activité pour toutes les distances standard"""
+    distance = np.asarray(distance, dtype=np.float64)
+    time = np.asarray(time, dtype=np.float64)
+
+    rows = []
+    for effort_name, target in STANDARD_DISTANCES.items():
+        effort = best_effort(distance, time, target)
+        if effort is None:
+            # Distances triées : les suivantes ne sont pas atteintes non plus
+            break
+        elapsed, start_offset = effort
+        rows.append({
+            'activity_id': activity_id,
+            'effort_name': effort_name,
+            'distance_m': target,
+            'elapsed_time_s': round(elapsed, 1),
+            'start_offset_s': start_offset,
+            'stream_fetched_at': fetched_at,
+        })
+    return rows
+
+
+class BestEffortsCalculator:
+    """Calcul incrémental de la table `best_efforts` depuis raw_activity_streams"""
+
+    def __init__(self, db_path=STAGING_DB_PATH, batch_size=200):
+        self.db_path = db_path
+        self.batch_size = batch_size
+
+    def ensure_schema(self, conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS best_efforts (
+                activity_id BIGINT,
+                effort_name VARCHAR,
+                distance_m DOUBLE,
+                elapsed_time_s DOUBLE,
+                start_offset_s DOUBLE,
+                stream_fetched_at TIMESTAMP,
+                PRIMARY KEY (activity_id, effort_name)
+            )
+        """)
+
+    def get_pending_streams(self, conn, full_refresh=False):
+        """Streams récupérés depuis le dernier calcul (requête DuckDB non encore lue)"""
+        watermark = None
+        if not full_refresh:
+            watermark, = conn.execute("SELECT MAX(stream_fetched_at) FROM best_efforts").fetchone()
+
+        return conn.execute("""
+            SELECT activity_id, distance, time, fetched_at
+            FROM raw_activity_streams
+            WHERE point_count > 1
+              AND distance IS NOT NULL
+              AND time IS NOT NULL
+              AND (CAST(? AS TIMESTAMP) IS NULL OR fetched_at > ?)
+            ORDER BY fetched_at
+        """, [watermark, watermark])
+
+    def save_efforts(self, conn, rows):
+        if not rows:
+            return 0
+        batch = pd.DataFrame(rows)
+        conn.register('best_efforts_batch', batch)
+        try:
+            with instrumentation.span('save_efforts', 'best_efforts', rows=len(batch)):
+                conn.execute("""
+                    INSERT OR REPLACE INTO best_efforts
+                    SELECT
+                        CAST(activity_id AS BIGINT), effort_name, distance_m,
+                        elapsed_time_s, start_offset_s, CAST(stream_fetched_at AS TIMESTAMP)
+                    FROM best_efforts_batch
+                """)
+        finally:
+            conn.unregister('best_efforts_batch')
+        return len(batch)
+
+    def update(self, full_refresh=False):
+        """Calcule les efforts des nouveaux streams ; retourne le nombre d'activités traitées"""
+        if not os.path.exists(self.db_path):
+            print(f"Base de donnees introuvable : {self.db_path}")
+            return None
+
+        conn = duckdb.connect(self.db_path)
+        try:
+            # La table existe toujours, même sans streams : le mart dbt en dépend
+            self.ensure_schema(conn)
+            tables = {row[0] for row in conn.execute("SHOW TABLES").fetchall()}
+            if 'raw_activity_streams' not in tables:
+                print("Aucun stream en base (python src/extract/strava_streams.py)")
+                return 0
+
+            if full_refresh:
+                conn.execute("DELETE FROM best_efforts")
+
+            pending = self.get_pending_streams(conn, full_refresh=full_refresh)
+            processed = 0
+            saved = 0
+            while True:
+                streams = pending.fetchmany(self.batch_size)
+                if not streams:
+                    break
+                rows = []
+                for activity_id, distance, time, fetched_at in streams:
+                    rows.extend(activity_best_efforts(activity_id, distance, time, fetched_at))
+                # Connexion distincte du curseur en cours de lecture
+                saved += self.save_efforts(conn.cursor(), rows)
+                processed += len(streams)
+
+            print(f"Meilleurs efforts : {processed} activites analysees, {saved} efforts enregistres")
+            return processed
+        finally:
+            conn.close()
+
+
+def main():
+    """Fonction principale"""
+    print("🏅 Calcul des meilleurs efforts...")
+
+    try:
+        prepare_staging(PUBLISHED_DB_PATH, STAGING_DB_PATH)
+        count = BestEffortsCalculator().update(full_refresh='--full-refresh' in sys.argv)
+        if count is None:
+            print("❌ Echec du calcul")
+            sys.exit(1)
+        print(f"✅ {count} activites analysees")
+        sys.exit(0)
+
+    except Exception as e:
+        print(f"❌ Erreur lors du calcul : {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
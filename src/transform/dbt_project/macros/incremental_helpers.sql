@@ -0,0 +1,136 @@
+{#
+    Outils des modèles incrémentaux.
+
+    Le filigrane (watermark) est le MAX(updated_at) déjà chargé dans le modèle.
+    Si la table existante a été construite avant le passage en incrémental (colonne
+    absente), le filigrane vaut 1900-01-01 : tout est recalculé une fois et la
+    colonne est ajoutée par on_schema_change='append_new_columns'.
+
+    `requires` liste les colonnes introduites après la création de la table :
+    tant que l'une d'elles manque, le filigrane vaut aussi 1900-01-01 et toutes
+    les lignes sont recalculées une fois (sinon la nouvelle colonne resterait
+    NULL sur les lignes déjà chargées).
+#}
+
+{% macro relation_has_column(relation, column) -%}
+    {%- set existing_columns = adapter.get_columns_in_relation(relation) | map(attribute='name') | map('lower') | list -%}
+    {{- return(column | lower in existing_columns) -}}
+{%- endmacro %}
+
+{% macro incremental_watermark(column='updated_at', requires=[]) -%}
+    {%- set ns = namespace(complete=relation_has_column(this, column)) -%}
+    {%- for required in requires -%}
+        {%- set ns.complete = ns.complete and relation_has_column(this, required) -%}
+    {%- endfor -%}
+    {%- if ns.complete -%}
+        (SELECT COALESCE(MAX({{ column }}), TIMESTAMP '1900-01-01') FROM {{ this }})
+    {%- else -%}
+        TIMESTAMP '1900-01-01'
+    {%- endif -%}
+{%- endmacro %}
+
+{#
+    Modifications et suppressions (raw_activities.deleted_at, table dirty_months).
+
+    Une activité modifiée peut quitter le staging (devenue vélo) ou changer de
+    mois, une activité supprimée n'y revient jamais : l'upsert delete+insert ne
+    les voit pas.
+
+    - Les mois qu'elles ont quittés, notés dans dirty_months, sont ajoutés aux
+      mois recalculés par les modèles mensuels (dirty_months_since_watermark).
+    - Après l'upsert (post_hook), une ligne dont la source a été rechargée plus
+      tard qu'elle est périmée : sa nouvelle version a été filtrée
+      (delete_stale_activities). Un groupe (mois, ou mois × sport) absent de la
+      source est supprimé (delete_orphan_groups).
+
+    Ces suppressions sont faites en post_hook : dans DuckDB, un DELETE suivi de
+    l'ALTER TABLE de on_schema_change dans la même transaction échoue au COMMIT.
+#}
+
+{% macro dirty_months_since_watermark() -%}
+    SELECT activity_month FROM {{ source('raw_strava', 'dirty_months') }}
+    WHERE marked_at > {{ incremental_watermark() }}
+{%- endmacro %}
+
+{% macro delete_stale_activities(id_column='activity_id') -%}
+    {%- if is_incremental() -%}
+    DELETE FROM {{ this }}
+    WHERE {{ id_column }} IN (
+        SELECT t.{{ id_column }}
+        FROM {{ this }} t
+        INNER JOIN {{ source('raw_strava', 'raw_activities') }} r ON r.id = t.{{ id_column }}
+        WHERE r.updated_at > t.updated_at
+    )
+    {%- endif -%}
+{%- endmacro %}
+
+{% macro delete_orphan_groups(source_relation, key_columns=['activity_month']) -%}
+    {%- if is_incremental() -%}
+    DELETE FROM {{ this }}
+    WHERE ({{ key_columns | join(', ') }}) NOT IN (
+        SELECT DISTINCT {{ key_columns | join(', ') }} FROM {{ source_relation }}
+    )
+    {%- endif -%}
+{%- endmacro %}
+
+{#
+    Séries denses recalculées à partir d'une date (daily_stats, period_stats).
+
+    Leur filigrane est celui des sources : le plus récent chargement
+    d'activité ou marquage de dirty_months (source_watermark). Les lignes
+    recalculées d'un run le reçoivent toutes ; le modèle suivant recalcule
+    les lignes de son parent plus récentes que son propre filigrane.
+
+    Un delete+insert par date ou par période ne voit pas les lignes qui ne
+    sont plus produites : série (athlète, sport) sans activité restante,
+    jours hors du calendrier après une suppression (avant la première
+    activité de l'athlète, après la dernière activité connue).
+    delete_outside_calendar les supprime en post_hook ; `start_column` et
+    `end_column` bornent chaque ligne (une période : first_day, last_day).
+#}
+
+{% macro source_watermark() -%}
+    {#- dirty_months est créée par l'extracteur : absente d'une base restaurée depuis le lake -#}
+    {%- set dirty_months = source('raw_strava', 'dirty_months') -%}
+    GREATEST(
+        (SELECT MAX(updated_at) FROM {{ ref('activities_summary') }})
+        {%- if not execute or load_relation(dirty_months) is not none %},
+        (SELECT MAX(marked_at) FROM {{ dirty_months }})
+        {%- endif %}
+    )
+{%- endmacro %}
+
+{% macro delete_outside_calendar(source_relation, start_column='activity_date', end_column='activity_date') -%}
+    {%- if is_incremental() -%}
+    DELETE FROM {{ this }} AS t
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM (SELECT DISTINCT athlete_id, sport_type FROM {{ source_relation }}) s
+        INNER JOIN (
+            SELECT athlete_id, MIN(CAST(activity_date AS DATE)) as first_date
+            FROM {{ source_relation }}
+            GROUP BY athlete_id
+        ) b ON b.athlete_id IS NOT DISTINCT FROM s.athlete_id
+        CROSS JOIN (SELECT MAX(CAST(activity_date AS DATE)) as last_date FROM {{ source_relation }}) l
+        WHERE s.athlete_id IS NOT DISTINCT FROM t.athlete_id
+          AND s.sport_type = t.sport_type
+          AND t.{{ end_column }} >= b.first_date
+          AND t.{{ start_column }} <= l.last_date
+    )
+    {%- endif -%}
+{%- endmacro %}
+
+{#
+    Lignes dont la clé (`key_columns`, athlete_id NULL compris) n'est plus
+    produite par `source_relation` (relation ou sous-requête) : mois devenu
+    vide, mois sorti de la fenêtre de performance_trends.
+#}
+{% macro delete_missing_rows(source_relation, key_columns) -%}
+    {%- if is_incremental() -%}
+    DELETE FROM {{ this }} AS t
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {{ source_relation }} s
+        WHERE {% for column in key_columns %}s.{{ column }} IS NOT DISTINCT FROM t.{{ column }}{{ ' AND ' if not loop.last }}{% endfor %}
+    )
+    {%- endif -%}
+{%- endmacro %}
@@ -0,0 +1,105 @@
+{#
+    Agrégation par période (semaine, mois, trimestre, année) de period_stats.
+
+    Chaque mesure stockée est additive (somme, compteur ou maximum) : une
+    période se calcule depuis les périodes plus fines qu'elle contient sans
+    relire le staging (jour -> semaine, jour -> mois -> trimestre -> année).
+    Les moyennes sont dérivées des sommes à la fin (rollup_metrics) :
+
+    - allure pondérée par la distance (temps total / distance totale) : la
+      moyenne simple des allures donnerait à un footing de 3 km le même poids
+      qu'une sortie longue de 30 km ;
+    - vitesse (distance / temps) et fréquence cardiaque pondérées par le temps ;
+    - rythmes hebdomadaires rapportés aux jours réellement couverts par le
+      calendrier (calendar_days / 7), au lieu d'une approximation à 4,33
+      semaines par mois.
+
+    La relation agrégée a les colonnes athlete_id, sport_type, period_start,
+    first_day, last_day et les mesures de rollup_measures().
+#}
+
+{% macro rollup_measures() -%}
+    {{- return({
+        'calendar_days': 'count',
+        'activities_count': 'count',
+        'distance_km': 'sum',
+        'max_distance_km': 'max',
+        'moving_time_minutes': 'sum',
+        'elevation_gain_m': 'sum',
+        'pace_weighted_s': 'sum',
+        'pace_distance_km': 'sum',
+        'heartrate_weighted_bpm_min': 'sum',
+        'heartrate_minutes': 'sum',
+        'max_heartrate_sum': 'sum',
+        'max_heartrate_count': 'count',
+    }) -}}
+{%- endmacro %}
+
+{#
+    `by_sport=False` regroupe les sports d'un athlète : les calendriers de ses
+    sports couvrent les mêmes jours (daily_stats), les jours ne sont donc pas
+    additionnés mais repris une fois (MAX). `extra_columns` : expressions
+    d'agrégat ajoutées telles quelles (par exemple un compteur par sport).
+#}
+{% macro rollup(relation, grain, by_sport=True, extra_columns=[]) -%}
+    {%- set period_sql = "CAST(DATE_TRUNC('" ~ grain ~ "', period_start) AS DATE)" -%}
+    SELECT
+        athlete_id,
+        {% if by_sport %}sport_type,{% endif %}
+        {{ period_sql }} as period_start,
+        {%- for column, kind in rollup_measures().items() %}
+        {%- if kind == 'max' or (column == 'calendar_days' and not by_sport) %}
+        MAX({{ column }}) as {{ column }},
+        {%- elif kind == 'count' %}
+        CAST(SUM({{ column }}) AS BIGINT) as {{ column }},
+        {%- else %}
+        SUM({{ column }}) as {{ column }},
+        {%- endif %}
+        {%- endfor %}
+        {%- for expression in extra_columns %}
+        {{ expression }},
+        {%- endfor %}
+        MIN(first_day) as first_day,
+        MAX(last_day) as last_day
+    FROM {{ relation }}
+    GROUP BY athlete_id, {% if by_sport %}sport_type, {% endif %}{{ period_sql }}
+{%- endmacro %}
+
+{% macro rollup_metrics() -%}
+    distance_km / NULLIF(activities_count, 0) as avg_distance_km,
+    moving_time_minutes / NULLIF(activities_count, 0) as avg_moving_time_minutes,
+    elevation_gain_m / NULLIF(activities_count, 0) as avg_elevation_gain_m,
+    pace_weighted_s / NULLIF(pace_distance_km, 0) as avg_pace_sec_per_km,
+    distance_km / NULLIF(moving_time_minutes / 60.0, 0) as avg_speed_kmh,
+    heartrate_weighted_bpm_min / NULLIF(heartrate_minutes, 0) as avg_heartrate,
+    max_heartrate_sum / NULLIF(max_heartrate_count, 0) as avg_max_heartrate,
+    activities_count * 7.0 / calendar_days as activities_per_week,
+    distance_km * 7.0 / calendar_days as distance_per_week_km
+{%- endmacro %}
+
+{#
+    Mois d'activité (au moins une activité, tous sports ou par sport) des
+    lignes `grain = 'month'` de period_stats, en sous-requête : clés attendues
+    de monthly_stats et performance_trends (delete_missing_rows).
+    `trend_window` garde les mois de la fenêtre de performance_trends.
+#}
+{% macro active_months(relation, by_sport=False, trend_window=False) -%}
+    (
+        SELECT
+            athlete_id,
+            {% if by_sport %}sport_type,{% endif %}
+            CAST(period_start AS TIMESTAMP) as activity_month
+        FROM (
+            SELECT
+                *,
+                MAX(period_start) OVER (PARTITION BY athlete_id) as last_month
+            FROM {{ relation }}
+            WHERE grain = 'month'
+              AND activities_count > 0
+        )
+        {% if trend_window %}
+        WHERE period_start > last_month - INTERVAL '{{ var('trend_window_months', 12) }} months'
+        {% endif %}
+        GROUP BY athlete_id, {% if by_sport %}sport_type, {% endif %}period_start
+    )
+{%- endmacro %}
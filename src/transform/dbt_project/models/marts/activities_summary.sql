@@ -1,7 +1,14 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    unique_key='activity_id',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_stale_activities() }}"
+) }}
 
 SELECT 
     activity_id,
+    athlete_id,
     activity_name,
     sport_type,
     start_date,
@@ -19,12 +26,19 @@ SELECT
     -- Performance
     average_speed_kmh,
     max_speed_kmh,
-    pace_min_per_km,
+    pace_sec_per_km,
     
     -- Cardio
     average_heartrate,
     max_heartrate,
     suffer_score,
+    average_cadence_spm,
+    
+    -- Contexte
+    is_race,
+    is_trainer,
+    gear_id,
+    kudos_count,
     
     -- Calculs additionnels
     CASE 
@@ -47,6 +61,12 @@ SELECT
         WHEN total_elevation_gain_m < 300 THEN 'Vallonné'
         WHEN total_elevation_gain_m < 600 THEN 'Montagneux'
         ELSE 'Très montagneux'
-    END as elevation_category
+    END as elevation_category,
+    
+    -- Métadonnées (filigrane incrémental)
+    updated_at
 
 FROM {{ ref('stg_strava_activities') }}
+{% if is_incremental() %}
+WHERE updated_at > {{ incremental_watermark(requires=['pace_sec_per_km']) }}
+{% endif %}
@@ -0,0 +1,196 @@
+{{ config(
+    materialized='incremental',
+    unique_key='activity_date',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_outside_calendar(ref('activities_summary')) }}"
+) }}
+
+-- Calendrier dense : une ligne par athlète, sport et jour, jours sans activité compris,
+-- du premier jour d'activité de l'athlète au dernier jour d'activité connu
+-- Les colonnes cum_* sont cumulées depuis le début du calendrier : le total d'une période
+-- [début, fin] vaut cum(fin) - cum(veille du début), deux lignes lues par athlète et sport
+-- quelle que soit la longueur de la période
+-- Incrémental : les jours sont recalculés à partir du plus ancien jour touché depuis le
+-- dernier run (activité chargée ou modifiée, mois quitté noté dans dirty_months, calendrier
+-- prolongé, nouvelle série) ; les cumuls des jours antérieurs restent valides et servent
+-- de point de départ
+
+{%- set cumulative_columns = {
+    'cum_activities': 'activities_count',
+    'cum_distance_km': 'distance_km',
+    'cum_moving_time_minutes': 'moving_time_minutes',
+    'cum_elevation_gain_m': 'elevation_gain_m',
+    'cum_pace_weighted_s': 'pace_weighted_s',
+    'cum_pace_distance_km': 'pace_distance_km',
+    'cum_active_days': 'active_day',
+} %}
+
+WITH bounds AS (
+    SELECT
+        athlete_id,
+        MIN(CAST(activity_date AS DATE)) as first_date
+    FROM {{ ref('activities_summary') }}
+    GROUP BY athlete_id
+),
+
+last_day AS (
+    SELECT MAX(CAST(activity_date AS DATE)) as last_date FROM {{ ref('activities_summary') }}
+),
+
+series AS (
+    SELECT DISTINCT athlete_id, sport_type FROM {{ ref('activities_summary') }}
+),
+
+restart AS (
+    {% if is_incremental() %}
+    SELECT MIN(restart_date) as restart_date
+    FROM (
+        -- Activités chargées ou modifiées depuis le dernier run
+        SELECT MIN(CAST(activity_date AS DATE)) as restart_date
+        FROM {{ ref('activities_summary') }}
+        WHERE updated_at > {{ incremental_watermark() }}
+        UNION ALL
+        -- Mois quittés par une activité (déplacée, changée de type ou supprimée)
+        SELECT CAST(MIN(activity_month) AS DATE)
+        FROM ({{ dirty_months_since_watermark() }})
+        UNION ALL
+        -- Dernier jour connu déplacé : calendrier de chaque athlète prolongé ou raccourci
+        SELECT LEAST(t.last_date, l.last_date) + 1
+        FROM (SELECT MAX(activity_date) as last_date FROM {{ this }}) t
+        CROSS JOIN last_day l
+        WHERE t.last_date IS DISTINCT FROM l.last_date
+        UNION ALL
+        -- Nouvelle série (athlète ou sport) : calendrier complet de l'athlète
+        SELECT MIN(b.first_date)
+        FROM series s
+        INNER JOIN bounds b ON b.athlete_id IS NOT DISTINCT FROM s.athlete_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM (SELECT DISTINCT athlete_id, sport_type FROM {{ this }}) t
+            WHERE t.athlete_id IS NOT DISTINCT FROM s.athlete_id AND t.sport_type = s.sport_type
+        )
+    )
+    {% else %}
+    SELECT MIN(first_date) as restart_date FROM bounds
+    {% endif %}
+),
+
+daily AS (
+    SELECT
+        athlete_id,
+        sport_type,
+        CAST(activity_date AS DATE) as activity_date,
+        COUNT(*) as activities_count,
+        SUM(distance_km) as distance_km,
+        SUM(moving_time_minutes) as moving_time_minutes,
+        SUM(total_elevation_gain_m) as elevation_gain_m,
+        -- Allure pondérée par la distance (voir macros/rollup.sql) :
+        -- allure moyenne d'une période = rapport des différences de ces deux sommes
+        SUM(pace_sec_per_km * distance_km) as pace_weighted_s,
+        SUM(distance_km) FILTER (WHERE pace_sec_per_km IS NOT NULL) as pace_distance_km,
+        -- Composantes additives des agrégats de period_stats (macro rollup)
+        MAX(distance_km) as max_distance_km,
+        SUM(average_heartrate * moving_time_minutes) as heartrate_weighted_bpm_min,
+        SUM(moving_time_minutes) FILTER (WHERE average_heartrate IS NOT NULL) as heartrate_minutes,
+        SUM(max_heartrate) as max_heartrate_sum,
+        COUNT(max_heartrate) as max_heartrate_count
+    FROM {{ ref('activities_summary') }}
+    WHERE CAST(activity_date AS DATE) >= (SELECT restart_date FROM restart)
+    GROUP BY athlete_id, sport_type, CAST(activity_date AS DATE)
+),
+
+calendar AS (
+    SELECT
+        s.athlete_id,
+        s.sport_type,
+        CAST(d.day AS DATE) as activity_date
+    FROM series s
+    INNER JOIN bounds b ON b.athlete_id IS NOT DISTINCT FROM s.athlete_id
+    CROSS JOIN restart r
+    CROSS JOIN last_day l
+    CROSS JOIN LATERAL generate_series(
+        CAST(GREATEST(b.first_date, r.restart_date) AS TIMESTAMP), CAST(l.last_date AS TIMESTAMP), INTERVAL 1 DAY
+    ) AS d(day)
+    WHERE r.restart_date IS NOT NULL
+),
+
+-- Cumuls de la veille du premier jour recalculé (aucun au premier run)
+seed AS (
+    {% if is_incremental() %}
+    SELECT t.athlete_id, t.sport_type{% for column in cumulative_columns %}, t.{{ column }}{% endfor %}
+    FROM {{ this }} t
+    INNER JOIN restart r ON t.activity_date = r.restart_date - 1
+    {% else %}
+    SELECT athlete_id, sport_type{% for column in cumulative_columns %}, 0 as {{ column }}{% endfor %}
+    FROM series
+    WHERE FALSE
+    {% endif %}
+),
+
+days AS (
+    SELECT
+        c.athlete_id,
+        c.activity_date,
+        c.sport_type,
+        DATE_TRUNC('week', c.activity_date) as activity_week,
+        DATE_TRUNC('month', c.activity_date) as activity_month,
+
+        -- Volumes du jour (0 sans activité)
+        COALESCE(d.activities_count, 0) as activities_count,
+        COALESCE(d.distance_km, 0) as distance_km,
+        COALESCE(d.moving_time_minutes, 0) as moving_time_minutes,
+        COALESCE(d.elevation_gain_m, 0) as elevation_gain_m,
+        COALESCE(d.pace_weighted_s, 0) as pace_weighted_s,
+        COALESCE(d.pace_distance_km, 0) as pace_distance_km,
+        COALESCE(d.max_distance_km, 0) as max_distance_km,
+        COALESCE(d.heartrate_weighted_bpm_min, 0) as heartrate_weighted_bpm_min,
+        COALESCE(d.heartrate_minutes, 0) as heartrate_minutes,
+        COALESCE(d.max_heartrate_sum, 0) as max_heartrate_sum,
+        COALESCE(d.max_heartrate_count, 0) as max_heartrate_count,
+        CASE WHEN d.activities_count > 0 THEN 1 ELSE 0 END as active_day
+    FROM calendar c
+    LEFT JOIN daily d
+        ON d.athlete_id IS NOT DISTINCT FROM c.athlete_id
+       AND d.sport_type = c.sport_type
+       AND d.activity_date = c.activity_date
+)
+
+SELECT
+    d.athlete_id,
+    d.activity_date,
+    d.sport_type,
+    d.activity_week,
+    d.activity_month,
+    d.activities_count,
+    d.distance_km,
+    d.moving_time_minutes,
+    d.elevation_gain_m,
+    d.pace_weighted_s,
+    d.pace_distance_km,
+    d.max_distance_km,
+    d.heartrate_weighted_bpm_min,
+    d.heartrate_minutes,
+    d.max_heartrate_sum,
+    d.max_heartrate_count,
+
+    -- Sommes cumulées (préfixes) par athlète et sport, depuis les cumuls de la veille ;
+    -- compteurs (cum_activities, jours actifs cum_active_days) en BIGINT (SUM rend un HUGEINT)
+    {%- for column, measure in cumulative_columns.items() %}
+    {%- set cumulated = 'COALESCE(s.' ~ column ~ ', 0) + SUM(d.' ~ measure ~ ') OVER prefix' %}
+    {% if measure in ('activities_count', 'active_day') %}CAST({{ cumulated }} AS BIGINT){% else %}{{ cumulated }}{% endif %} as {{ column }},
+    {%- endfor %}
+
+    -- Filigrane des sources au moment du calcul (voir macros/incremental_helpers.sql)
+    {{ source_watermark() }} as updated_at
+
+FROM days d
+LEFT JOIN seed s
+    ON s.athlete_id IS NOT DISTINCT FROM d.athlete_id
+   AND s.sport_type = d.sport_type
+WINDOW prefix AS (
+    PARTITION BY d.athlete_id, d.sport_type
+    ORDER BY d.activity_date
+    ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+)
+-- Tri par date : les lectures de deux jours ne parcourent que leurs row groups
+ORDER BY d.activity_date, d.athlete_id, d.sport_type
@@ -1,40 +1,93 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    unique_key='activity_month',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_missing_rows(active_months(ref('period_stats')), ['athlete_id', 'activity_month']) }}"
+) }}
+
+-- Une ligne par athlète et par mois d'activité, tous sports confondus
+-- Agrégé depuis les mois de period_stats (macro rollup), sans relire le staging ;
+-- activities_per_week rapporte les activités aux jours du mois couverts par les données
+-- (31 jours en janvier, jours écoulés pour le mois en cours)
+
+{% if is_incremental() %}
+-- Mois recalculés par period_stats depuis le dernier run, ou dont une activité est
+-- partie (dirty_months) : seuls eux sont recalculés
+WITH touched_months AS (
+    SELECT DISTINCT CAST(period_start AS TIMESTAMP) as activity_month
+    FROM {{ ref('period_stats') }}
+    WHERE grain = 'month'
+      AND updated_at > {{ incremental_watermark() }}
+    UNION
+    {{ dirty_months_since_watermark() }}
+),
+
+sport_months AS (
+{% else %}
+WITH sport_months AS (
+{% endif %}
+    SELECT * FROM {{ ref('period_stats') }}
+    WHERE grain = 'month'
+    {% if is_incremental() %}
+      AND CAST(period_start AS TIMESTAMP) IN (SELECT activity_month FROM touched_months)
+    {% endif %}
+),
+
+athlete_months AS (
+    {{ rollup('sport_months', 'month', by_sport=False, extra_columns=[
+        "CAST(SUM(activities_count) FILTER (WHERE sport_type = 'Run') AS BIGINT) as road_runs",
+        "CAST(SUM(activities_count) FILTER (WHERE sport_type = 'Trail Run') AS BIGINT) as trail_runs"
+    ]) }}
+),
+
+months AS (
+    SELECT
+        *,
+        {{ rollup_metrics() }}
+    FROM athlete_months
+    WHERE activities_count > 0
+)
 
 SELECT 
-    activity_month,
-    EXTRACT(YEAR FROM activity_month) as year,
-    EXTRACT(MONTH FROM activity_month) as month,
+    athlete_id,
+    CAST(period_start AS TIMESTAMP) as activity_month,
+    EXTRACT(YEAR FROM period_start) as year,
+    EXTRACT(MONTH FROM period_start) as month,
     
     -- Compteurs
-    COUNT(*) as total_activities,
-    COUNT(CASE WHEN sport_type = 'Run' THEN 1 END) as road_runs,
-    COUNT(CASE WHEN sport_type = 'Trail Run' THEN 1 END) as trail_runs,
+    activities_count as total_activities,
+    COALESCE(road_runs, 0) as road_runs,
+    COALESCE(trail_runs, 0) as trail_runs,
     
     -- Distance
-    ROUND(SUM(distance_km), 1) as total_distance_km,
-    ROUND(AVG(distance_km), 1) as avg_distance_km,
-    ROUND(MAX(distance_km), 1) as max_distance_km,
+    ROUND(distance_km, 1) as total_distance_km,
+    ROUND(avg_distance_km, 1) as avg_distance_km,
+    ROUND(max_distance_km, 1) as max_distance_km,
     
     -- Temps
-    ROUND(SUM(moving_time_minutes), 0) as total_moving_time_minutes,
-    ROUND(SUM(moving_time_minutes) / 60.0, 1) as total_moving_time_hours,
-    ROUND(AVG(moving_time_minutes), 1) as avg_moving_time_minutes,
+    ROUND(moving_time_minutes, 0) as total_moving_time_minutes,
+    ROUND(moving_time_minutes / 60.0, 1) as total_moving_time_hours,
+    ROUND(avg_moving_time_minutes, 1) as avg_moving_time_minutes,
     
     -- Dénivelé
-    ROUND(SUM(total_elevation_gain_m), 0) as total_elevation_gain_m,
-    ROUND(AVG(total_elevation_gain_m), 0) as avg_elevation_gain_m,
+    ROUND(elevation_gain_m, 0) as total_elevation_gain_m,
+    ROUND(avg_elevation_gain_m, 0) as avg_elevation_gain_m,
     
-    -- Performance
-    ROUND(AVG(average_speed_kmh), 2) as avg_speed_kmh,
-    ROUND(AVG(pace_min_per_km), 2) as avg_pace_min_per_km,
+    -- Performance (vitesse et allure pondérées, voir macros/rollup.sql)
+    ROUND(avg_speed_kmh, 2) as avg_speed_kmh,
+    ROUND(avg_pace_sec_per_km, 1) as avg_pace_sec_per_km,
     
     -- Cardio (si disponible)
-    ROUND(AVG(average_heartrate), 0) as avg_heartrate,
-    ROUND(AVG(max_heartrate), 0) as avg_max_heartrate,
+    ROUND(avg_heartrate, 0) as avg_heartrate,
+    ROUND(avg_max_heartrate, 0) as avg_max_heartrate,
     
-    -- Fréquence
-    ROUND(COUNT(*) / 4.33, 1) as activities_per_week  -- Approximation
+    -- Fréquence (jours couverts du mois / 7)
+    ROUND(activities_per_week, 1) as activities_per_week,
+    calendar_days,
+
+    -- Métadonnées (filigrane incrémental)
+    {{ source_watermark() }} as updated_at
 
-FROM {{ ref('stg_strava_activities') }}
-GROUP BY activity_month
-ORDER BY activity_month DESC
\ No newline at end of file
+FROM months
+ORDER BY activity_month DESC, athlete_id
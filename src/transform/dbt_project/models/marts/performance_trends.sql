@@ -1,80 +1,94 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    unique_key='activity_month',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_missing_rows(active_months(ref('period_stats'), by_sport=True, trend_window=True), ['athlete_id', 'sport_type', 'activity_month']) }}"
+) }}
 
-WITH monthly_performance AS (
-    SELECT 
-        activity_month,
-        sport_type,
-        
-        -- Métriques de performance
-        COUNT(*) as activities_count,
-        ROUND(AVG(distance_km), 2) as avg_distance_km,
-        ROUND(AVG(pace_min_per_km), 2) as avg_pace_min_per_km,
-        ROUND(AVG(average_speed_kmh), 2) as avg_speed_kmh,
-        ROUND(AVG(average_heartrate), 0) as avg_heartrate,
-        
-        -- Métriques de volume
-        ROUND(SUM(distance_km), 1) as total_distance_km,
-        ROUND(SUM(moving_time_minutes) / 60.0, 1) as total_hours,
-        ROUND(SUM(total_elevation_gain_m), 0) as total_elevation_m
-        
-    FROM {{ ref('stg_strava_activities') }}
-    WHERE activity_month >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '12 months')
-    GROUP BY activity_month, sport_type
+-- Tendances mensuelles par athlète et sport : chaque mois d'activité comparé au précédent
+-- Fenêtre de `trend_window_months` mois (variable dbt, 12 par défaut) ancrée sur le dernier
+-- mois d'activité de l'athlète, pas sur la date du jour : le contenu ne change qu'avec les
+-- données. Lu dans les mois de period_stats, sans relire le staging
+-- Incrémental : mois recalculés à partir du plus ancien mois touché (la tendance d'un mois
+-- dépend du mois d'activité précédent), ou du début de la fenêtre si elle a reculé
+
+WITH active_months AS (
+    SELECT
+        *,
+        MAX(period_start) OVER (PARTITION BY athlete_id) as last_month
+    FROM {{ ref('period_stats') }}
+    WHERE grain = 'month'
+      AND activities_count > 0
 ),
 
+{% if is_incremental() %}
+restart AS (
+    SELECT MIN(restart_month) as restart_month
+    FROM (
+        SELECT MIN(period_start) as restart_month
+        FROM {{ ref('period_stats') }}
+        WHERE grain = 'month'
+          AND updated_at > {{ incremental_watermark() }}
+        UNION ALL
+        SELECT CAST(MIN(activity_month) AS DATE)
+        FROM ({{ dirty_months_since_watermark() }})
+        UNION ALL
+        -- Dernier mois d'activité reculé : la fenêtre reprend des mois plus anciens
+        SELECT CAST(MIN(n.last_month - INTERVAL '{{ var('trend_window_months', 12) }} months' + INTERVAL 1 MONTH) AS DATE)
+        FROM (SELECT DISTINCT athlete_id, last_month FROM active_months) n
+        INNER JOIN (
+            SELECT athlete_id, CAST(MAX(activity_month) AS DATE) as last_month
+            FROM {{ this }}
+            GROUP BY athlete_id
+        ) t ON t.athlete_id IS NOT DISTINCT FROM n.athlete_id
+        WHERE n.last_month < t.last_month
+    )
+),
+{% endif %}
+
 performance_with_trends AS (
     SELECT 
         *,
         
-        -- Calcul des tendances (comparaison avec le mois précédent)
-        LAG(avg_pace_min_per_km) OVER (
-            PARTITION BY sport_type 
-            ORDER BY activity_month
-        ) as prev_month_pace,
-        
-        LAG(total_distance_km) OVER (
-            PARTITION BY sport_type 
-            ORDER BY activity_month
-        ) as prev_month_distance,
-        
-        LAG(avg_heartrate) OVER (
-            PARTITION BY sport_type 
-            ORDER BY activity_month
-        ) as prev_month_hr
+        -- Calcul des tendances (comparaison avec le mois d'activité précédent,
+        -- éventuellement antérieur à la fenêtre)
+        LAG(avg_pace_sec_per_km) OVER previous_month as prev_month_pace,
+        LAG(distance_km) OVER previous_month as prev_month_distance,
+        LAG(avg_heartrate) OVER previous_month as prev_month_hr
         
-    FROM monthly_performance
+    FROM active_months
+    WINDOW previous_month AS (
+        PARTITION BY athlete_id, sport_type 
+        ORDER BY period_start
+    )
 )
 
 SELECT 
-    activity_month,
+    athlete_id,
+    CAST(period_start AS TIMESTAMP) as activity_month,
     sport_type,
     activities_count,
-    avg_distance_km,
-    avg_pace_min_per_km,
-    avg_speed_kmh,
-    avg_heartrate,
-    total_distance_km,
-    total_hours,
-    total_elevation_m,
+    ROUND(avg_distance_km, 2) as avg_distance_km,
+    ROUND(avg_pace_sec_per_km, 1) as avg_pace_sec_per_km,
+    ROUND(avg_speed_kmh, 2) as avg_speed_kmh,
+    ROUND(avg_heartrate, 0) as avg_heartrate,
+    ROUND(distance_km, 1) as total_distance_km,
+    ROUND(moving_time_minutes / 60.0, 1) as total_hours,
+    ROUND(elevation_gain_m, 0) as total_elevation_m,
+    ROUND(activities_per_week, 1) as activities_per_week,
     
     -- Tendances (amélioration = valeurs négatives pour pace, positives pour distance)
-    CASE 
-        WHEN prev_month_pace IS NOT NULL 
-        THEN ROUND(avg_pace_min_per_km - prev_month_pace, 2)
-        ELSE NULL 
-    END as pace_trend_min_per_km,
-    
-    CASE 
-        WHEN prev_month_distance IS NOT NULL 
-        THEN ROUND(total_distance_km - prev_month_distance, 1)
-        ELSE NULL 
-    END as distance_trend_km,
-    
-    CASE 
-        WHEN prev_month_hr IS NOT NULL 
-        THEN ROUND(avg_heartrate - prev_month_hr, 0)
-        ELSE NULL 
-    END as heartrate_trend_bpm
+    ROUND(avg_pace_sec_per_km - prev_month_pace, 1) as pace_trend_sec_per_km,
+    ROUND(distance_km - prev_month_distance, 1) as distance_trend_km,
+    ROUND(avg_heartrate - prev_month_hr, 0) as heartrate_trend_bpm,
+
+    -- Métadonnées (filigrane incrémental)
+    {{ source_watermark() }} as updated_at
 
 FROM performance_with_trends
-ORDER BY sport_type, activity_month DESC
+WHERE period_start > last_month - INTERVAL '{{ var('trend_window_months', 12) }} months'
+{% if is_incremental() %}
+  AND period_start >= (SELECT restart_month FROM restart)
+{% endif %}
+ORDER BY athlete_id, sport_type, activity_month DESC
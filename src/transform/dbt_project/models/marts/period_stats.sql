@@ -0,0 +1,98 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['grain', 'period_start'],
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_outside_calendar(ref('daily_stats'), 'first_day', 'last_day') }}"
+) }}
+
+-- Agrégats par athlète, sport et période à quatre grains : week, month, quarter, year
+-- Chaque grain est calculé depuis le grain inférieur (macro rollup) : semaines et mois
+-- depuis le calendrier dense de daily_stats, trimestres depuis les mois, années depuis
+-- les trimestres ; le staging n'est lu qu'une fois, par daily_stats
+-- Périodes sans activité comprises ; la première et la dernière période d'un athlète
+-- peuvent être partielles (first_day, last_day, calendar_days)
+-- Incrémental : seules les périodes contenant un jour recalculé par daily_stats (ou un mois
+-- noté dans dirty_months, ou la fin de calendrier déplacée) sont recalculées, à chaque grain
+
+WITH restart AS (
+    {% if is_incremental() %}
+    SELECT MIN(restart_date) as restart_date
+    FROM (
+        SELECT MIN(activity_date) as restart_date
+        FROM {{ ref('daily_stats') }}
+        WHERE updated_at > {{ incremental_watermark() }}
+        UNION ALL
+        SELECT CAST(MIN(activity_month) AS DATE)
+        FROM ({{ dirty_months_since_watermark() }})
+        UNION ALL
+        -- Calendrier raccourci ou prolongé : période qui contient le nouveau dernier jour
+        SELECT LEAST(t.last_date, l.last_date) + 1
+        FROM (SELECT MAX(last_day) as last_date FROM {{ this }}) t
+        CROSS JOIN (SELECT MAX(activity_date) as last_date FROM {{ ref('daily_stats') }}) l
+        WHERE t.last_date IS DISTINCT FROM l.last_date
+    )
+    {% else %}
+    SELECT MIN(activity_date) as restart_date FROM {{ ref('daily_stats') }}
+    {% endif %}
+),
+
+days AS (
+    SELECT
+        athlete_id,
+        sport_type,
+        activity_date as period_start,
+        1 as calendar_days,
+        activities_count,
+        distance_km,
+        max_distance_km,
+        moving_time_minutes,
+        elevation_gain_m,
+        pace_weighted_s,
+        pace_distance_km,
+        heartrate_weighted_bpm_min,
+        heartrate_minutes,
+        max_heartrate_sum,
+        max_heartrate_count,
+        activity_date as first_day,
+        activity_date as last_day
+    FROM {{ ref('daily_stats') }}
+    -- Premier jour des semaines et des années qui contiennent le premier jour recalculé
+    WHERE activity_date >= (
+        SELECT LEAST(DATE_TRUNC('year', restart_date), DATE_TRUNC('week', restart_date)) FROM restart
+    )
+),
+
+weeks AS (
+    {{ rollup('days', 'week') }}
+),
+
+months AS (
+    {{ rollup('days', 'month') }}
+),
+
+quarters AS (
+    {{ rollup('months', 'quarter') }}
+),
+
+years AS (
+    {{ rollup('quarters', 'year') }}
+),
+
+periods AS (
+    SELECT 'week' as grain, * FROM weeks
+    UNION ALL BY NAME
+    SELECT 'month' as grain, * FROM months
+    UNION ALL BY NAME
+    SELECT 'quarter' as grain, * FROM quarters
+    UNION ALL BY NAME
+    SELECT 'year' as grain, * FROM years
+)
+
+SELECT
+    *,
+    {{ rollup_metrics() }},
+    {{ source_watermark() }} as updated_at
+FROM periods
+WHERE period_start >= (SELECT CAST(DATE_TRUNC(grain, restart_date) AS DATE) FROM restart)
+ORDER BY grain, period_start, athlete_id, sport_type
@@ -0,0 +1,67 @@
+-- Records personnels par athlète et distance standard : tous temps, 12 derniers mois, 3 derniers mois
+-- Les fenêtres glissantes sont ancrées sur la dernière activité de l'athlète, pas sur la date du jour
+
+WITH efforts AS (
+    SELECT 
+        e.effort_name,
+        e.distance_m,
+        e.elapsed_time_s,
+        e.start_offset_s,
+        a.activity_id,
+        a.athlete_id,
+        a.activity_name,
+        a.sport_type,
+        a.start_date,
+        a.activity_date
+    FROM {{ source('raw_strava', 'best_efforts') }} e
+    INNER JOIN {{ ref('activities_summary') }} a ON a.activity_id = e.activity_id
+),
+
+anchor AS (
+    SELECT athlete_id, MAX(activity_date) as last_activity_date
+    FROM {{ ref('activities_summary') }}
+    GROUP BY athlete_id
+),
+
+periods AS (
+    SELECT athlete_id, 'all_time' as period, TIMESTAMP '1900-01-01' as period_start FROM anchor
+    UNION ALL
+    SELECT athlete_id, 'last_12_months', last_activity_date - INTERVAL '12 months' FROM anchor
+    UNION ALL
+    SELECT athlete_id, 'last_3_months', last_activity_date - INTERVAL '3 months' FROM anchor
+),
+
+ranked AS (
+    SELECT 
+        p.period,
+        e.*,
+        ROW_NUMBER() OVER (
+            PARTITION BY e.athlete_id, p.period, e.effort_name 
+            ORDER BY e.elapsed_time_s, e.start_date
+        ) as effort_rank
+    FROM efforts e
+    INNER JOIN periods p 
+        ON p.athlete_id IS NOT DISTINCT FROM e.athlete_id 
+        AND e.activity_date > p.period_start
+)
+
+SELECT 
+    athlete_id,
+    period,
+    effort_name,
+    distance_m,
+    ROUND(elapsed_time_s, 0) as elapsed_time_s,
+    
+    -- Allure en secondes par km, comme stg_strava_activities
+    ROUND(elapsed_time_s / (distance_m / 1000.0), 1) as pace_sec_per_km,
+    
+    -- Activité et position du segment
+    activity_id,
+    activity_name,
+    sport_type,
+    start_date,
+    start_offset_s
+
+FROM ranked
+WHERE effort_rank = 1
+ORDER BY athlete_id, period, distance_m
@@ -0,0 +1,42 @@
+{{ config(
+    materialized='incremental',
+    unique_key='activity_month',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_orphan_groups(ref('activities_summary')) }}"
+) }}
+
+-- Comptage des activités par athlète × sport × jour de la semaine × heure de départ × mois
+-- (heatmap du dashboard : quelques centaines de lignes au plus par mois)
+
+{% if is_incremental() %}
+-- Mois contenant des activités chargées depuis le dernier run, ou dont une
+-- activité est partie (dirty_months) : seuls eux sont recalculés
+WITH touched_months AS (
+    SELECT DISTINCT activity_month
+    FROM {{ ref('activities_summary') }}
+    WHERE updated_at > {{ incremental_watermark() }}
+    UNION
+    {{ dirty_months_since_watermark() }}
+)
+{% endif %}
+
+SELECT 
+    athlete_id,
+    activity_month,
+    sport_type,
+    ISODOW(start_date) as day_of_week,  -- 1 = lundi
+    DAYNAME(start_date) as day_name,
+    HOUR(start_date) as hour,
+    
+    COUNT(*) as activities_count,
+    
+    -- Métadonnées (filigrane incrémental)
+    MAX(updated_at) as updated_at
+
+FROM {{ ref('activities_summary') }}
+{% if is_incremental() %}
+WHERE activity_month IN (SELECT activity_month FROM touched_months)
+{% endif %}
+GROUP BY athlete_id, activity_month, sport_type, day_of_week, day_name, hour
+ORDER BY activity_month DESC, athlete_id, sport_type, day_of_week, hour
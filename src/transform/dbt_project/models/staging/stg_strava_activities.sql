@@ -1,8 +1,15 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key='activity_id',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_stale_activities() }}"
+) }}
 
 WITH cleaned_activities AS (
     SELECT 
         id as activity_id,
+        athlete_id,
         name as activity_name,
         sport_type,
         CAST(start_date AS TIMESTAMP) as start_date,
@@ -31,19 +38,21 @@ WITH cleaned_activities AS (
         -- Autres métriques
         COALESCE(suffer_score, 0) as suffer_score,
         
-        -- Calcul de l'allure au format MM.SS (4:30 = 4.30)
+        -- Cadence : Strava compte les cycles d'une jambe, doublés en pas par minute
+        ROUND(average_cadence * 2, 0) as average_cadence_spm,
+        
+        -- Contexte (workout_type 1 = course en compétition)
+        COALESCE(workout_type = 1, FALSE) as is_race,
+        COALESCE(trainer, FALSE) as is_trainer,
+        gear_id,
+        kudos_count,
+        
+        -- Allure en secondes par km (270 = 4:30 /km), formatée par le dashboard
         CASE 
-            WHEN CAST(distance AS FLOAT) > 0 AND CAST(moving_time AS INTEGER) > 0 THEN
-                -- Calcul des secondes par km
-                CASE 
-                    WHEN (CAST(moving_time AS INTEGER) / (CAST(distance AS FLOAT) / 1000)) IS NOT NULL THEN
-                        -- Minutes + (secondes / 100) pour avoir le format MM.SS
-                        FLOOR((CAST(moving_time AS INTEGER) / (CAST(distance AS FLOAT) / 1000)) / 60) + 
-                        (((CAST(moving_time AS INTEGER) / (CAST(distance AS FLOAT) / 1000)) % 60) / 100.0)
-                    ELSE NULL
-                END
+            WHEN distance > 0 AND moving_time > 0 THEN
+                ROUND(moving_time / (distance / 1000.0), 2)
             ELSE NULL 
-        END as pace_min_per_km,
+        END as pace_sec_per_km,
         
         -- Dates pour agrégations
         DATE_TRUNC('day', CAST(start_date AS TIMESTAMP)) as activity_date,
@@ -59,6 +68,12 @@ WITH cleaned_activities AS (
     WHERE (lower(sport_type) like '%run%' or lower(sport_type) like '%trail%')
       AND distance > 0  -- Exclure les activités sans distance
       AND moving_time > 0  -- Exclure les activités sans temps
+      AND deleted_at IS NULL  -- Activités supprimées sur Strava (pierres tombales)
+    {% if is_incremental() %}
+      -- Seules les lignes chargées depuis le dernier run (les lignes dont la
+      -- nouvelle version est filtrée sont retirées par le post_hook)
+      AND updated_at > {{ incremental_watermark(requires=['pace_sec_per_km']) }}
+    {% endif %}
 )
 
 SELECT * FROM cleaned_activities
@@ -0,0 +1,246 @@
+"""
+Charge d'entraînement quotidienne : ATL (fatigue), CTL (forme de fond) et TSB (fraîcheur)
+
+La charge d'une activité est son `suffer_score` Strava, ou à défaut un TRIMP
+de Banister calculé depuis la fréquence cardiaque moyenne et le temps en
+mouvement. Les charges sont sommées par jour sur une série continue
+(jours de repos = 0), puis lissées par moyennes mobiles exponentielles :
+
+    ATL_t = ATL_t-1 + (charge_t - ATL_t-1) * (1 - exp(-1 / 7))
+    CTL_t = CTL_t-1 + (charge_t - CTL_t-1) * (1 - exp(-1 / 42))
+    TSB_t = CTL_t - ATL_t
+
+Une série est tenue par athlète. La récurrence repart du dernier état
+persisté dans `training_load` : seuls les jours postérieurs à la plus ancienne
+activité modifiée de l'athlète, ou au plus ancien mois marqué pour lui dans
+`dirty_months` (activité supprimée ou déplacée), sont recalculés.
+"""
+import math
+import os
+import sys
+from datetime import date, timedelta
+
+import duckdb
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'monitoring'))
+import instrumentation
+
+# Base de travail (jamais la base publiée lue par le dashboard)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pipeline'))
+from db_snapshot import PUBLISHED_DB_PATH, STAGING_DB_PATH, prepare_staging
+
+ATL_DAYS = 7
+CTL_DAYS = 42
+
+# Fréquences cardiaques de référence pour le TRIMP (surchargeables par l'environnement)
+HR_REST = float(os.getenv('STRAVA_HR_REST', 60))
+HR_MAX = float(os.getenv('STRAVA_HR_MAX', 190))
+
+
+def daily_load_sql(hr_rest=HR_REST, hr_max=HR_MAX):
+    """Charge par jour depuis stg_strava_activities (suffer_score, sinon TRIMP)"""
+    hr_ratio = f"GREATEST(LEAST((average_heartrate - {hr_rest}) / ({hr_max} - {hr_rest}), 1), 0)"
+    return f"""
+        SELECT
+            CAST(activity_date AS DATE) AS load_date,
+            SUM(
+                CASE
+                    WHEN suffer_score > 0 THEN suffer_score
+                    WHEN average_heartrate > 0 THEN moving_time_minutes * {hr_ratio} * 0.64 * EXP(1.92 * {hr_ratio})
+                    ELSE 0
+                END
+            ) AS daily_load
+        FROM stg_strava_activities
+        WHERE athlete_id IS NOT DISTINCT FROM ?
+          AND CAST(activity_date AS DATE) >= ?
+        GROUP BY 1
+    """
+
+
+def ewma(values, days, seed=0.0):
+    """Moyenne mobile exponentielle de constante de temps `days`, poursuivie depuis `seed`"""
+    alpha = 1 - math.exp(-1 / days)
+    # La valeur initiale est la graine : la récurrence reprend là où elle s'était arrêtée
+    series = pd.concat([pd.Series([seed]), pd.Series(values)], ignore_index=True)
+    return series.ewm(alpha=alpha, adjust=False).mean().iloc[1:].to_numpy()
+
+
+class TrainingLoadCalculator:
+    """Mise à jour incrémentale de la table `training_load` (une ligne par athlète et par jour)"""
+
+    def __init__(self, db_path=STAGING_DB_PATH):
+        self.db_path = db_path
+
+    def ensure_schema(self, conn):
+        columns = [row[0] for row in conn.execute("""
+            SELECT column_name FROM information_schema.columns WHERE table_name = 'training_load'
+        """).fetchall()]
+        if columns and 'athlete_id' not in columns:
+            # Ancienne série mono-athlète : table dérivée, recalculée entièrement
+            conn.execute("DROP TABLE training_load")
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS training_load (
+                athlete_id BIGINT,
+                load_date DATE,
+                daily_load DOUBLE,
+                atl DOUBLE,
+                ctl DOUBLE,
+                tsb DOUBLE,
+                updated_at TIMESTAMP
+            )
+        """)
+
+    def get_restart_date(self, conn, athlete_id, full_refresh=False):
+        """Premier jour à recalculer pour un athlète, ou None si sa série est à jour
+
+        C'est le jour de la plus ancienne activité chargée depuis le dernier
+        calcul ; sans nouvelle activité, la série est simplement prolongée
+        jusqu'à aujourd'hui.
+        """
+        first_activity_date, = conn.execute("""
+            SELECT CAST(MIN(activity_date) AS DATE) FROM stg_strava_activities
+            WHERE athlete_id IS NOT DISTINCT FROM ?
+        """, [athlete_id]).fetchone()
+        if first_activity_date is None:
+            return None
+
+        last_date, watermark = conn.execute("""
+            SELECT MAX(load_date), MAX(updated_at) FROM training_load
+            WHERE athlete_id IS NOT DISTINCT FROM ?
+        """, [athlete_id]).fetchone()
+        if full_refresh or last_date is None:
+            return first_activity_date
+
+        changed_date, = conn.execute("""
+            SELECT CAST(MIN(activity_date) AS DATE)
+            FROM stg_strava_activities
+            WHERE athlete_id IS NOT DISTINCT FROM ?
+              AND updated_at > ?
+        """, [athlete_id, watermark]).fetchone()
+
+        restart_date = last_date + timedelta(days=1)
+        if changed_date is not None:
+            restart_date = min(restart_date, max(changed_date, first_activity_date))
+        dirty_month = self.get_first_dirty_month(conn, athlete_id, watermark)
+        if dirty_month is not None:
+            restart_date = min(restart_date, max(dirty_month, first_activity_date))
+        return restart_date if restart_date <= date.today() else None
+
+    def get_first_dirty_month(self, conn, athlete_id, watermark):
+        """Plus ancien mois de l'athlète marqué à recalculer depuis le dernier calcul (None si aucun)
+
+        La suppression d'une activité d'un athlète ne fait pas repartir la
+        série des autres.
+        """
+        tables = {row[0] for row in conn.execute("SHOW TABLES").fetchall()}
+        if 'dirty_months' not in tables:
+            return None
+        dirty_month, = conn.execute("""
+            SELECT CAST(MIN(activity_month) AS DATE) FROM dirty_months
+            WHERE athlete_id IS NOT DISTINCT FROM ? AND marked_at > ?
+        """, [athlete_id, watermark]).fetchone()
+        return dirty_month
+
+    def compute(self, conn, athlete_id, restart_date):
+        """Série quotidienne de restart_date à aujourd'hui, graines = état de la veille"""
+        seed = conn.execute("""
+            SELECT atl, ctl FROM training_load
+            WHERE athlete_id IS NOT DISTINCT FROM ? AND load_date = ?
+        """, [athlete_id, restart_date - timedelta(days=1)]).fetchone() or (0.0, 0.0)
+
+        loads = conn.execute(daily_load_sql(), [athlete_id, restart_date]).df()
+        days = pd.date_range(restart_date, date.today(), freq='D')
+        daily_load = (
+            loads.set_index(pd.to_datetime(loads['load_date']))['daily_load']
+            .reindex(days, fill_value=0.0)
+            .astype(float)
+        )
+
+        series = pd.DataFrame({
+            'athlete_id': pd.Series([athlete_id] * len(days), dtype='Int64'),
+            'load_date': days.date,
+            'daily_load': daily_load.to_numpy().round(1),
+            'atl': ewma(daily_load.to_numpy(), ATL_DAYS, seed[0]),
+            'ctl': ewma(daily_load.to_numpy(), CTL_DAYS, seed[1]),
+        })
+        series['tsb'] = series['ctl'] - series['atl']
+        return series
+
+    def update(self, full_refresh=False):
+        """Met à jour la table ; retourne le nombre de jours (re)calculés, None en cas d'erreur"""
+        if not os.path.exists(self.db_path):
+            print(f"Base de donnees introuvable : {self.db_path}")
+            return None
+
+        conn = duckdb.connect(self.db_path)
+        try:
+            self.ensure_schema(conn)
+            watermark, = conn.execute("SELECT MAX(updated_at) FROM stg_strava_activities").fetchone()
+            athlete_ids = [row[0] for row in conn.execute(
+                "SELECT DISTINCT athlete_id FROM stg_strava_activities"
+            ).fetchall()]
+
+            total_days = 0
+            for athlete_id in athlete_ids:
+                restart_date = self.get_restart_date(conn, athlete_id, full_refresh=full_refresh)
+                if restart_date is None:
+                    continue
+
+                series = self.compute(conn, athlete_id, restart_date)
+                series['updated_at'] = watermark
+
+                with instrumentation.span('save_training_load', 'training_load',
+                                          rows=len(series), athlete_id=athlete_id):
+                    conn.register('training_load_batch', series)
+                    conn.execute("BEGIN TRANSACTION")
+                    try:
+                        conn.execute("""
+                            DELETE FROM training_load
+                            WHERE athlete_id IS NOT DISTINCT FROM ? AND load_date >= ?
+                        """, [athlete_id, restart_date])
+                        conn.execute("""
+                            INSERT INTO training_load
+                            SELECT athlete_id, load_date, daily_load, atl, ctl, tsb, updated_at
+                            FROM training_load_batch
+                        """)
+                        conn.execute("COMMIT")
+                    except Exception:
+                        # La connexion ne doit pas rester dans une transaction avortée
+                        conn.execute("ROLLBACK")
+                        raise
+                    finally:
+                        conn.unregister('training_load_batch')
+
+                print(f"Charge d'entrainement (athlete {athlete_id}) : "
+                      f"{len(series)} jours recalcules depuis le {restart_date}")
+                total_days += len(series)
+
+            if total_days == 0:
+                print("Charge d'entrainement deja a jour")
+            return total_days
+        finally:
+            conn.close()
+
+
+def main():
+    """Fonction principale"""
+    print("📈 Calcul de la charge d'entrainement (ATL/CTL/TSB)...")
+
+    try:
+        prepare_staging(PUBLISHED_DB_PATH, STAGING_DB_PATH)
+        days = TrainingLoadCalculator().update(full_refresh='--full-refresh' in sys.argv)
+        if days is None:
+            print("❌ Echec du calcul")
+            sys.exit(1)
+        print("✅ Charge d'entrainement a jour")
+        sys.exit(0)
+
+    except Exception as e:
+        print(f"❌ Erreur lors du calcul : {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
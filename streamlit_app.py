@@ -13,8 +13,8 @@ sys.path.insert(0, dashboard_path)
 def main():
     """Point d'entrée principal"""
     
-    # Vérifier si les données existent
-    data_exists = os.path.exists('data/strava.duckdb')
+    # Vérifier si les données existent (base locale ou lake Parquet versionné)
+    data_exists = os.path.exists('data/strava.duckdb') or os.path.exists(os.path.join('data', 'lake', '_manifest.json'))
     
     if not data_exists:
         st.warning("⚠️ Première visite - Extraction des données en cours...")
@@ -23,17 +23,15 @@ def main():
         if st.button("🔄 Extraire les données Strava"):
             with st.spinner("Extraction en cours..."):
                 try:
-                    # Lancer l'extraction
-                    extract_path = os.path.join(current_dir, 'src', 'extract')
-                    sys.path.insert(0, extract_path)
+                    # Extraction + transformation dans ce processus
+                    pipeline_path = os.path.join(current_dir, 'src', 'pipeline')
+                    sys.path.insert(0, pipeline_path)
                     
-                    from strava_extractor import main as extract_main
-                    extract_main()
-                    
-                    # Lancer la transformation
-                    import subprocess
-                    dbt_path = os.path.join(current_dir, 'src', 'transform', 'dbt_project')
-                    subprocess.run(['dbt', 'run', '--profiles-dir', '.'], cwd=dbt_path, check=True)
+                    from strava_pipeline import run_pipeline
+                    pipeline = run_pipeline(force_transform=True, run_tests=False)
+                    if not pipeline['success']:
+                        failed = [step for step in pipeline['steps'] if not step['success']]
+                        raise RuntimeError(failed[0].get('error') or failed[0]['step'])
                     
                     st.success("✅ Données extraites et transformées !")
                     st.rerun()